@@ -4,21 +4,60 @@
 3D深度相机数据采集程序 - 美化版
 专门优化USB 2.0相机支持，现代化界面设计
 作者: Assistant
+
+命令行采集（不加载图形界面）: python Camera.py capture --source synthetic --count 10
 """
 
+import sys
+import time
+
+# 启动计时从导入界面依赖之前开始，首帧耗时包含导入cv2、pygame等模块的时间
+LAUNCH_TIME = time.perf_counter()
+
+# 带子命令运行时直接进入命令行采集，不导入tkinter和pygame
+if __name__ == "__main__" and len(sys.argv) > 1 and not sys.argv[1].startswith('-'):
+    from capture_cli import main as cli_main
+
+    sys.exit(cli_main(sys.argv[1:]))
+
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
 import cv2
 import numpy as np
 import os
 import threading
-import time
+import subprocess
 from datetime import datetime
 from PIL import Image, ImageTk, ImageDraw, ImageFont
 import json
-import sys
 import pygame
 
+from frame_source import (PlaybackSource, SyntheticSource, AcquisitionROI, open_video_capture,
+                          opencv_sensor_time, realsense_frame_info, realsense_depth_scale,
+                          start_realsense_pipeline, StreamRecorder, STREAM_FOLDER)
+from frame_accounting import FrameAccounting
+from capture_supervisor import (CaptureSupervisor, ReconnectPolicy, SourceDisconnectedError, FRAME_TIMEOUT_MS,
+                                STATE_RECONNECTING, STATE_RUNNING, STATE_FAILED)
+from thumbnail_cache import ThumbnailCache
+from image_codec import FORMAT_PRESETS
+from storage_governor import StorageDecision
+from session_journal import recover_sessions
+from session_store import (CaptureSession, StorageFullError, colorize_depth,
+                           default_deepdata_path, ensure_deepdata_folders)
+from capture_gate import CaptureGate, GateResult
+from control_server import ControlServer, PreviewBroadcaster
+from frame_share import DEFAULT_SHARE_NAME, FramePublisher
+from preview_pacer import PreviewPacer, fit_size, resize_for_preview
+from execution_config import PRESET_NAMES, FrameTiming, preset_config
+from depth_fusion import FUSION_PRESETS, DepthFusion
+from depth_estimator import ESTIMATOR_NAMES, DepthStage, create_estimator
+from depth_vis import DepthVisCache, render_depth_vis
+from session_archive import ARCHIVE_INDEX_FILE, is_archived, open_archive
+from session_reader import load_session_records
+from device_probe import (CAPABILITIES_FILE, CapabilityCache, device_key, platform_backends,
+                          preferred_backends, probe_device)
+from warm_start import SETTINGS_FILE, AppSettings, PreopenTask, StartupTimer
+
 # 尝试导入pyrealsense2库
 try:
     import pyrealsense2 as rs
@@ -29,8 +68,14 @@ except ImportError:
     print("警告: pyrealsense2 库未安装，将使用OpenCV模式")
 
 
+# 相机类型与界面选项的对应关系（保存设置时记录实际启动的类型）
+CAMERA_TYPE_LABELS = {"realsense": "Intel RealSense", "opencv": "USB相机", "synthetic": "合成测试源"}
+
+
 class DepthCameraGUI:
     def __init__(self, root):
+        self.startup_timer = StartupTimer(LAUNCH_TIME)
+        self.startup_timer.mark("导入模块")
         pygame.mixer.init()
         self.root = root
         self.root.title("🎥 3D深度相机数据采集系统 - 美化版")
@@ -50,25 +95,80 @@ class DepthCameraGUI:
         self.camera_type = "opencv"
         self.pipeline = None
         self.cap = None
-        self.current_rgb_frame = None
-        self.current_depth_frame = None
+        self.stereo_cap = None
+        self.camera_lock = threading.RLock()  # 停止相机和自动重连释放设备时串行执行
+        self.depth_estimator = None
+        self.depth_stage = None
+        # 最新帧 (RGB, 深度, 帧标记): 抓帧线程整体替换，拍摄时只读取一次作为快照，三者总是来自同一帧
+        self.current_frame = None
+        self.frame_accounting = None
+        self.capture_trigger_time = None
+        self.capture_supervisor = None
+        self.camera_reopen = None   # 自动重连时在抓帧线程中重新打开相机的函数
         self.save_counter = 0
         self.camera_index = 0
         self.available_cameras = []
         self.current_session_path = None
         self.session_start_time = None
+        self.frame_source = None
+        self.thumbnail_cache = None
+        self.session = None
+        self.storage_poll_job = None
+        self.storage_state = StorageDecision.OK
+        self.capture_gate = CaptureGate()
+        self.gate_waiting = False
+        self.depth_fusion = None      # 正在收集深度帧的融合器（抓帧线程累加）
+        self.active_fusion = None     # 当前拍摄的融合器（收集和计算期间），过期的融合结果据此丢弃
+        self.fusion_pending = False
+        self.acquisition_roi = AcquisitionROI()
+        self.sensor_shape = None
+        self.frame_processing_ms = None
+        self.preview_broadcaster = PreviewBroadcaster()
+        self.control_server = None
+        self.frame_publisher = None
+        # 录制流: 每个会话一个写入器（写入会话的 stream/，可用回放打开），按钮暂停/继续录制
+        self.stream_recorder = None
+        self.stream_recording = False
+        self.stream_lock = threading.Lock()
+        self.preview_pacer = PreviewPacer()
+        self.preview_sizes = {"rgb": (400, 300), "depth": (400, 300)}
+        self.corner_masks = {}
+        self.device_capabilities = None
+        self.probing_device = None
+        self.camera_starting = False
+        self.execution_config = preset_config("default")
+        self.frame_timing = None
+        self.compaction_process = None
+        self.preopen = None
 
         # 创建deepdata文件夹
         self.create_deepdata_folder()
+        self.capability_cache = CapabilityCache(os.path.join(self.deepdata_path, "temp", CAPABILITIES_FILE))
+        self.settings = AppSettings(os.path.join(self.deepdata_path, "temp", SETTINGS_FILE))
 
-        # 检测可用相机
-        self.detect_available_cameras()
+        # 热启动: 上次使用的相机在创建界面期间于后台打开，USB相机不再逐个检测设备
+        self.preopen = self.begin_preopen()
+        if self.preopen is not None and self.preopen.key[0] == "opencv":
+            self.available_cameras = [self.settings.get("camera_device")]
+        else:
+            # 检测可用相机
+            self.detect_available_cameras()
 
         # 初始化GUI
         self.init_gui()
+        self.apply_saved_settings()
+        self.startup_timer.mark("界面创建")
+        self.load_device_capabilities()
+
+        # 修复上次异常退出未结束的会话
+        self.recover_unfinished_sessions()
 
-        # 尝试检测相机类型
-        self.detect_camera_type()
+        if self.preopen is not None:
+            self.log_debug("热启动: 使用上次的相机设置，设备列表未重新检测（可点击刷新设备）")
+            self.start_camera()
+        elif self.settings.get("camera_type") == "自动检测":
+            # 尝试检测相机类型
+            self.detect_camera_type()
 
     def setup_modern_theme(self):
         """设置现代化主题"""
@@ -146,8 +246,9 @@ class DepthCameraGUI:
         print("正在检测可用相机...")
 
         # 检测多个相机索引
+        backend = platform_backends()[0]
         for i in range(5):  # 检测索引0-4
-            cap = cv2.VideoCapture(i)
+            cap = cv2.VideoCapture(i, backend)
             if cap.isOpened():
                 # 尝试读取一帧来确认相机真正可用
                 ret, frame = cap.read()
@@ -170,52 +271,44 @@ class DepthCameraGUI:
         else:
             print(f"总共发现 {len(self.available_cameras)} 个相机设备")
 
+    def camera_mode_info(self):
+        """会话信息中记录USB相机使用的像素格式和探测时的实测帧率，RealSense记录深度单位"""
+        if self.camera_type == "realsense" and self.pipeline is not None:
+            depth_scale = realsense_depth_scale(self.pipeline)
+            return {"depth_scale": depth_scale} if depth_scale else None
+        mode = self.selected_camera_mode() if self.camera_type == "opencv" else None
+        return {"camera_mode": mode.to_dict()} if mode else None
+
     def create_deepdata_folder(self):
         """创建deepdata主文件夹"""
-        self.deepdata_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "deepdata")
-        if not os.path.exists(self.deepdata_path):
-            os.makedirs(self.deepdata_path)
-            print(f"已创建文件夹: {self.deepdata_path}")
-
-        # 创建子文件夹结构
-        subfolders = ['sessions', 'exports', 'temp']
-        for folder in subfolders:
-            folder_path = os.path.join(self.deepdata_path, folder)
-            if not os.path.exists(folder_path):
-                os.makedirs(folder_path)
-                print(f"已创建子文件夹: {folder_path}")
+        self.deepdata_path = default_deepdata_path()
+
+        # 创建主文件夹及子文件夹结构
+        for folder_path in ensure_deepdata_folders(self.deepdata_path):
+            print(f"已创建文件夹: {folder_path}")
 
     def create_session_folder(self):
         """创建新的会话文件夹"""
-        self.session_start_time = datetime.now()
-        session_name = f"session_{self.session_start_time.strftime('%Y%m%d_%H%M%S')}"
-        self.current_session_path = os.path.join(self.deepdata_path, "sessions", session_name)
-
-        # 创建会话文件夹及其子文件夹
-        session_subfolders = ['rgb', 'depth', 'depth_vis', 'metadata']
-        for folder in session_subfolders:
-            folder_path = os.path.join(self.current_session_path, folder)
-            os.makedirs(folder_path, exist_ok=True)
-
-        # 创建会话信息文件
-        session_info = {
-            "session_name": session_name,
-            "start_time": self.session_start_time.strftime("%Y-%m-%d %H:%M:%S"),
-            "camera_type": self.camera_type,
-            "camera_index": getattr(self, 'camera_index', 0),
-            "resolution": getattr(self, 'resolution_var', None) and self.resolution_var.get(),
-            "fps": getattr(self, 'fps_var', None) and self.fps_var.get(),
-        }
-
-        session_info_path = os.path.join(self.current_session_path, "session_info.json")
-        with open(session_info_path, 'w', encoding='utf-8') as f:
-            json.dump(session_info, f, indent=2, ensure_ascii=False)
-
-        self.log_debug(f"创建新会话: {session_name}")
+        self.session = CaptureSession(
+            self.deepdata_path,
+            camera_type=self.camera_type,
+            camera_index=getattr(self, 'camera_index', 0),
+            resolution=self.resolution_var.get(),
+            fps=self.selected_fps(),
+            rgb_format=self.rgb_format_var.get(),
+            depth_vis_format=self.depth_vis_format_var.get(),
+            extra_info=self.camera_mode_info(),
+            lazy_depth_vis=self.depth_vis_mode_var.get() == "按需生成")
+        self.current_session_path = self.session.create()
+        self.session_start_time = self.session.start_time
+        self.capture_gate.reset()
+
+        self.log_debug(f"创建新会话: {self.session.name}")
+        self.poll_storage()
 
         # 更新会话显示
         if hasattr(self, 'session_var'):
-            self.session_var.set(session_name)
+            self.session_var.set(self.session.name)
 
         return self.current_session_path
 
@@ -342,7 +435,7 @@ class DepthCameraGUI:
 
         self.camera_type_var = tk.StringVar(value="自动检测")
         camera_combo = ttk.Combobox(settings_frame, textvariable=self.camera_type_var,
-                                    values=["自动检测", "Intel RealSense", "USB相机"],
+                                    values=["自动检测", "Intel RealSense", "USB相机", "合成测试源"],
                                     state="readonly", width=18)
         camera_combo.grid(row=0, column=1, sticky='e', pady=(0, 12), padx=(10, 0))
 
@@ -355,6 +448,7 @@ class DepthCameraGUI:
         self.camera_device_combo = ttk.Combobox(settings_frame, textvariable=self.camera_device_var,
                                                 state="readonly", width=18)
         self.camera_device_combo.grid(row=1, column=1, sticky='e', pady=(0, 12), padx=(10, 0))
+        self.camera_device_combo.bind('<<ComboboxSelected>>', lambda e: self.load_device_capabilities())
 
         # 更新相机设备列表
         self.update_camera_device_list()
@@ -365,21 +459,135 @@ class DepthCameraGUI:
                 fg=self.colors['text'], bg=self.colors['surface']).grid(row=2, column=0, sticky='w', pady=(0, 12))
 
         self.resolution_var = tk.StringVar(value="640x480")
-        resolution_combo = ttk.Combobox(settings_frame, textvariable=self.resolution_var,
-                                        values=["320x240", "640x480", "800x600", "1024x768", "1280x720", "1920x1080"],
-                                        state="readonly", width=18)
-        resolution_combo.grid(row=2, column=1, sticky='e', pady=(0, 12), padx=(10, 0))
+        self.resolution_combo = ttk.Combobox(settings_frame, textvariable=self.resolution_var,
+                                             values=["320x240", "640x480", "800x600", "1024x768", "1280x720", "1920x1080"],
+                                             state="readonly", width=18)
+        self.resolution_combo.grid(row=2, column=1, sticky='e', pady=(0, 12), padx=(10, 0))
+        self.resolution_combo.bind('<<ComboboxSelected>>', lambda e: self.update_fps_options())
 
         # 帧率设置
         tk.Label(settings_frame, text="⚡ 帧率:",
                 font=('Microsoft YaHei UI', 10, 'bold'),
-                fg=self.colors['text'], bg=self.colors['surface']).grid(row=3, column=0, sticky='w')
+                fg=self.colors['text'], bg=self.colors['surface']).grid(row=3, column=0, sticky='w', pady=(0, 12))
 
         self.fps_var = tk.StringVar(value="30")
-        fps_combo = ttk.Combobox(settings_frame, textvariable=self.fps_var,
-                                 values=["15", "30", "60"],
-                                 state="readonly", width=18)
-        fps_combo.grid(row=3, column=1, sticky='e', padx=(10, 0))
+        # 探测到设备能力后，选项显示为 "帧率 · 像素格式 实测帧率"
+        self.fps_combo = ttk.Combobox(settings_frame, textvariable=self.fps_var,
+                                      values=["15", "30", "60"],
+                                      state="readonly", width=18)
+        self.fps_combo.grid(row=3, column=1, sticky='e', pady=(0, 12), padx=(10, 0))
+
+        # 回放速度设置
+        tk.Label(settings_frame, text="🎞️ 回放速度:",
+                font=('Microsoft YaHei UI', 10, 'bold'),
+                fg=self.colors['text'], bg=self.colors['surface']).grid(row=4, column=0, sticky='w', pady=(0, 12))
+
+        self.playback_speed_var = tk.StringVar(value="1x")
+        playback_speed_combo = ttk.Combobox(settings_frame, textvariable=self.playback_speed_var,
+                                            values=["0.25x", "0.5x", "1x", "2x", "4x", "最大"],
+                                            state="readonly", width=18)
+        playback_speed_combo.grid(row=4, column=1, sticky='e', pady=(0, 12), padx=(10, 0))
+        self.playback_speed_var.trace_add('write', lambda *args: self.on_playback_speed_changed())
+
+        # 存储格式设置（格式:压缩等级/质量）
+        tk.Label(settings_frame, text="💾 RGB格式:",
+                font=('Microsoft YaHei UI', 10, 'bold'),
+                fg=self.colors['text'], bg=self.colors['surface']).grid(row=5, column=0, sticky='w', pady=(0, 12))
+
+        self.rgb_format_var = tk.StringVar(value="png:6")
+        rgb_format_combo = ttk.Combobox(settings_frame, textvariable=self.rgb_format_var,
+                                        values=FORMAT_PRESETS, state="readonly", width=18)
+        rgb_format_combo.grid(row=5, column=1, sticky='e', pady=(0, 12), padx=(10, 0))
+
+        tk.Label(settings_frame, text="🌈 深度图格式:",
+                font=('Microsoft YaHei UI', 10, 'bold'),
+                fg=self.colors['text'], bg=self.colors['surface']).grid(row=6, column=0, sticky='w', pady=(0, 12))
+
+        self.depth_vis_format_var = tk.StringVar(value="png:1")
+        depth_vis_format_combo = ttk.Combobox(settings_frame, textvariable=self.depth_vis_format_var,
+                                              values=FORMAT_PRESETS, state="readonly", width=18)
+        depth_vis_format_combo.grid(row=6, column=1, sticky='e', pady=(0, 12), padx=(10, 0))
+
+        # 采集ROI和输出缩放（启动相机时生效）
+        tk.Label(settings_frame, text="✂️ 采集区域:",
+                font=('Microsoft YaHei UI', 10, 'bold'),
+                fg=self.colors['text'], bg=self.colors['surface']).grid(row=7, column=0, sticky='w', pady=(0, 12))
+
+        self.roi_var = tk.StringVar(value="全画面")
+        roi_combo = ttk.Combobox(settings_frame, textvariable=self.roi_var,
+                                 values=list(AcquisitionROI.PRESETS), state="readonly", width=18)
+        roi_combo.grid(row=7, column=1, sticky='e', pady=(0, 12), padx=(10, 0))
+
+        tk.Label(settings_frame, text="🔍 输出缩放:",
+                font=('Microsoft YaHei UI', 10, 'bold'),
+                fg=self.colors['text'], bg=self.colors['surface']).grid(row=8, column=0, sticky='w', pady=(0, 12))
+
+        self.output_scale_var = tk.StringVar(value="1.0")
+        output_scale_combo = ttk.Combobox(settings_frame, textvariable=self.output_scale_var,
+                                          values=["1.0", "0.75", "0.5", "0.25"], state="readonly", width=18)
+        output_scale_combo.grid(row=8, column=1, sticky='e', pady=(0, 12), padx=(10, 0))
+
+        # 预览帧率上限（只影响界面显示，拍摄始终使用全帧率全分辨率数据）
+        tk.Label(settings_frame, text="🖥️ 预览帧率:",
+                font=('Microsoft YaHei UI', 10, 'bold'),
+                fg=self.colors['text'], bg=self.colors['surface']).grid(row=9, column=0, sticky='w', pady=(0, 12))
+
+        self.preview_fps_var = tk.StringVar(value="30")
+        preview_fps_combo = ttk.Combobox(settings_frame, textvariable=self.preview_fps_var,
+                                         values=["5", "10", "15", "30", "60"], state="readonly", width=18)
+        preview_fps_combo.grid(row=9, column=1, sticky='e', pady=(0, 12), padx=(10, 0))
+        preview_fps_combo.bind('<<ComboboxSelected>>',
+                               lambda e: self.preview_pacer.set_max_fps(int(self.preview_fps_var.get())))
+
+        # 执行配置预设（OpenCV线程数、后台线程池、抓帧线程绑核，启动相机时生效）
+        tk.Label(settings_frame, text="⚙️ 执行配置:",
+                font=('Microsoft YaHei UI', 10, 'bold'),
+                fg=self.colors['text'], bg=self.colors['surface']).grid(row=10, column=0, sticky='w', pady=(0, 12))
+
+        self.execution_preset_var = tk.StringVar(value="默认")
+        execution_combo = ttk.Combobox(settings_frame, textvariable=self.execution_preset_var,
+                                       values=list(PRESET_NAMES), state="readonly", width=18)
+        execution_combo.grid(row=10, column=1, sticky='e', pady=(0, 12), padx=(10, 0))
+        execution_combo.bind('<<ComboboxSelected>>', lambda e: self.on_execution_preset_changed())
+
+        # USB相机模式的深度估计器（双目需要两台相机，第二台取设备列表中的下一台）
+        tk.Label(settings_frame, text="🧠 深度估计:",
+                font=('Microsoft YaHei UI', 10, 'bold'),
+                fg=self.colors['text'], bg=self.colors['surface']).grid(row=11, column=0, sticky='w', pady=(0, 12))
+
+        self.depth_estimator_var = tk.StringVar(value="边缘模拟")
+        ttk.Combobox(settings_frame, textvariable=self.depth_estimator_var, values=list(ESTIMATOR_NAMES),
+                     state="readonly", width=18).grid(row=11, column=1, sticky='e', pady=(0, 12), padx=(10, 0))
+
+        # 深度估计在缩小的分辨率上运行，结果以最近邻放大回原尺寸
+        tk.Label(settings_frame, text="📐 估计分辨率:",
+                font=('Microsoft YaHei UI', 10, 'bold'),
+                fg=self.colors['text'], bg=self.colors['surface']).grid(row=12, column=0, sticky='w', pady=(0, 12))
+
+        self.estimate_scale_var = tk.StringVar(value="0.5")
+        ttk.Combobox(settings_frame, textvariable=self.estimate_scale_var, values=["1.0", "0.5", "0.25"],
+                     state="readonly", width=18).grid(row=12, column=1, sticky='e', pady=(0, 12), padx=(10, 0))
+
+        # 深度可视化可在拍摄时生成，或在画廊查看时按需生成（拍摄只写深度数据）
+        tk.Label(settings_frame, text="🌈 深度可视化:",
+                font=('Microsoft YaHei UI', 10, 'bold'),
+                fg=self.colors['text'], bg=self.colors['surface']).grid(row=13, column=0, sticky='w', pady=(0, 12))
+
+        self.depth_vis_mode_var = tk.StringVar(value="拍摄时生成")
+        ttk.Combobox(settings_frame, textvariable=self.depth_vis_mode_var, values=["拍摄时生成", "按需生成"],
+                     state="readonly", width=18).grid(row=13, column=1, sticky='e', pady=(0, 12), padx=(10, 0))
+
+        # 下次启动时在创建界面期间于后台打开上次使用的相机
+        tk.Label(settings_frame, text="🚀 启动时打开:",
+                font=('Microsoft YaHei UI', 10, 'bold'),
+                fg=self.colors['text'], bg=self.colors['surface']).grid(row=14, column=0, sticky='w')
+
+        self.preopen_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(settings_frame, text="预打开上次的相机", variable=self.preopen_var,
+                       command=lambda: self.save_settings(preopen=self.preopen_var.get()),
+                       font=('Microsoft YaHei UI', 9), fg=self.colors['text'],
+                       bg=self.colors['surface'], activebackground=self.colors['surface']).grid(
+            row=14, column=1, sticky='e', padx=(10, 0))
 
     def create_control_buttons(self, parent):
         """创建控制按钮区域"""
@@ -436,6 +644,31 @@ class DepthCameraGUI:
                                                  self.changeMode2, 'accent')
         self.mode2Btn.grid(row=0, column=1, sticky='ew', padx=(4, 0))
 
+        # 拍摄门控: 拒绝模糊帧和重复帧
+        gate_frame = tk.Frame(mode_frame, bg=self.colors['surface'])
+        gate_frame.pack(fill=tk.X, pady=(10, 0))
+
+        self.capture_gate_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(gate_frame, text="🎯 拒绝模糊/重复帧", variable=self.capture_gate_var,
+                       font=('Microsoft YaHei UI', 9), fg=self.colors['text'],
+                       bg=self.colors['surface'], activebackground=self.colors['surface']).pack(side=tk.LEFT)
+
+        self.gate_wait_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(gate_frame, text="等待清晰帧", variable=self.gate_wait_var,
+                       font=('Microsoft YaHei UI', 9), fg=self.colors['text'],
+                       bg=self.colors['surface'], activebackground=self.colors['surface']).pack(side=tk.RIGHT)
+
+        # 多帧深度融合: 拍摄后融合接下来的K帧深度，降低单帧噪声
+        fusion_frame = tk.Frame(mode_frame, bg=self.colors['surface'])
+        fusion_frame.pack(fill=tk.X, pady=(10, 0))
+
+        tk.Label(fusion_frame, text="🧮 深度融合:", font=('Microsoft YaHei UI', 9),
+                 fg=self.colors['text'], bg=self.colors['surface']).pack(side=tk.LEFT)
+
+        self.depth_fusion_var = tk.StringVar(value="单帧")
+        ttk.Combobox(fusion_frame, textvariable=self.depth_fusion_var, values=list(FUSION_PRESETS),
+                     state="readonly", width=12).pack(side=tk.RIGHT)
+
         # 文件夹操作区域
         folder_frame = tk.Frame(parent, bg=self.colors['surface'])
         folder_frame.pack(fill=tk.X)
@@ -458,6 +691,30 @@ class DepthCameraGUI:
                                                           self.open_sessions_folder, 'info')
         self.open_sessions_btn.grid(row=0, column=1, sticky='ew', padx=(4, 0))
 
+        self.playback_btn = self.create_modern_button(folder_buttons_frame, "🎞️ 回放会话",
+                                                     self.start_playback, 'info')
+        self.playback_btn.grid(row=1, column=0, sticky='ew', padx=(0, 4), pady=(8, 0))
+
+        self.gallery_btn = self.create_modern_button(folder_buttons_frame, "🖼️ 会话画廊",
+                                                    self.open_gallery, 'info')
+        self.gallery_btn.grid(row=1, column=1, sticky='ew', padx=(4, 0), pady=(8, 0))
+
+        self.server_btn = self.create_modern_button(folder_buttons_frame, "🌐 开启控制服务",
+                                                   self.toggle_control_server, 'info')
+        self.server_btn.grid(row=2, column=0, sticky='ew', padx=(0, 4), pady=(8, 0))
+
+        self.share_btn = self.create_modern_button(folder_buttons_frame, "📡 开启帧共享",
+                                                  self.toggle_frame_share, 'info')
+        self.share_btn.grid(row=2, column=1, sticky='ew', padx=(4, 0), pady=(8, 0))
+
+        self.record_btn = self.create_modern_button(folder_buttons_frame, "⏺️ 录制流",
+                                                   self.toggle_stream_recording, 'info', state='disabled')
+        self.record_btn.grid(row=3, column=0, sticky='ew', padx=(0, 4), pady=(8, 0))
+
+        self.compact_btn = self.create_modern_button(folder_buttons_frame, "🗜️ 归档旧会话",
+                                                    self.start_compaction, 'info')
+        self.compact_btn.grid(row=3, column=1, sticky='ew', padx=(4, 0), pady=(8, 0))
+
     def create_modern_button(self, parent, text, command, style='default', state='normal', width=None):
         """创建现代化按钮"""
         # 按钮颜色配置
@@ -587,6 +844,7 @@ class DepthCameraGUI:
                                  relief='flat',
                                  bd=1)
         self.rgb_label.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        rgb_display_frame.bind('<Configure>', lambda e: self.on_preview_resized("rgb", e))
 
         # 深度图像显示卡片
         depth_card_frame = tk.Frame(right_container,
@@ -626,6 +884,7 @@ class DepthCameraGUI:
                                    relief='flat',
                                    bd=1)
         self.depth_label.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        depth_display_frame.bind('<Configure>', lambda e: self.on_preview_resized("depth", e))
 
     def create_status_bar(self, parent):
         """创建状态栏"""
@@ -697,10 +956,99 @@ class DepthCameraGUI:
     def changeMode1(self):
         self.pictureSaveNumber = 20
         self.pictureSaveMode = 0
+        self.save_settings(shot_mode=20)
 
     def changeMode2(self):
         self.pictureSaveNumber = 10
         self.pictureSaveMode = 1
+        self.save_settings(shot_mode=10)
+
+    def save_settings(self, **values):
+        """保存设置，下次启动时恢复"""
+        try:
+            self.settings.update(**values)
+        except OSError as e:
+            self.log_debug(f"保存设置失败: {e}")
+
+    def camera_settings(self):
+        """相机启动成功后保存的设置: 实际启动的相机类型、设备、分辨率和帧率"""
+        camera_index = self.selected_camera_index()
+        device = next((cam for cam in self.available_cameras if cam['index'] == camera_index), None)
+        return {
+            "camera_type": CAMERA_TYPE_LABELS.get(self.camera_type, self.camera_type_var.get()),
+            "camera_device": device if self.camera_type == "opencv" else self.settings.get("camera_device"),
+            "resolution": self.resolution_var.get(),
+            "fps": self.selected_fps(),
+        }
+
+    def apply_saved_settings(self):
+        """界面创建后恢复上次的设置，设备或选项已不存在时保留默认值"""
+        settings = self.settings
+        self.preopen_var.set(bool(settings.get("preopen")))
+        if not settings.loaded:
+            return
+
+        if settings.get("camera_type") in ("自动检测", *CAMERA_TYPE_LABELS.values()):
+            self.camera_type_var.set(settings.get("camera_type"))
+        device = settings.get("camera_device")
+        if device:
+            name = next((cam['name'] for cam in self.available_cameras if cam['index'] == device.get("index")), None)
+            if name:
+                self.camera_device_combo.set(name)
+        if settings.get("resolution") in self.resolution_combo['values']:
+            self.resolution_var.set(settings.get("resolution"))
+        self.fps_var.set(str(settings.get("fps")))
+
+        shot_mode = settings.get("shot_mode")
+        if shot_mode == 20:
+            self.pictureSaveNumber, self.pictureSaveMode = 20, 0
+        elif shot_mode == 10:
+            self.pictureSaveNumber, self.pictureSaveMode = 10, 1
+
+    def begin_preopen(self):
+        """按上次的设置在后台打开相机（界面创建之前调用），未启用或设置不完整时返回None"""
+        settings = self.settings
+        if not settings.loaded or not settings.get("preopen"):
+            return None
+        try:
+            width, height = (int(value) for value in settings.get("resolution").split('x'))
+            fps = int(settings.get("fps"))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+        camera_type = settings.get("camera_type")
+        if camera_type == "USB相机":
+            device = settings.get("camera_device")
+            if not device or device.get("index") is None:
+                return None
+            camera_index = device["index"]
+            # 与启动时选择像素格式和后端的方式相同
+            capabilities = self.capability_cache.get(device_key(camera_index))
+            mode = capabilities.best_mode(width, height, fps) if capabilities else None
+            backends = self.camera_backends(camera_index)
+            return PreopenTask(("opencv", camera_index, width, height, fps),
+                               lambda log: open_video_capture(camera_index, width, height, fps, log,
+                                                              mode.fourcc if mode else None, backends),
+                               lambda cap: cap.release())
+        if camera_type == "合成测试源":
+            source = SyntheticSource(width, height, fps)
+            return PreopenTask(("synthetic", width, height, fps),
+                               lambda log: source if source.open() else None,
+                               lambda opened: opened.close())
+        if camera_type == "Intel RealSense" and REALSENSE_AVAILABLE:
+            return PreopenTask(("realsense",), lambda log: start_realsense_pipeline(), lambda opened: opened[0].stop())
+        return None
+
+    def take_preopened(self, key):
+        """启动相机时的设置与预打开时一致则接管预打开任务，否则释放预打开的设备；返回任务或None"""
+        preopen, self.preopen = self.preopen, None
+        if preopen is None:
+            return None
+        if preopen.key == key:
+            return preopen
+        self.log_debug("相机设置已改变，关闭预打开的相机")
+        preopen.discard()
+        return None
 
     def log_debug(self, message):
         """添加调试信息"""
@@ -709,6 +1057,32 @@ class DepthCameraGUI:
         self.debug_text.see(tk.END)
         print(f"[{timestamp}] {message}")
 
+    def log_from_thread(self, message):
+        """后台线程中的日志转到界面线程输出"""
+        self.root.after(0, self.log_debug, message)
+
+    def run_in_background(self, work, callback):
+        """在后台线程执行work，完成后在界面线程中以 (结果, 异常) 调用callback"""
+        def run():
+            try:
+                result, error = work(), None
+            except Exception as e:
+                result, error = None, e
+            self.root.after(0, callback, result, error)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def camera_backends(self, camera_index):
+        """该设备上次成功的后端优先，其余按平台顺序"""
+        return preferred_backends(self.capability_cache.get_backend(device_key(camera_index)))
+
+    def remember_backend(self, camera_index, backend_name):
+        """记录成功打开设备的后端，下次直接使用"""
+        try:
+            self.capability_cache.put_backend(device_key(camera_index), backend_name)
+        except OSError as e:
+            self.log_debug(f"记录相机后端失败: {e}")
+
     def update_camera_device_list(self):
         """更新相机设备列表"""
         camera_names = [cam['name'] for cam in self.available_cameras]
@@ -725,56 +1099,154 @@ class DepthCameraGUI:
         self.detect_available_cameras()
         self.update_camera_device_list()
         self.log_debug(f"发现 {len(self.available_cameras)} 个相机设备")
+        self.load_device_capabilities(refresh=True)
 
-    def test_camera(self):
-        """测试选中的相机"""
-        if not self.available_cameras:
-            self.log_debug("错误: 没有可用的相机设备")
+    def selected_camera_index(self):
+        """当前选中USB相机的编号，没有可用设备时返回None"""
+        selected_name = self.camera_device_var.get()
+        return next((cam['index'] for cam in self.available_cameras if cam['name'] == selected_name), None)
+
+    def selected_resolution(self):
+        width, height = self.resolution_var.get().split('x')
+        return int(width), int(height)
+
+    def selected_fps(self):
+        """帧率选项可能带有模式说明，只取开头的数字"""
+        return int(self.fps_var.get().split()[0])
+
+    def selected_camera_mode(self):
+        """按探测结果为当前分辨率和帧率选择的相机模式，未探测时返回None"""
+        if self.device_capabilities is None:
+            return None
+        return self.device_capabilities.best_mode(*self.selected_resolution(), self.selected_fps())
+
+    def load_device_capabilities(self, refresh=False):
+        """加载选中USB相机的模式能力，没有缓存或要求刷新时在后台线程中探测"""
+        self.device_capabilities = None
+        camera_index = self.selected_camera_index()
+        if camera_index is None:
             return
 
-        selected_name = self.camera_device_var.get()
-        camera_index = next((cam['index'] for cam in self.available_cameras if cam['name'] == selected_name), 0)
+        capabilities = None if refresh else self.capability_cache.get(device_key(camera_index))
+        if capabilities is not None:
+            self.apply_device_capabilities(capabilities)
+            return
 
-        self.log_debug(f"正在测试相机 {camera_index}...")
+        # 相机正在使用（包括启动时预打开）或已有探测任务时不再探测
+        if self.camera_running or self.camera_starting or self.preopen is not None or \
+                self.probing_device is not None:
+            return
 
-        try:
-            cap = cv2.VideoCapture(camera_index)
-            if not cap.isOpened():
-                self.log_debug(f"错误: 无法打开相机 {camera_index}")
-                return
+        self.probing_device = camera_index
+        self.log_debug(f"正在探测相机 {camera_index} 支持的模式（结果会被缓存）...")
 
-            # 设置分辨率
-            resolution = self.resolution_var.get().split('x')
-            width, height = int(resolution[0]), int(resolution[1])
+        backend = self.camera_backends(camera_index)[0]
+        self.run_in_background(lambda: probe_device(camera_index, backend, log=self.log_from_thread),
+                               lambda result, error: self.on_probe_finished(camera_index, result, error))
 
-            cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-            cap.set(cv2.CAP_PROP_FPS, int(self.fps_var.get()))
+    def on_probe_finished(self, camera_index, capabilities, error=None):
+        """探测完成（界面线程）: 写入缓存并更新可选的分辨率和帧率"""
+        self.probing_device = None
+        if error is not None:
+            self.log_debug(f"相机模式探测异常: {error}")
+        if capabilities is None or not capabilities.modes:
+            self.log_debug(f"相机 {camera_index} 模式探测失败，使用默认分辨率和帧率列表")
+            return
 
-            # 读取几帧来测试
-            for i in range(5):
-                ret, frame = cap.read()
-                if not ret:
-                    self.log_debug(f"警告: 第{i + 1}帧读取失败")
-                    break
-                time.sleep(0.1)
+        self.capability_cache.put(capabilities)
+        self.log_debug(f"相机 {camera_index} 探测完成: {len(capabilities.modes)} 种模式，"
+                       f"耗时 {capabilities.probe_seconds}s")
+        if camera_index == self.selected_camera_index():
+            self.apply_device_capabilities(capabilities)
+
+    def apply_device_capabilities(self, capabilities):
+        """只提供设备实际能达到的分辨率和帧率"""
+        self.device_capabilities = capabilities
+        resolutions = capabilities.resolutions()
+        self.resolution_combo['values'] = resolutions
+        if self.resolution_var.get() not in resolutions:
+            self.resolution_var.set("640x480" if "640x480" in resolutions else resolutions[-1])
+        self.update_fps_options()
+
+    def update_fps_options(self):
+        """按当前分辨率更新帧率选项，每项显示自动选择的像素格式和实测帧率"""
+        if self.device_capabilities is None:
+            return
+        options = self.device_capabilities.fps_options(*self.selected_resolution())
+        if not options:
+            return
+        labels = [f"{fps} · {mode.fourcc} 实测{mode.measured_fps:.0f}" for fps, mode in options]
+        self.fps_combo['values'] = labels
 
-            if ret:
-                actual_width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
-                actual_height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
-                actual_fps = cap.get(cv2.CAP_PROP_FPS)
+        current_fps = self.selected_fps()
+        self.fps_var.set(next((label for (fps, _), label in zip(options, labels) if fps == current_fps),
+                              labels[-1]))
 
-                self.log_debug(f"相机 {camera_index} 测试成功!")
-                self.log_debug(f"实际分辨率: {int(actual_width)}x{int(actual_height)}")
-                self.log_debug(f"实际帧率: {int(actual_fps)}fps")
-                self.log_debug(f"图像格式: {frame.shape}")
-            else:
-                self.log_debug(f"错误: 相机 {camera_index} 无法读取图像")
+    def test_camera(self):
+        """测试选中的相机（在后台线程中进行，不阻塞界面）"""
+        camera_index = self.selected_camera_index()
+        if camera_index is None:
+            self.log_debug("错误: 没有可用的相机设备")
+            return
+        if self.probing_device == camera_index:
+            self.log_debug("正在探测相机模式，请稍候再测试")
+            return
 
-            cap.release()
+        # 界面变量只在主线程读取
+        width, height = self.selected_resolution()
+        fps = self.selected_fps()
+        mode = self.selected_camera_mode()
+        backends = self.camera_backends(camera_index)
 
-        except Exception as e:
-            self.log_debug(f"相机测试异常: {str(e)}")
+        self.log_debug(f"正在测试相机 {camera_index}...")
+        self.test_btn.config(state="disabled")
+
+        def test():
+            cap = open_video_capture(camera_index, width, height, fps, self.log_from_thread,
+                                     mode.fourcc if mode else None, backends)
+            if cap is None:
+                return None
+            try:
+                # 连续读取几帧测量实际帧率
+                frames, frame = 0, None
+                start = time.perf_counter()
+                for i in range(10):
+                    ret, frame = cap.read()
+                    if not ret:
+                        self.log_from_thread(f"警告: 第{i + 1}帧读取失败")
+                        break
+                    frames += 1
+                elapsed = time.perf_counter() - start
+                return {
+                    "backend": cap.getBackendName(),
+                    "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                    "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                    "fps": int(cap.get(cv2.CAP_PROP_FPS)),
+                    "measured_fps": frames / elapsed if frames and elapsed > 0 else 0.0,
+                    "shape": frame.shape if frames else None,
+                }
+            finally:
+                cap.release()
+
+        self.run_in_background(test, lambda result, error: self.on_camera_tested(camera_index, result, error))
+
+    def on_camera_tested(self, camera_index, result, error):
+        """相机测试完成（界面线程）"""
+        if not self.camera_running and not self.camera_starting:
+            self.test_btn.config(state="normal")
+
+        if error is not None:
+            self.log_debug(f"相机测试异常: {error}")
+        elif result is None:
+            self.log_debug(f"错误: 无法打开相机 {camera_index}")
+        elif result["shape"] is None:
+            self.log_debug(f"错误: 相机 {camera_index} 无法读取图像")
+        else:
+            self.remember_backend(camera_index, result["backend"])
+            self.log_debug(f"相机 {camera_index} 测试成功! 后端: {result['backend']}")
+            self.log_debug(f"实际分辨率: {result['width']}x{result['height']}")
+            self.log_debug(f"实际帧率: {result['fps']}fps，实测 {result['measured_fps']:.1f}fps")
+            self.log_debug(f"图像格式: {result['shape']}")
 
     def detect_camera_type(self):
         """检测相机类型"""
@@ -800,163 +1272,262 @@ class DepthCameraGUI:
         else:
             self.log_debug("未检测到相机")
 
-    def start_camera(self):
-        """启动相机"""
-        if self.camera_running:
+    def start_camera(self, on_done=None):
+        """启动相机: 打开设备在后台线程中进行，完成后回到界面线程继续
+
+        on_done(成功与否) 在启动完成或失败后于界面线程调用。
+        """
+        if self.camera_running or self.camera_starting:
             return
 
-        if not self.available_cameras and self.camera_type_var.get() != "Intel RealSense":
+        def fail(message):
+            self.log_debug(f"启动相机失败: {message}")
+            messagebox.showerror("错误", f"启动相机失败: {message}")
+            if on_done:
+                on_done(False)
+
+        if not self.available_cameras and self.camera_type_var.get() not in ("Intel RealSense", "合成测试源"):
             self.log_debug("错误: 没有可用的相机设备")
             messagebox.showerror("错误", "没有可用的相机设备，请先刷新设备列表")
+            if on_done:
+                on_done(False)
             return
 
         selected_type = self.camera_type_var.get()
-
-        try:
-            if selected_type == "Intel RealSense":
-                if self.start_realsense_camera():
-                    self.camera_running = True
-                    self.log_debug("RealSense相机启动成功")
-                else:
-                    raise Exception("无法启动RealSense相机")
+        preopen = None
+
+        if selected_type == "Intel RealSense":
+            camera_type, description = "realsense", "RealSense相机"
+            preopen = self.take_preopened(("realsense",))
+            open_camera = lambda: self.start_realsense_camera(preopen)
+            self.camera_reopen = self.start_realsense_camera
+        elif selected_type == "合成测试源":
+            camera_type, description = "synthetic", "合成测试源"
+            width, height = self.selected_resolution()
+            preopen = self.take_preopened(("synthetic", width, height, self.selected_fps()))
+            if preopen is not None:
+                def open_camera():
+                    self.frame_source = preopen.wait()
+                    return self.frame_source is not None
             else:
-                # 获取选中的相机索引
-                selected_name = self.camera_device_var.get()
-                self.camera_index = next(
-                    (cam['index'] for cam in self.available_cameras if cam['name'] == selected_name), 0)
-
-                if self.start_opencv_camera():
-                    self.camera_running = True
-                    self.log_debug(f"USB相机 {self.camera_index} 启动成功")
-                else:
-                    raise Exception(f"无法启动USB相机 {self.camera_index}")
-
-            # 创建新的会话文件夹
-            self.create_session_folder()
+                self.frame_source = SyntheticSource(width, height, self.selected_fps())
+                open_camera = self.frame_source.open
+            self.camera_reopen = lambda: self.frame_source.open()
+        else:
+            # 获取选中的相机索引
+            self.camera_index = self.selected_camera_index() or 0
+            if self.probing_device == self.camera_index:
+                messagebox.showinfo("提示", "正在探测相机支持的模式，请稍候再启动")
+                if on_done:
+                    on_done(False)
+                return
+            camera_type, description = "opencv", f"USB相机 {self.camera_index}"
+            try:
+                open_camera, preopen = self.prepare_opencv_camera()
+            except Exception as e:
+                fail(str(e))
+                return
+            self.camera_reopen = lambda: open_camera(use_preopen=False)
+
+        self.camera_starting = True
+        self.start_btn.config(state="disabled")
+        self.test_btn.config(state="disabled")
+        self.playback_btn.config(state="disabled")
+        self.status_var.set(f"⏳ 正在打开{description}...")
+        open_start = time.perf_counter()
+
+        def opened(result, error):
+            self.camera_starting = False
+            if preopen is not None:
+                for message in preopen.take_messages():
+                    self.log_debug(message)
+            if error is not None or not result:
+                self.frame_source = None
+                self.start_btn.config(state="normal")
+                self.test_btn.config(state="normal")
+                self.playback_btn.config(state="normal")
+                self.status_var.set("🔴 相机启动失败")
+                if preopen is not None and camera_type == "opencv":
+                    # 上次的设备可能已拔出，热启动时跳过了设备检测
+                    self.log_debug(f"预打开{description}失败，重新检测相机设备")
+                    self.refresh_cameras()
+                    if on_done:
+                        on_done(False)
+                    return
+                fail(f"无法启动{description}" + (f": {error}" if error is not None else ""))
+                return
 
-            # 更新按钮状态
-            self.start_btn.config(state="disabled")
-            self.stop_btn.config(state="normal")
-            self.capture_btn.config(state="normal")
-            self.test_btn.config(state="disabled")
+            self.camera_type = camera_type
+            self.camera_running = True
+            self.startup_timer.mark("相机打开")
+            if preopen is not None:
+                self.log_debug(f"{description}启动成功 (启动时预打开，打开耗时 {preopen.elapsed_ms:.0f} ms)")
+            else:
+                self.log_debug(f"{description}启动成功 (打开耗时 {(time.perf_counter() - open_start) * 1000:.0f} ms)")
+            self.save_settings(**self.camera_settings())
+            try:
+                self.finish_camera_start()
+            except Exception as e:
+                self.log_debug(f"启动相机失败: {str(e)}")
+                messagebox.showerror("错误", f"启动相机失败: {str(e)}")
+            if on_done:
+                on_done(self.camera_running)
+
+        self.run_in_background(open_camera, opened)
+
+    def on_execution_preset_changed(self):
+        """选择预设时同步预览帧率上限（之后仍可单独修改）"""
+        config = preset_config(self.execution_preset_var.get())
+        self.preview_fps_var.set(str(config.preview_max_fps))
+        self.preview_pacer.set_max_fps(config.preview_max_fps)
+
+    def apply_execution_config(self):
+        """应用执行配置预设，返回配置"""
+        config = preset_config(self.execution_preset_var.get())
+        cv_threads = config.apply()
+        self.log_debug(f"执行配置: {self.execution_preset_var.get()}，OpenCV线程 {cv_threads}，"
+                       f"后台线程 {config.worker_threads}"
+                       + (f"，抓帧线程绑定核心 {config.grab_core}" if config.grab_core is not None else ""))
+        return config
+
+    def finish_camera_start(self):
+        """设备打开后（界面线程）: 应用采集设置、创建会话并启动更新线程"""
+        self.execution_config = self.apply_execution_config()
+        self.frame_timing = FrameTiming()
+        # USB相机按探测到的实测帧率判断丢帧，其它相机按设定帧率
+        mode = self.selected_camera_mode() if self.camera_type == "opencv" else None
+        self.frame_accounting = FrameAccounting(mode.measured_fps if mode and mode.measured_fps
+                                                else self.selected_fps())
+        # 抓帧出错或等待帧超时时自动重连，会话保持不变
+        self.capture_supervisor = CaptureSupervisor(self.camera_reopen, self.release_camera_handles,
+                                                    ReconnectPolicy(), self.log_from_thread, self.on_capture_state)
+
+        # 采集ROI和输出缩放在抓帧后立即应用
+        self.acquisition_roi = AcquisitionROI.center(AcquisitionROI.PRESETS[self.roi_var.get()],
+                                                     float(self.output_scale_var.get()))
+        self.sensor_shape = None
+        self.frame_processing_ms = None
+        self.preview_pacer = PreviewPacer(max_fps=int(self.preview_fps_var.get()))
+        if not self.acquisition_roi.is_identity:
+            self.log_debug(f"采集区域: {self.roi_var.get()}, 输出缩放: {self.output_scale_var.get()}")
+
+        # USB相机模式下深度估计在工作线程中进行
+        self.depth_stage = None
+        if self.camera_type == "opencv":
+            self.depth_stage = DepthStage(self.depth_estimator, float(self.estimate_scale_var.get()),
+                                          self.log_from_thread)
+            self.depth_stage.start()
+            self.log_debug(f"深度估计: {self.depth_estimator_var.get()}，估计分辨率 {self.estimate_scale_var.get()}")
+
+        # 创建新的会话文件夹
+        self.create_session_folder()
 
-            self.status_var.set("🟢 相机运行中")
+        # 更新按钮状态
+        self.start_btn.config(state="disabled")
+        self.stop_btn.config(state="normal")
+        self.capture_btn.config(state="normal")
+        self.record_btn.config(state="disabled" if isinstance(self.frame_source, PlaybackSource) else "normal")
+        self.test_btn.config(state="disabled")
+        self.playback_btn.config(state="disabled")
 
-            # 启动更新线程
-            self.update_thread = threading.Thread(target=self.update_frames, daemon=True)
-            self.update_thread.start()
+        self.status_var.set("🟢 相机运行中")
 
-        except Exception as e:
-            self.log_debug(f"启动相机失败: {str(e)}")
-            messagebox.showerror("错误", f"启动相机失败: {str(e)}")
+        # 启动更新线程
+        self.update_thread = threading.Thread(target=self.update_frames, daemon=True)
+        self.update_thread.start()
 
-    def start_realsense_camera(self):
-        """启动RealSense相机"""
+    def start_realsense_camera(self, preopen=None):
+        """启动RealSense相机（在后台线程中调用），有预打开任务时等待其完成并接管"""
         if not REALSENSE_AVAILABLE:
             return False
 
         try:
-            self.pipeline = rs.pipeline()
-            config = rs.config()
-
-            config.enable_stream(rs.stream.depth, 640, 480, rs.format.z16, 30)
-            config.enable_stream(rs.stream.color, 640, 480, rs.format.bgr8, 30)
-
-            self.pipeline.start(config)
-            self.align = rs.align(rs.stream.color)
-
+            self.pipeline, self.align = preopen.wait() if preopen is not None else start_realsense_pipeline()
             return True
         except Exception as e:
-            self.log_debug(f"RealSense启动失败: {e}")
+            self.log_from_thread(f"RealSense启动失败: {e}")
             return False
 
-    def start_opencv_camera(self):
-        """启动OpenCV相机"""
-        try:
-            self.log_debug(f"正在启动相机 {self.camera_index}...")
-
-            # 尝试多种后端
-            backends = [cv2.CAP_DSHOW, cv2.CAP_MSMF, cv2.CAP_ANY]
-
-            for backend in backends:
-                self.log_debug(f"尝试使用后端: {backend}")
-                self.cap = cv2.VideoCapture(self.camera_index, backend)
-
-                if self.cap.isOpened():
-                    self.log_debug(f"成功使用后端 {backend} 打开相机")
-                    break
-                else:
-                    self.log_debug(f"后端 {backend} 打开相机失败")
-                    if self.cap:
-                        self.cap.release()
-                        self.cap = None
-
-            if not self.cap or not self.cap.isOpened():
-                self.log_debug("所有后端都无法打开相机")
-                return False
-
-            # 设置相机参数
-            resolution = self.resolution_var.get().split('x')
-            width, height = int(resolution[0]), int(resolution[1])
-            fps = int(self.fps_var.get())
-
-            self.log_debug(f"设置分辨率: {width}x{height}")
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-            self.cap.set(cv2.CAP_PROP_FPS, fps)
-
-            # 设置缓冲区大小以减少延迟
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-
-            # 验证设置
-            actual_width = self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)
-            actual_height = self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
-            actual_fps = self.cap.get(cv2.CAP_PROP_FPS)
-
-            self.log_debug(f"实际设置 - 分辨率: {int(actual_width)}x{int(actual_height)}, 帧率: {int(actual_fps)}")
-
-            # 测试读取
-            ret, frame = self.cap.read()
-            if not ret:
-                self.log_debug("错误: 无法读取相机图像")
+    def prepare_opencv_camera(self):
+        """在界面线程读取相机设置，返回 (在后台线程中打开USB相机的函数, 接管的预打开任务或None)"""
+        camera_index = self.camera_index
+        width, height = self.selected_resolution()
+        fps = self.selected_fps()
+
+        # 按探测结果选择能达到目标帧率的像素格式（USB 2.0 高分辨率通常需要MJPG）
+        mode = self.selected_camera_mode()
+        if mode is not None:
+            self.log_debug(f"选择相机模式: {mode}")
+        backends = self.camera_backends(camera_index)
+
+        self.depth_estimator = create_estimator(ESTIMATOR_NAMES[self.depth_estimator_var.get()])
+        stereo_index = None
+        if self.depth_estimator.needs_second_camera:
+            others = [cam['index'] for cam in self.available_cameras if cam['index'] != camera_index]
+            if not others:
+                raise RuntimeError("双目深度估计需要两台USB相机")
+            stereo_index = others[0]
+            self.log_debug(f"双目深度估计: 左相机 {camera_index}，右相机 {stereo_index}")
+
+        # 预打开只包含单台相机，双目时重新打开
+        preopen = self.take_preopened(("opencv", camera_index, width, height, fps) if stereo_index is None else None)
+
+        def open_camera(use_preopen=True):
+            if preopen is not None and use_preopen:
+                cap = preopen.wait()
+            else:
+                cap = open_video_capture(camera_index, width, height, fps, self.log_from_thread,
+                                         mode.fourcc if mode else None, backends)
+            if cap is None:
                 return False
-
-            self.log_debug(f"读取测试成功，图像尺寸: {frame.shape}")
+            if stereo_index is not None:
+                stereo_cap = open_video_capture(stereo_index, width, height, fps, self.log_from_thread,
+                                                mode.fourcc if mode else None, self.camera_backends(stereo_index))
+                if stereo_cap is None:
+                    cap.release()
+                    self.log_from_thread(f"无法打开右相机 {stereo_index}")
+                    return False
+                self.stereo_cap = stereo_cap
+            backend = cap.getBackendName()
+            self.root.after(0, self.remember_backend, camera_index, backend)
+            self.cap = cap
             return True
 
-        except Exception as e:
-            self.log_debug(f"OpenCV相机启动异常: {e}")
-            return False
+        return open_camera, preopen
 
     def stop_camera(self):
         """停止相机"""
         self.camera_running = False
+        if self.capture_supervisor is not None:
+            self.capture_supervisor.stop()
+        if self.fusion_pending:
+            self.cancel_depth_fusion("相机已停止")
 
         # 更新会话结束信息
         if self.current_session_path and self.session_start_time:
             self.finalize_session()
 
-        if self.pipeline:
-            try:
-                self.pipeline.stop()
-                self.log_debug("RealSense相机已停止")
-            except:
-                pass
-            self.pipeline = None
+        # 与抓帧线程中自动重连的释放/重新打开串行执行
+        with self.camera_lock:
+            for name in self.release_camera_handles():
+                self.log_debug(f"{name}已停止")
 
-        if self.cap:
-            try:
-                self.cap.release()
-                self.log_debug("USB相机已停止")
-            except:
-                pass
-            self.cap = None
+            if self.frame_source:
+                self.frame_source.close()
+                if isinstance(self.frame_source, PlaybackSource):
+                    self.log_debug(f"回放已停止: {self.frame_source.stats()}")
+                self.frame_source = None
+
+        if self.depth_stage is not None:
+            self.depth_stage.stop()
 
         # 更新按钮状态
         self.start_btn.config(state="normal")
         self.stop_btn.config(state="disabled")
         self.capture_btn.config(state="disabled")
+        self.record_btn.config(state="disabled", text="⏺️ 录制流")
         self.test_btn.config(state="normal")
+        self.playback_btn.config(state="normal")
 
         # 清空显示
         self.rgb_label.config(image="", text="RGB图像将在此显示\n📸")
@@ -970,75 +1541,172 @@ class DepthCameraGUI:
 
         self.status_var.set("🔴 相机已停止")
 
+    def release_camera_handles(self):
+        """释放已打开的相机设备（停止相机或自动重连前），返回已释放的相机名称
+
+        停止相机（界面线程）和自动重连（抓帧线程）都会调用，在 camera_lock 内执行，不会同时释放同一设备。
+        帧源对象保留，自动重连时重新 open()；停止相机时由 stop_camera 丢弃。
+        """
+        with self.camera_lock:
+            released = []
+            if self.pipeline:
+                try:
+                    self.pipeline.stop()
+                    released.append("RealSense相机")
+                except:
+                    pass
+                self.pipeline = None
+
+            if self.cap:
+                try:
+                    self.cap.release()
+                    released.append("USB相机")
+                except:
+                    pass
+                self.cap = None
+
+            if self.stereo_cap:
+                self.stereo_cap.release()
+                self.stereo_cap = None
+
+            if self.frame_source is not None and self.frame_source.live:
+                self.frame_source.close()
+            return released
+
+    def on_capture_state(self, state, message):
+        """抓帧监护状态变化（在抓帧线程中调用），转到界面线程更新状态栏和按钮"""
+        self.root.after(0, self.apply_capture_state, state, message)
+
+    def apply_capture_state(self, state, message):
+        if not self.camera_running:
+            return
+        if state == STATE_RECONNECTING:
+            self.capture_btn.config(state="disabled")
+            self.status_var.set(f"🟡 相机连接中断，正在重连 ({message})...")
+        elif state == STATE_RUNNING:
+            self.capture_btn.config(state="normal")
+            self.status_var.set("🟢 相机运行中 (已重新连接)")
+        elif state == STATE_FAILED:
+            session_path = self.current_session_path
+            self.stop_camera()
+            self.status_var.set("🔴 相机连接已断开")
+            messagebox.showerror("错误", f"相机连接中断，自动重连失败: {message}"
+                                       + (f"\n已拍摄的图像保存在 {os.path.basename(session_path)}" if session_path else ""))
+
     def finalize_session(self):
         """结束会话，更新会话信息"""
         try:
-            session_info_path = os.path.join(self.current_session_path, "session_info.json")
-            if os.path.exists(session_info_path):
-                with open(session_info_path, 'r', encoding='utf-8') as f:
-                    session_info = json.load(f)
-
-                # 更新结束时间和统计信息
-                end_time = datetime.now()
-                session_info.update({
-                    "end_time": end_time.strftime("%Y-%m-%d %H:%M:%S"),
-                    "duration_seconds": int((end_time - self.session_start_time).total_seconds()),
-                    "total_captures": self.save_counter,
-                    "session_completed": True
-                })
-
-                with open(session_info_path, 'w', encoding='utf-8') as f:
-                    json.dump(session_info, f, indent=2, ensure_ascii=False)
-
-                self.log_debug(f"会话已结束，共拍摄 {self.save_counter} 张图像")
+            self.session.finalize({"acquisition": self.acquisition_summary(),
+                                   "preview": self.preview_pacer.summary(),
+                                   "execution": self.execution_summary(),
+                                   "depth_estimation": self.depth_stage.summary() if self.depth_stage else None,
+                                   "frame_share": self.frame_publisher.summary() if self.frame_publisher else None,
+                                   "frame_accounting": self.frame_accounting.summary() if self.frame_accounting else None,
+                                   "reconnect": self.capture_supervisor.summary() if self.capture_supervisor else None,
+                                   "stream_recording": self.close_stream_recorder()})
+            self.log_debug(f"会话已结束，共拍摄 {self.save_counter} 张图像")
         except Exception as e:
             self.log_debug(f"结束会话时出错: {str(e)}")
+        self.session = None
 
     def update_frames(self):
         """更新图像帧"""
         frame_count = 0
         last_fps_time = time.time()
+        timing = self.frame_timing or FrameTiming()
+        accounting = self.frame_accounting or FrameAccounting()
+        supervisor = self.capture_supervisor
+        frame_ok = supervisor.frame_ok if supervisor is not None else (lambda: None)
+        previous_depth = None  # USB相机模式下上一帧使用的深度估计结果
+        last_error = None
+
+        if self.execution_config.grab_core is not None:
+            if self.execution_config.pin_current_thread():
+                self.log_from_thread(f"抓帧线程已绑定到CPU核心 {self.execution_config.grab_core}")
+            else:
+                self.log_from_thread("当前平台不支持绑定抓帧线程")
 
         while self.camera_running:
             try:
+                accounting.begin_read()
                 if self.pipeline:  # RealSense模式
-                    frames = self.pipeline.wait_for_frames()
+                    try:
+                        frames = self.pipeline.wait_for_frames(FRAME_TIMEOUT_MS)
+                    except RuntimeError as e:
+                        raise SourceDisconnectedError(f"等待帧超时: {e}") from e
                     aligned_frames = self.align.process(frames)
 
                     color_frame = aligned_frames.get_color_frame()
                     depth_frame = aligned_frames.get_depth_frame()
 
                     if color_frame and depth_frame:
-                        self.current_rgb_frame = np.asanyarray(color_frame.get_data())
-                        depth_image = np.asanyarray(depth_frame.get_data())
-
-                        depth_colormap = cv2.applyColorMap(
-                            cv2.convertScaleAbs(depth_image, alpha=0.03),
-                            cv2.COLORMAP_JET
-                        )
-                        self.current_depth_frame = depth_image
+                        timing.record()
+                        tag = accounting.tag(*realsense_frame_info(color_frame))
+                        color_image = np.asanyarray(color_frame.get_data())
+                        self.record_sensor_shape(color_image.shape)
+                        processing_start = time.perf_counter()
+
+                        # 抓帧后立即裁剪/缩放，后续各阶段都处理较小的数组
+                        rgb_image = self.acquisition_roi.apply(color_image)
+                        depth_image = self.acquisition_roi.apply_depth(np.asanyarray(depth_frame.get_data()))
+                        self.current_frame = (rgb_image, depth_image, tag)
+                        self.feed_depth_fusion(depth_image)
+
+                        self.update_display(rgb_image, depth_image, tag)
+                        self.record_frame_processing(processing_start)
+                        frame_ok()
 
-                        self.update_display(self.current_rgb_frame, depth_colormap)
+                        frame_count += 1
+                        if frame_count % 30 == 0:
+                            current_time = time.time()
+                            actual_fps = 30 / (current_time - last_fps_time)
+                            last_fps_time = current_time
+                            self.status_var.set(f"🟢 相机运行中 - 实际帧率: {actual_fps:.1f} FPS"
+                                                f"{self.preview_rate_text()}{accounting.status_text()}"
+                                                f"{self.frame_share_text()}")
 
                 elif self.cap:  # OpenCV模式
-                    ret, frame = self.cap.read()
+                    try:
+                        if self.stereo_cap is not None:
+                            # 双目: 先同时抓取两台相机再解码，缩小两帧的时间差
+                            ret = self.cap.grab() and self.stereo_cap.grab()
+                            ret, frame = self.cap.retrieve() if ret else (False, None)
+                            stereo_ok, stereo_frame = self.stereo_cap.retrieve() if ret else (False, None)
+                            ret = ret and stereo_ok
+                        else:
+                            ret, frame = self.cap.read()
+                            stereo_frame = None
+                    except cv2.error as e:
+                        raise SourceDisconnectedError(f"读取帧失败: {e}") from e
                     if ret:
-                        self.current_rgb_frame = frame
-
-                        # 创建深度估计图像
-                        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-                        # 使用边缘检测来模拟深度信息
-                        edges = cv2.Canny(gray, 50, 150)
-                        depth_simulation = 255 - edges  # 反转边缘，边缘处深度较小
-
-                        # 应用高斯模糊来平滑深度图
-                        depth_simulation = cv2.GaussianBlur(depth_simulation, (5, 5), 0)
-
-                        depth_colormap = cv2.applyColorMap(depth_simulation, cv2.COLORMAP_JET)
-                        self.current_depth_frame = depth_simulation
-
-                        self.update_display(frame, depth_colormap)
+                        timing.record()
+                        tag = accounting.tag(sensor_time=opencv_sensor_time(self.cap))
+                        self.record_sensor_shape(frame.shape)
+                        processing_start = time.perf_counter()
+
+                        # 抓帧后立即裁剪/缩放，后续各阶段都处理较小的数组
+                        frame = self.acquisition_roi.apply(frame)
+
+                        # 深度估计在工作线程中进行，这里只提交最新帧并取最近的结果
+                        if stereo_frame is not None:
+                            stereo_frame = self.acquisition_roi.apply(stereo_frame)
+                        self.depth_stage.submit(frame, stereo_frame, tag)
+                        depth_estimate, depth_tag = self.depth_stage.latest_result or (None, None)
+                        if depth_estimate is not None and depth_estimate.shape[:2] != frame.shape[:2]:
+                            depth_estimate = None
+                        # 元数据中记录深度实际来自哪一帧（可能落后于RGB）
+                        tag.depth_sequence = depth_tag.sequence if depth_estimate is not None and depth_tag else None
+                        if depth_estimate is not None and depth_estimate is not previous_depth:
+                            # 融合只累加新的估计结果，不重复计入同一帧
+                            self.feed_depth_fusion(depth_estimate)
+                        if depth_estimate is not None:
+                            accounting.depth_result(reused=depth_estimate is previous_depth)
+                        previous_depth = depth_estimate
+                        self.current_frame = (frame, depth_estimate, tag)
+
+                        self.update_display(frame, depth_estimate, tag)
+                        self.record_frame_processing(processing_start)
+                        frame_ok()
 
                         # 计算实际帧率
                         frame_count += 1
@@ -1046,64 +1714,227 @@ class DepthCameraGUI:
                             current_time = time.time()
                             actual_fps = 30 / (current_time - last_fps_time)
                             last_fps_time = current_time
-                            self.status_var.set(f"🟢 相机运行中 - 实际帧率: {actual_fps:.1f} FPS")
+                            self.status_var.set(f"🟢 相机运行中 - 实际帧率: {actual_fps:.1f} FPS"
+                                                f"{self.preview_rate_text()}{self.depth_cost_text()}"
+                                                f"{accounting.status_text()}{self.frame_share_text()}")
                     else:
-                        self.log_debug("读取帧失败")
+                        raise SourceDisconnectedError("读取帧失败")
+
+                elif self.frame_source:  # 帧源模式（会话回放/合成测试源），节拍由帧源控制
+                    source = self.frame_source
+                    frame = source.read()
+                    if frame is None:
+                        if self.camera_running:
+                            if isinstance(source, PlaybackSource):
+                                self.log_debug(f"回放结束: {source.stats()}")
+                            self.root.after(0, self.stop_camera)
                         break
 
+                    rgb_frame, depth_frame = frame
+                    timing.record()
+                    tag = accounting.tag(source.sensor_sequence, source.sensor_time)
+                    if source.live:
+                        self.record_sensor_shape(rgb_frame.shape)
+                        rgb_frame = self.acquisition_roi.apply(rgb_frame)
+                        depth_frame = self.acquisition_roi.apply_depth(depth_frame)
+                    processing_start = time.perf_counter()
+                    self.current_frame = (rgb_frame, depth_frame, tag)
+                    self.feed_depth_fusion(depth_frame)
+
+                    self.update_display(rgb_frame, depth_frame, tag)
+                    self.record_frame_processing(processing_start)
+                    frame_ok()
+
+                    frame_count += 1
+                    if frame_count % 30 == 0:
+                        current_time = time.time()
+                        actual_fps = 30 / (current_time - last_fps_time)
+                        last_fps_time = current_time
+                        if isinstance(source, PlaybackSource):
+                            self.status_var.set(f"🎞️ 回放中 {source.position}/{len(source.index)}"
+                                                f" - 实际帧率: {actual_fps:.1f} FPS{self.preview_rate_text()}")
+                        else:
+                            self.status_var.set(f"🟢 相机运行中 - 实际帧率: {actual_fps:.1f} FPS"
+                                                f"{self.preview_rate_text()}{accounting.status_text()}"
+                                                f"{self.frame_share_text()}")
+                    continue
+
                 time.sleep(0.033)  # ~30 FPS
 
+            except SourceDisconnectedError as e:
+                # 只有帧源读取/等待帧失败才重连相机
+                if supervisor is None or not self.camera_running:
+                    self.log_debug(f"更新帧错误: {e}")
+                    break
+                # 重新打开相机，会话和计数保持不变；重连失败时由 on_capture_state 停止相机
+                if not supervisor.recover(e, lambda: self.camera_running):
+                    break
+                accounting.stream_restarted()
+                frame_count = 0
+                last_fps_time = time.time()
             except Exception as e:
-                self.log_debug(f"更新帧错误: {e}")
-                break
+                # 处理代码出错（而不是相机断开）: 跳过该帧继续采集，同一错误只记录一次
+                message = f"{type(e).__name__}: {e}"
+                if message != last_error and self.camera_running:
+                    self.log_from_thread(f"处理帧出错，已跳过: {message}")
+                last_error = message
+
+    def record_sensor_shape(self, shape):
+        """记录传感器原始帧尺寸，首帧时报告ROI节省的像素比例"""
+        if self.sensor_shape is None and not self.acquisition_roi.is_identity:
+            fraction = self.acquisition_roi.pixel_fraction(shape)
+            self.log_debug(f"ROI输出 {self.acquisition_roi.output_shape(shape)[::-1]}，"
+                           f"每帧处理像素减少 {1 - fraction:.0%}")
+        self.sensor_shape = shape
+
+    def record_frame_processing(self, start):
+        """以指数平均记录每帧处理耗时（抓帧之后到预览更新）"""
+        elapsed = (time.perf_counter() - start) * 1000
+        if self.frame_processing_ms is None:
+            self.frame_processing_ms = elapsed
+        else:
+            self.frame_processing_ms += 0.1 * (elapsed - self.frame_processing_ms)
+
+    def execution_summary(self):
+        """会话信息中的执行配置及实测效果（帧间隔抖动、CPU占用）"""
+        summary = self.execution_config.to_dict()
+        summary["effects"] = self.frame_timing.summary() if self.frame_timing else None
+        return summary
+
+    def acquisition_summary(self):
+        """会话信息中的采集ROI摘要，包含处理耗时和每次拍摄字节数"""
+        if self.sensor_shape is None:
+            return None
+        summary = self.acquisition_roi.metadata(self.sensor_shape)
+        summary["avg_frame_processing_ms"] = (round(self.frame_processing_ms, 3)
+                                              if self.frame_processing_ms is not None else None)
+        if self.save_counter:
+            bytes_per_capture = sum(stream["total_bytes"] for stream in
+                                    self.session.encoding_stats.summary().values()) / self.save_counter
+            summary["avg_image_bytes_per_capture"] = int(bytes_per_capture)
+            summary["estimated_image_bytes_saved_per_capture"] = int(
+                bytes_per_capture / summary["pixel_fraction"] - bytes_per_capture)
+        return summary
+
+    def update_display(self, rgb_frame, depth_frame, tag=None):
+        """采集线程每帧调用: 按预览节拍抽帧，缩放到显示区域后交给界面线程渲染
+
+        拍摄使用的 current_frame 不受影响，始终是全帧率全分辨率。
+        tag 为帧标记，用于统计从采集到显示的延迟。
+        """
+        # 控制服务的预览流（无客户端时不编码）
+        self.preview_broadcaster.publish(rgb_frame)
+
+        # 共享内存帧发布（全分辨率，只复制一次，不等待读取端）
+        publisher = self.frame_publisher
+        if publisher is not None:
+            publisher.publish(rgb_frame, depth_frame)
+
+        # 录制流（全分辨率、全帧率）
+        if self.stream_recording:
+            self.record_stream_frame(rgb_frame, depth_frame)
+
+        pacer = self.preview_pacer
+        if not pacer.should_render() or not pacer.frame_changed(rgb_frame):
+            return
 
-    def update_display(self, rgb_frame, depth_colormap):
-        """更新GUI显示"""
         try:
-            # 获取显示区域的实际大小
-            display_width, display_height = 400, 300
+            pacer.begin_render()
+            # 深度着色只在需要预览时进行
+            if depth_frame is None:
+                depth_colormap = np.zeros_like(rgb_frame)
+            else:
+                depth_colormap = colorize_depth(depth_frame)
 
-            # 处理RGB图像
-            rgb_resized = cv2.resize(rgb_frame, (display_width, display_height))
-            rgb_image = cv2.cvtColor(rgb_resized, cv2.COLOR_BGR2RGB)
-            rgb_pil = Image.fromarray(rgb_image)
+            # 按显示区域的实际大小缩放（保持宽高比）
+            rgb_small = resize_for_preview(rgb_frame, fit_size(rgb_frame.shape, *self.preview_sizes["rgb"]))
+            depth_small = resize_for_preview(depth_colormap,
+                                             fit_size(depth_colormap.shape, *self.preview_sizes["depth"]))
+            accounting = self.frame_accounting
+            queued = (accounting, tag, accounting.queued(tag)) if tag is not None and accounting else None
+            self.root.after(0, self.render_preview, pacer, rgb_small, depth_small, queued)
 
-            # 添加圆角效果
-            rgb_pil = self.add_rounded_corners(rgb_pil, 10)
-            rgb_photo = ImageTk.PhotoImage(rgb_pil)
+        except Exception as e:
+            pacer.finish_render(0.0)
+            self.log_debug(f"显示更新错误: {e}")
 
-            # 处理深度图像
-            depth_resized = cv2.resize(depth_colormap, (display_width, display_height))
-            depth_image = cv2.cvtColor(depth_resized, cv2.COLOR_BGR2RGB)
-            depth_pil = Image.fromarray(depth_image)
+    def render_preview(self, pacer, rgb_small, depth_small, queued=None):
+        """在界面线程中转换并显示预览，耗时反馈给预览节拍器
 
-            # 添加圆角效果
-            depth_pil = self.add_rounded_corners(depth_pil, 10)
+        queued 为 (帧统计, 帧标记, 入队时刻)，显示后记录排队时间和从采集到显示的延迟。
+        """
+        start = time.perf_counter()
+        try:
+            rgb_pil = self.add_rounded_corners(Image.fromarray(cv2.cvtColor(rgb_small, cv2.COLOR_BGR2RGB)), 10)
+            depth_pil = self.add_rounded_corners(Image.fromarray(cv2.cvtColor(depth_small, cv2.COLOR_BGR2RGB)), 10)
+            rgb_photo = ImageTk.PhotoImage(rgb_pil)
             depth_photo = ImageTk.PhotoImage(depth_pil)
 
-            # 更新显示
-            self.root.after(0, lambda: self.rgb_label.config(image=rgb_photo, text=""))
-            self.root.after(0, lambda: self.depth_label.config(image=depth_photo, text=""))
+            # 停止相机后到达的旧帧不再显示
+            if self.camera_running:
+                self.rgb_label.config(image=rgb_photo, text="")
+                self.depth_label.config(image=depth_photo, text="")
+
+                # 保持引用防止垃圾回收
+                self.rgb_label.image = rgb_photo
+                self.depth_label.image = depth_photo
 
-            # 保持引用防止垃圾回收
-            self.rgb_label.image = rgb_photo
-            self.depth_label.image = depth_photo
+                if queued is not None:
+                    accounting, tag, queued_at = queued
+                    accounting.displayed(tag, queued_at, start)
 
+                if "首帧显示" not in self.startup_timer.marks:
+                    self.startup_timer.mark("首帧显示")
+                    self.log_debug(f"启动耗时: {self.startup_timer.text()}")
+            elif queued is not None:
+                queued[0].discarded(queued[1])
         except Exception as e:
             self.log_debug(f"显示更新错误: {e}")
+        finally:
+            pacer.finish_render((time.perf_counter() - start) * 1000)
+
+    def on_preview_resized(self, stream, event):
+        """记录显示区域大小（扣除标签的外边距和边框），下一次预览按新尺寸缩放"""
+        self.preview_sizes[stream] = (max(1, event.width - 14), max(1, event.height - 14))
+
+    def depth_cost_text(self):
+        """状态栏中的深度估计耗时"""
+        stage = self.depth_stage
+        if stage is None or stage.estimate_ms is None:
+            return ""
+        return f" · 深度估计 {stage.estimate_ms:.1f}ms"
+
+    def frame_share_text(self):
+        """状态栏中的帧共享读取端数量和最大落后帧数"""
+        publisher = self.frame_publisher
+        if publisher is None or not publisher.active:
+            return ""
+        readers = publisher.reader_stats()
+        if not readers:
+            return " · 帧共享 无读取端"
+        return f" · 帧共享 {len(readers)}个读取端 落后≤{max(reader['lag_frames'] for reader in readers)}帧"
+
+    def preview_rate_text(self):
+        """状态栏中的预览帧率"""
+        if self.preview_pacer.measured_fps is None:
+            return ""
+        return f" · 预览 {self.preview_pacer.measured_fps:.0f} FPS"
 
     def add_rounded_corners(self, image, radius):
-        """为图像添加圆角效果"""
+        """为图像添加圆角效果（遮罩按尺寸缓存）"""
         try:
             # 创建圆角遮罩
-            mask = Image.new('L', image.size, 0)
-            from PIL import ImageDraw
-            draw = ImageDraw.Draw(mask)
-            draw.rounded_rectangle([(0, 0), image.size], radius, fill=255)
+            mask = self.corner_masks.get((image.size, radius))
+            if mask is None:
+                mask = Image.new('L', image.size, 0)
+                draw = ImageDraw.Draw(mask)
+                draw.rounded_rectangle([(0, 0), image.size], radius, fill=255)
+                if len(self.corner_masks) >= 8:
+                    self.corner_masks.clear()
+                self.corner_masks[(image.size, radius)] = mask
 
             # 应用遮罩
-            result = Image.new('RGBA', image.size, (0, 0, 0, 0))
-            result.paste(image, (0, 0))
+            result = image.convert('RGBA')
             result.putalpha(mask)
 
             return result
@@ -1111,9 +1942,187 @@ class DepthCameraGUI:
             # 如果圆角处理失败，返回原图
             return image
 
-    def capture_and_save(self):
-        """拍摄并保存图像和深度数据"""
-        if not self.camera_running or self.current_rgb_frame is None:
+    def parse_playback_speed(self):
+        """解析回放速度，"最大"返回0表示不限速"""
+        value = self.playback_speed_var.get()
+        if value.endswith('x'):
+            return float(value[:-1])
+        return 0
+
+    def on_playback_speed_changed(self):
+        """回放过程中实时修改速度"""
+        if isinstance(self.frame_source, PlaybackSource):
+            self.frame_source.set_speed(self.parse_playback_speed())
+
+    def start_playback(self):
+        """选择会话并通过实时预览管线回放"""
+        if self.camera_running:
+            messagebox.showwarning("警告", "请先停止相机再回放会话")
+            return
+
+        session_path = filedialog.askdirectory(title="选择要回放的会话",
+                                               initialdir=os.path.join(self.deepdata_path, "sessions"))
+        if not session_path:
+            return
+
+        source = PlaybackSource(session_path, speed=self.parse_playback_speed())
+        if not source.open():
+            self.log_debug(f"错误: 会话中没有可回放的帧: {os.path.basename(session_path)}")
+            messagebox.showerror("错误", "所选会话中没有可回放的帧")
+            return
+
+        self.frame_source = source
+        self.frame_timing = FrameTiming()
+        self.frame_accounting = FrameAccounting(live=False)
+        self.capture_supervisor = None
+        self.camera_running = True
+        self.log_debug(f"开始回放会话: {os.path.basename(session_path)} "
+                       f"({source.index.kind}, {len(source.index)} 帧)")
+
+        self.start_btn.config(state="disabled")
+        self.stop_btn.config(state="normal")
+        self.test_btn.config(state="disabled")
+        self.playback_btn.config(state="disabled")
+        self.status_var.set("🎞️ 回放中")
+
+        # 左右方向键按帧跳转
+        self.root.bind('<Left>', lambda e: self.seek_playback(-10))
+        self.root.bind('<Right>', lambda e: self.seek_playback(10))
+
+        self.update_thread = threading.Thread(target=self.update_frames, daemon=True)
+        self.update_thread.start()
+
+    def seek_playback(self, offset):
+        """回放跳转，offset为相对帧数"""
+        if isinstance(self.frame_source, PlaybackSource):
+            self.frame_source.seek(self.frame_source.position + offset)
+
+    def check_capture_gate(self, snapshot):
+        """对帧快照 (RGB, 深度, 帧标记) 做拍摄门控检查，返回判定结果；未启用门控时返回None"""
+        if not self.capture_gate_var.get():
+            return None
+
+        result = self.capture_gate.evaluate(snapshot[0])
+        if result.accepted:
+            return result
+
+        if result.reason == GateResult.BLURRY and self.gate_wait_var.get():
+            # 在短时间窗口内等待下一帧清晰帧
+            self.gate_waiting = True
+            self.log_debug(f"画面模糊 (清晰度 {result.sharpness:.0f})，等待清晰帧...")
+            self.root.after(15, lambda: self.wait_for_sharp_frame(time.time() + 1.0))
+        else:
+            self.reject_capture(result)
+        return result
+
+    def wait_for_sharp_frame(self, deadline):
+        """轮询最新帧，清晰则保存这一帧（同一快照），超时则放弃"""
+        snapshot = self.current_frame
+        if not self.camera_running or snapshot is None:
+            self.gate_waiting = False
+            return
+
+        result = self.capture_gate.evaluate(snapshot[0])
+        if result.accepted:
+            self.gate_waiting = False
+            self.capture_and_save(gate_result=result, snapshot=snapshot)
+        elif result.reason == GateResult.BLURRY and time.time() < deadline:
+            self.root.after(15, lambda: self.wait_for_sharp_frame(deadline))
+        else:
+            self.gate_waiting = False
+            self.reject_capture(result)
+
+    def reject_capture(self, result):
+        """拒绝拍摄并播放提示音"""
+        if result.reason == GateResult.DUPLICATE:
+            self.log_debug(f"已拒绝: 与最近拍摄重复 (哈希距离 {result.distance})")
+        else:
+            self.log_debug(f"已拒绝: 画面模糊 (清晰度 {result.sharpness:.0f} < "
+                           f"{self.capture_gate.sharpness_threshold:.0f})")
+        self.play_reject_cue()
+
+    def play_reject_cue(self):
+        """播放拒绝提示音（两声短促低音），不打断正在播放的语音提示"""
+        try:
+            frequency, size, channels = pygame.mixer.get_init()
+            t = np.arange(int(frequency * 0.08)) / frequency
+            beep = (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16)
+            gap = np.zeros(int(frequency * 0.05), dtype=np.int16)
+            samples = np.concatenate([beep, gap, beep])
+            if channels > 1:
+                samples = np.repeat(samples[:, None], channels, axis=1)
+            pygame.mixer.Sound(buffer=np.ascontiguousarray(samples).tobytes()).play()
+        except Exception:
+            self.root.bell()
+
+    def start_depth_fusion(self, gate_result, snapshot, method, frames):
+        """开始多帧融合: 触发时快照中的RGB帧随融合器保存，由抓帧线程逐帧累加接下来的深度帧"""
+        rgb_frame, depth, frame_tag = snapshot
+        if depth is None:
+            return False
+        fusion = DepthFusion(depth.shape, depth.dtype, frames, method, context=(rgb_frame, frame_tag, gate_result))
+        self.fusion_pending = True
+        self.active_fusion = fusion
+        self.depth_fusion = fusion
+        self.log_debug(f"开始深度融合: {method} {frames}帧")
+
+        # 帧源中断或帧率过低时放弃，不让拍摄一直挂起
+        self.root.after(int(1000 * (2.0 + frames / 5.0)), lambda: self.check_depth_fusion_timeout(fusion))
+        return True
+
+    def check_depth_fusion_timeout(self, fusion):
+        if self.depth_fusion is fusion:
+            self.cancel_depth_fusion(f"超时，仅收集到 {fusion.added}/{fusion.frames} 帧", fusion)
+
+    def feed_depth_fusion(self, depth):
+        """在抓帧线程中累加一帧深度，收集满后在后台线程计算融合结果"""
+        fusion = self.depth_fusion
+        if fusion is None:
+            return
+        try:
+            done = fusion.add(depth)
+        except ValueError as e:
+            reason = str(e)
+            self.root.after(0, lambda: self.cancel_depth_fusion(reason, fusion))
+            return
+        if done:
+            self.depth_fusion = None
+            self.root.after(0, lambda: self.run_in_background(
+                fusion.result, lambda result, error: self.on_depth_fusion_finished(fusion, result, error)))
+
+    def on_depth_fusion_finished(self, fusion, result, error):
+        """融合计算完成（界面线程）: 只保存仍是当前拍摄的融合结果，已取消或相机已停止时丢弃"""
+        if fusion is not self.active_fusion:
+            self.log_debug("丢弃已取消的深度融合结果")
+            return
+        self.active_fusion = None
+        self.fusion_pending = False
+        if error is not None:
+            self.log_debug(f"深度融合失败: {error}")
+            return
+        rgb_frame, frame_tag, gate_result = fusion.context
+        self.capture_and_save(gate_result=gate_result, fusion_result=(rgb_frame, frame_tag, result))
+
+    def cancel_depth_fusion(self, reason, fusion=None):
+        """取消当前的融合；指定 fusion 时只在它仍是当前融合时取消"""
+        if fusion is not None and fusion is not self.active_fusion:
+            return
+        self.depth_fusion = None
+        self.active_fusion = None
+        self.fusion_pending = False
+        self.log_debug(f"深度融合已取消: {reason}")
+
+    def capture_and_save(self, gate_result=None, fusion_result=None, snapshot=None):
+        """拍摄并保存图像和深度数据
+
+        首次调用时读取一次最新帧快照 (RGB, 深度, 帧标记)，门控、融合和保存都使用这同一个快照；
+        等待清晰帧后以通过门控的快照 snapshot 再次调用。
+        选择了深度融合时先收集后续帧，融合完成后以 fusion_result=(RGB帧, 帧标记, FusionResult) 再次调用保存。
+        触发时刻在首次调用时记录，等待清晰帧或融合后再次调用时沿用。
+        """
+        if snapshot is None:
+            snapshot = self.current_frame
+        if not self.camera_running or snapshot is None:
             self.log_debug("错误: 相机未运行或无图像数据")
             messagebox.showwarning("警告", "请先启动相机")
             return
@@ -1123,13 +2132,38 @@ class DepthCameraGUI:
             messagebox.showerror("错误", "会话文件夹未创建，请重新启动相机")
             return
 
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]  # 包含毫秒
-            capture_id = f"{self.save_counter + 1:04d}_{timestamp}"
+        if self.gate_waiting or self.fusion_pending:
+            return
+
+        if self.capture_supervisor is not None and self.capture_supervisor.state == STATE_RECONNECTING:
+            self.log_debug("相机正在重连，暂不能拍摄")
+            return
 
-            # 保存RGB图像到rgb文件夹
-            rgb_filename = f"rgb_{capture_id}.png"
-            rgb_path = os.path.join(self.current_session_path, "rgb", rgb_filename)
+        if gate_result is None and fusion_result is None:
+            self.capture_trigger_time = time.perf_counter()
+
+        if gate_result is None:
+            gate_result = self.check_capture_gate(snapshot)
+            if gate_result is not None and not gate_result.accepted:
+                return
+
+        if fusion_result is None:
+            preset = FUSION_PRESETS.get(self.depth_fusion_var.get())
+            if preset is not None and self.start_depth_fusion(gate_result, snapshot, *preset):
+                return
+            rgb_frame, depth_frame, frame_tag = snapshot
+            extra_layers, fusion_metadata = None, None
+        else:
+            rgb_frame, frame_tag, fused = fusion_result
+            depth_frame, extra_layers, fusion_metadata = fused.depth, {"depth_std": fused.stddev}, fused.metadata
+
+        try:
+            # 存储调节器根据实测延迟和剩余空间决定本次的编码设置
+            decision = self.session.advise_storage(self.rgb_format_var.get(), self.depth_vis_format_var.get())
+            if decision.action == StorageDecision.STOP:
+                raise StorageFullError(decision.reason)
+            if decision.action == StorageDecision.WARN:
+                self.log_debug(f"警告: {decision.reason}")
 
             self.pictureSaveNumber -= 1
             if self.pictureSaveMode == 0:
@@ -1161,69 +2195,97 @@ class DepthCameraGUI:
                     pygame.mixer.music.load("D:\\python project\\ReadCamera\\OK.wav")
                     pygame.mixer.music.play()
 
-            if len(self.current_rgb_frame.shape) == 3:
-                rgb_save = cv2.cvtColor(self.current_rgb_frame, cv2.COLOR_BGR2RGB)
-            else:
-                rgb_save = self.current_rgb_frame
-
-            Image.fromarray(rgb_save).save(rgb_path)
-
-            # 保存深度数据到depth文件夹
-            depth_filename = f"depth_{capture_id}.npy"
-            depth_path = os.path.join(self.current_session_path, "depth", depth_filename)
-            np.save(depth_path, self.current_depth_frame)
-
-            # 保存深度可视化图像到depth_vis文件夹
-            depth_vis_filename = None
-            if self.current_depth_frame is not None:
-                if self.pipeline:
-                    depth_colormap = cv2.applyColorMap(
-                        cv2.convertScaleAbs(self.current_depth_frame, alpha=0.03),
-                        cv2.COLORMAP_JET
-                    )
-                else:
-                    depth_colormap = cv2.applyColorMap(self.current_depth_frame, cv2.COLORMAP_JET)
-
-                depth_vis_filename = f"depth_vis_{capture_id}.png"
-                depth_vis_path = os.path.join(self.current_session_path, "depth_vis", depth_vis_filename)
-                cv2.imwrite(depth_vis_path, depth_colormap)
-
-            # 保存元数据到metadata文件夹
-            metadata = {
-                "capture_id": capture_id,
-                "capture_index": self.save_counter + 1,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
-                "session_name": os.path.basename(self.current_session_path),
-                "camera_type": self.camera_type,
-                "camera_index": self.camera_index if hasattr(self, 'camera_index') else 0,
-                "resolution": self.resolution_var.get(),
-                "fps": self.fps_var.get(),
-                "rgb_file": rgb_filename,
-                "depth_file": depth_filename,
-                "depth_visualization": depth_vis_filename,
-                "image_size": self.current_rgb_frame.shape[:2],
-                "relative_paths": {
-                    "rgb": os.path.join("rgb", rgb_filename),
-                    "depth": os.path.join("depth", depth_filename),
-                    "depth_vis": os.path.join("depth_vis", depth_vis_filename) if depth_vis_filename else None
-                }
-            }
-
-            metadata_filename = f"metadata_{capture_id}.json"
-            metadata_path = os.path.join(self.current_session_path, "metadata", metadata_filename)
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
-
-            self.save_counter += 1
+            accounting = self.frame_accounting or FrameAccounting()
+            frame_info = accounting.capture_started(frame_tag, self.capture_trigger_time)
+            if fusion_result is not None:
+                # 融合深度来自触发后的多帧，见 depth_fusion 元数据
+                frame_info["depth_sequence"] = frame_info["depth_lag_frames"] = None
+            if frame_info["duplicate"]:
+                self.log_debug(f"警告: 与上一次拍摄是同一帧 (帧序号 {frame_info['sequence']})")
+
+            result = self.session.save_capture(
+                rgb_frame, depth_frame, decision,
+                extra_metadata={
+                    "capture_gate": gate_result.to_dict() if gate_result else None,
+                    "acquisition": self.acquisition_roi.metadata(self.sensor_shape) if self.sensor_shape else None,
+                    "depth_fusion": fusion_metadata,
+                    "frame": frame_info,
+                },
+                extra_layers=extra_layers)
+            trigger_to_save_ms = accounting.capture_finished(frame_tag, self.capture_trigger_time)
+
+            self.save_counter = self.session.capture_count
             self.counter_var.set(str(self.save_counter))
-
-            self.log_debug(f"数据保存成功: {capture_id}")
+            if gate_result is not None:
+                self.capture_gate.accept(gate_result)
+
+            encoding_info = result.metadata["encoding"]
+            depth_stats = result.metadata["depth_stats"]
+            self.log_debug(f"数据保存成功: {result.capture_id}"
+                           + (f" (触发到保存 {trigger_to_save_ms:.0f}ms，触发时帧龄 "
+                              f"{frame_info['frame_age_at_trigger_ms']:.0f}ms)"
+                              if trigger_to_save_ms is not None and "frame_age_at_trigger_ms" in frame_info else ""))
+            self.log_debug("编码开销: " + ", ".join(
+                f"{stream} {info['format']} {info['encode_ms']:.1f}ms {info['bytes'] / 1024:.0f}KB"
+                for stream, info in encoding_info.items()))
             self.log_debug(f"保存位置: {os.path.basename(self.current_session_path)}")
-
+            if fusion_metadata:
+                self.log_debug(f"深度融合 {fusion_metadata['method']} {fusion_metadata['frames']}帧: "
+                               f"有效像素 {fusion_metadata['single_frame_valid_ratio']:.0%} → "
+                               f"{fusion_metadata['fused_valid_ratio']:.0%}，"
+                               f"噪声标准差中位数 {fusion_metadata['noise_std_median']}")
+            if depth_stats and depth_stats["valid_ratio"] < 0.5:
+                self.log_debug(f"警告: 深度有效像素比例仅 {depth_stats['valid_ratio']:.0%}，"
+                               f"中心空洞 {depth_stats['center_hole_fraction']:.0%}")
+
+        except StorageFullError as e:
+            self.log_debug(f"错误: {str(e)}，已停止保存")
+            self.status_var.set(f"🔴 {str(e)}")
+            messagebox.showerror("错误", f"{str(e)}，请清理磁盘后再拍摄")
         except Exception as e:
             self.log_debug(f"保存失败: {str(e)}")
             messagebox.showerror("错误", f"保存失败: {str(e)}")
 
+    def recover_unfinished_sessions(self):
+        """启动时扫描会话目录，修复未正常结束的会话"""
+        try:
+            recovered = recover_sessions(os.path.join(self.deepdata_path, "sessions"))
+            for session_info in recovered:
+                self.log_debug(f"已修复未结束的会话: {session_info.get('session_name')} "
+                               f"({session_info['total_captures']} 张, 来源: {session_info['recovery_source']})")
+        except Exception as e:
+            self.log_debug(f"修复会话时出错: {str(e)}")
+
+    def poll_storage(self):
+        """会话期间定期检查剩余空间，空间不足时提前告警"""
+        if self.storage_poll_job:
+            self.root.after_cancel(self.storage_poll_job)
+            self.storage_poll_job = None
+        if not self.current_session_path or not self.session:
+            return
+
+        try:
+            free_bytes = self.session.storage_governor.check_free_space(max_age=0)
+            remaining = self.session.storage_governor.remaining_captures()
+            if free_bytes < self.session.storage_governor.stop_free_bytes:
+                state = StorageDecision.STOP
+                message = f"剩余空间不足 {free_bytes / 1024 / 1024:.0f}MB，已停止保存"
+            elif free_bytes < self.session.storage_governor.warn_free_bytes:
+                state = StorageDecision.WARN
+                hint = f"，约可再拍 {remaining} 张" if remaining is not None else ""
+                message = f"剩余空间偏低 {free_bytes / 1024 / 1024:.0f}MB{hint}"
+            else:
+                state, message = StorageDecision.OK, None
+
+            if state != self.storage_state and message:
+                self.log_debug(f"警告: {message}")
+                self.status_var.set(("🔴 " if state == StorageDecision.STOP else "🟠 ") + message)
+            self.storage_state = state
+        except OSError as e:
+            self.log_debug(f"检查剩余空间失败: {e}")
+
+        self.storage_poll_job = self.root.after(5000, self.poll_storage)
+
     def open_deepdata_folder(self):
         """打开数据文件夹"""
         try:
@@ -1258,12 +2320,561 @@ class DepthCameraGUI:
             self.log_debug(f"无法打开会话文件夹: {str(e)}")
             messagebox.showerror("错误", f"无法打开会话文件夹: {str(e)}")
 
+    def get_thumbnail_cache(self):
+        """获取缩略图缓存，首次使用时创建"""
+        if self.thumbnail_cache is None:
+            self.thumbnail_cache = ThumbnailCache(os.path.join(self.deepdata_path, "temp", "thumbnails"),
+                                                  workers=self.execution_config.worker_threads)
+        return self.thumbnail_cache
+
+    def open_gallery(self):
+        """打开会话画廊"""
+        try:
+            SessionGalleryWindow(self)
+            self.log_debug("打开会话画廊")
+        except Exception as e:
+            self.log_debug(f"无法打开画廊: {str(e)}")
+            messagebox.showerror("错误", f"无法打开画廊: {str(e)}")
+
+    def start_compaction(self):
+        """在低优先级子进程中归档旧会话（限制I/O速率），不占用界面进程"""
+        if self.compaction_process is not None:
+            messagebox.showinfo("提示", "归档任务正在运行")
+            return
+        min_age_days = simpledialog.askinteger("归档旧会话", "归档结束超过多少天的会话:",
+                                               initialvalue=30, minvalue=0, parent=self.root)
+        if min_age_days is None:
+            return
+
+        command = [sys.executable, os.path.abspath(__file__), "compact",
+                   "--output", self.deepdata_path, "--min-age-days", str(min_age_days)]
+        # Windows下没有nice，以较低的进程优先级类启动
+        creationflags = getattr(subprocess, "BELOW_NORMAL_PRIORITY_CLASS", 0)
+        try:
+            self.compaction_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                                       creationflags=creationflags)
+        except OSError as e:
+            self.log_debug(f"无法启动归档任务: {e}")
+            return
+        self.compact_btn.config(state="disabled")
+        self.log_debug(f"归档任务已启动: 结束超过 {min_age_days} 天的会话")
+        self.run_in_background(self.compaction_process.communicate, self.on_compaction_finished)
+
+    def on_compaction_finished(self, result, error):
+        process = self.compaction_process
+        self.compaction_process = None
+        self.compact_btn.config(state="normal")
+        if error is not None:
+            self.log_debug(f"归档任务出错: {error}")
+            return
+        stdout, stderr = result
+        for line in stderr.decode('utf-8', errors='replace').splitlines():
+            self.log_debug(line)
+        try:
+            stats = json.loads(stdout.decode('utf-8'))
+            self.log_debug(f"归档完成: {stats['sessions_archived']} 个会话，"
+                           f"{stats['original_bytes'] / 1e6:.1f} MB → {stats['archive_bytes'] / 1e6:.1f} MB")
+        except (ValueError, KeyError):
+            self.log_debug(f"归档任务退出 (返回码 {process.returncode})")
+
+    def toggle_control_server(self):
+        """开启/关闭本地控制服务"""
+        if self.control_server:
+            self.control_server.stop()
+            self.control_server = None
+            self.server_btn.config(text="🌐 开启控制服务")
+            self.log_debug("控制服务已关闭")
+            return
+
+        try:
+            self.control_server = ControlServer(GuiController(self), self.preview_broadcaster)
+            self.control_server.start()
+            self.server_btn.config(text="🌐 关闭控制服务")
+            self.log_debug(f"控制服务已开启: {self.control_server.url} (预览: /preview.mjpg)，"
+                           f"令牌已写入 {self.control_server.token_file}")
+        except OSError as e:
+            self.control_server = None
+            self.log_debug(f"控制服务启动失败: {str(e)}")
+            messagebox.showerror("错误", f"控制服务启动失败: {str(e)}")
+
+    def toggle_frame_share(self):
+        """开启/关闭共享内存帧发布，本机其它进程可用 frame_share.FrameSubscriber 读取实时帧"""
+        if self.frame_publisher is not None:
+            publisher, self.frame_publisher = self.frame_publisher, None
+            self.log_debug(f"帧共享已关闭: {publisher.summary()}")
+            publisher.close()
+            self.share_btn.config(text="📡 开启帧共享")
+            return
+
+        self.frame_publisher = FramePublisher(DEFAULT_SHARE_NAME, log=self.log_from_thread)
+        self.share_btn.config(text="📡 关闭帧共享")
+        self.log_debug(f"帧共享已开启: {DEFAULT_SHARE_NAME}（相机运行时发布）")
+
+    def toggle_stream_recording(self):
+        """开始/暂停把实时帧录制到当前会话的 stream/，结束会话后可用“回放会话”打开"""
+        if self.stream_recording:
+            self.stream_recording = False
+            self.record_btn.config(text="⏺️ 录制流")
+            recorder = self.stream_recorder
+            self.log_debug(f"录制流已暂停，已录制 {recorder.frame_count if recorder else 0} 帧")
+            return
+
+        if not self.camera_running or not self.current_session_path:
+            messagebox.showwarning("警告", "请先启动相机")
+            return
+        if isinstance(self.frame_source, PlaybackSource):
+            messagebox.showwarning("警告", "回放时不能录制流")
+            return
+        with self.stream_lock:
+            if self.stream_recorder is None:
+                # 同一会话只用一个写入器: 流信息按首帧确定，重新创建会覆盖已录制部分的信息
+                self.stream_recorder = StreamRecorder(self.current_session_path, self.selected_fps())
+        self.stream_recording = True
+        self.record_btn.config(text="⏹️ 停止录制")
+        self.log_debug(f"开始录制流: {os.path.join(self.current_session_path, STREAM_FOLDER)}")
+
+    def record_stream_frame(self, rgb_frame, depth_frame):
+        """抓帧线程中写入一帧录制流；写入失败（磁盘错误、帧尺寸变化）时停止录制"""
+        with self.stream_lock:
+            recorder = self.stream_recorder
+            if recorder is None or not self.stream_recording:
+                return
+            try:
+                recorder.write(rgb_frame, depth_frame)
+            except (OSError, ValueError) as e:
+                self.stream_recording = False
+                self.log_from_thread(f"录制流已停止: {e}")
+                self.root.after(0, lambda: self.record_btn.config(text="⏺️ 录制流"))
+
+    def close_stream_recorder(self):
+        """结束会话时关闭录制流，返回写入会话信息的录制统计；本会话未录制时返回None"""
+        with self.stream_lock:
+            recorder, self.stream_recorder = self.stream_recorder, None
+            self.stream_recording = False
+            if recorder is None:
+                return None
+            recorder.close()
+        self.log_debug(f"录制流已保存: {recorder.frame_count} 帧")
+        return {"frames": recorder.frame_count, "fps": recorder.fps, "folder": STREAM_FOLDER}
+
+    def status_snapshot(self):
+        """控制服务 /status 接口返回的状态"""
+        return {
+            "ok": True,
+            "camera_running": self.camera_running,
+            "camera_type": self.camera_type,
+            "session": os.path.basename(self.current_session_path) if self.current_session_path else None,
+            "total_captures": self.save_counter,
+            "shot_mode": self.pictureSaveNumber if self.pictureSaveMode >= 0 else None,
+            "status": self.status_var.get(),
+            "preview_clients": self.preview_broadcaster.clients,
+            "frame_processing_ms": round(self.frame_processing_ms, 3) if self.frame_processing_ms else None,
+            "frame_share": self.frame_publisher.summary() if self.frame_publisher else None,
+            "frame_accounting": self.frame_accounting.summary() if self.frame_accounting else None,
+            "reconnect": self.capture_supervisor.summary() if self.capture_supervisor else None,
+        }
+
     def on_closing(self):
         """程序关闭时的清理工作"""
         self.stop_camera()
+        if self.control_server:
+            self.control_server.stop()
+        if self.frame_publisher is not None:
+            self.frame_publisher.close()
+        if self.thumbnail_cache:
+            self.thumbnail_cache.close()
+        if self.preopen is not None:
+            self.preopen.discard()
+        if self.compaction_process is not None:
+            # 未提交的归档在下次运行时重新生成，原文件在校验通过前不会删除
+            self.compaction_process.terminate()
         self.root.destroy()
 
 
+class GuiController:
+    """控制服务与界面之间的适配器，所有操作都转到Tk主线程执行，沿用界面按钮的语义"""
+
+    def __init__(self, app, timeout=10.0):
+        self.app = app
+        self.timeout = timeout
+
+    def call(self, func):
+        """在Tk主线程中执行func并等待结果"""
+        done = threading.Event()
+        result = {}
+
+        def run():
+            try:
+                result["value"] = func()
+            except Exception as e:
+                result["error"] = str(e)
+            finally:
+                done.set()
+
+        self.app.root.after(0, run)
+        if not done.wait(self.timeout):
+            return {"ok": False, "error": "界面响应超时"}
+        if "error" in result:
+            return {"ok": False, "error": result["error"]}
+        return result["value"]
+
+    def start(self):
+        """启动相机: 设备在后台线程中打开，等待启动完成后返回状态"""
+        started = threading.Event()
+
+        def run():
+            if self.app.camera_running or self.app.camera_starting:
+                return {"ok": False, "error": "相机已在运行"}
+            self.app.start_camera(on_done=lambda ok: started.set())
+            return {"ok": True}
+
+        result = self.call(run)
+        if not result.get("ok"):
+            return result
+        if not started.wait(self.timeout):
+            return {"ok": False, "error": "相机启动超时"}
+        return self.call(lambda: self.app.status_snapshot() | {"ok": self.app.camera_running})
+
+    def stop(self):
+        def run():
+            if not self.app.camera_running:
+                return {"ok": False, "error": "相机未运行"}
+            captures = self.app.save_counter
+            session = self.app.current_session_path
+            self.app.stop_camera()
+            return {"ok": True, "session": os.path.basename(session) if session else None,
+                    "total_captures": captures}
+        return self.call(run)
+
+    def capture(self):
+        def run():
+            if not self.app.camera_running or not self.app.current_session_path:
+                return {"ok": False, "error": "相机未运行"}
+            before = self.app.save_counter
+            self.app.capture_and_save()
+            return {"ok": self.app.save_counter > before,
+                    "pending": self.app.gate_waiting or self.app.fusion_pending,
+                    "total_captures": self.app.save_counter}
+        return self.call(run)
+
+    def burst(self, count, interval):
+        """连拍: 在服务线程中定时触发，每次拍摄仍在主线程执行"""
+        results = []
+        for i in range(max(0, count)):
+            if i:
+                time.sleep(max(0.0, interval))
+            result = self.capture()
+            results.append(result)
+            if not result.get("ok") and not result.get("pending"):
+                break
+        saved = sum(1 for result in results if result.get("ok"))
+        return {"ok": saved > 0, "requested": count, "saved": saved,
+                "total_captures": self.app.save_counter}
+
+    def set_mode(self, count):
+        def run():
+            if count == 20:
+                self.app.changeMode1()
+            elif count == 10:
+                self.app.changeMode2()
+            else:
+                return {"ok": False, "error": "拍摄模式只支持10或20张"}
+            return {"ok": True, "shot_mode": count}
+        return self.call(run)
+
+    def status(self):
+        return self.call(self.app.status_snapshot)
+
+
+class SessionGalleryWindow:
+    """会话画廊窗口 - 虚拟化网格，只为可视区域内的拍摄加载缩略图"""
+
+    ALL_SESSIONS = "全部会话"
+    TILE_GAP = 12
+    LABEL_HEIGHT = 22
+    PREFETCH_ROWS = 2
+
+    def __init__(self, app):
+        self.app = app
+        self.colors = app.colors
+        self.cache = app.get_thumbnail_cache()
+        self.thumb_width, self.thumb_height = self.cache.thumb_size
+        self.tile_width = self.thumb_width * 2 + self.TILE_GAP
+        self.tile_height = self.thumb_height + self.LABEL_HEIGHT
+
+        self.captures = []
+        self.photos = {}
+        self.depth_vis_caches = {}
+        self.columns = 1
+        self.redraw_pending = False
+
+        self.window = tk.Toplevel(app.root)
+        self.window.title("🖼️ 会话画廊")
+        self.window.geometry("1100x750")
+        self.window.configure(bg=self.colors['background'])
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.build()
+        self.load_captures()
+
+    def build(self):
+        """创建画廊界面"""
+        toolbar = tk.Frame(self.window, bg=self.colors['background'])
+        toolbar.pack(fill=tk.X, padx=15, pady=(15, 10))
+
+        tk.Label(toolbar, text="📁 会话:",
+                font=('Microsoft YaHei UI', 10, 'bold'),
+                fg=self.colors['text'], bg=self.colors['background']).pack(side=tk.LEFT)
+
+        sessions_path = os.path.join(self.app.deepdata_path, "sessions")
+        session_names = sorted((entry.name for entry in os.scandir(sessions_path) if entry.is_dir()),
+                               reverse=True) if os.path.exists(sessions_path) else []
+
+        default_session = self.ALL_SESSIONS
+        if self.app.current_session_path:
+            default_session = os.path.basename(self.app.current_session_path)
+
+        self.session_var = tk.StringVar(value=default_session)
+        session_combo = ttk.Combobox(toolbar, textvariable=self.session_var,
+                                     values=[self.ALL_SESSIONS] + session_names,
+                                     state="readonly", width=32)
+        session_combo.pack(side=tk.LEFT, padx=(8, 0))
+        session_combo.bind("<<ComboboxSelected>>", lambda e: self.load_captures())
+
+        self.info_var = tk.StringVar(value="")
+        tk.Label(toolbar, textvariable=self.info_var,
+                font=('Microsoft YaHei UI', 9),
+                fg=self.colors['text_light'], bg=self.colors['background']).pack(side=tk.RIGHT)
+
+        canvas_frame = tk.Frame(self.window, bg=self.colors['surface'])
+        canvas_frame.pack(fill=tk.BOTH, expand=True, padx=15, pady=(0, 15))
+
+        self.canvas = tk.Canvas(canvas_frame, bg=self.colors['surface'], highlightthickness=0)
+        scrollbar = ttk.Scrollbar(canvas_frame, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=lambda first, last: (scrollbar.set(first, last),
+                                                                  self.schedule_redraw()))
+
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.canvas.bind("<Configure>", lambda e: self.relayout())
+        self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.canvas.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-3, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.canvas.yview_scroll(3, "units"))
+
+    def load_captures(self):
+        """扫描会话目录，建立拍摄列表（只读取目录项，不解码图像）"""
+        sessions_path = os.path.join(self.app.deepdata_path, "sessions")
+        selected = self.session_var.get()
+        if selected == self.ALL_SESSIONS:
+            session_dirs = sorted((entry.path for entry in os.scandir(sessions_path) if entry.is_dir()),
+                                  reverse=True) if os.path.exists(sessions_path) else []
+        else:
+            session_dirs = [os.path.join(sessions_path, selected)]
+
+        captures = []
+        for session_dir in session_dirs:
+            captures.extend(self.scan_session(session_dir))
+
+        self.captures = captures
+        self.photos = {}
+        self.canvas.yview_moveto(0)
+        self.relayout()
+
+    def scan_session(self, session_dir):
+        """按capture_id配对rgb和depth_vis文件，没有depth_vis但有深度数据时在查看时按需生成"""
+        if is_archived(session_dir):
+            return self.scan_archived_session(session_dir)
+
+        def list_files(folder, prefix):
+            folder_path = os.path.join(session_dir, folder)
+            if not os.path.exists(folder_path):
+                return {}
+            files = {}
+            for entry in os.scandir(folder_path):
+                if entry.is_file() and entry.name.startswith(prefix):
+                    files[os.path.splitext(entry.name)[0][len(prefix):]] = entry.path
+            return files
+
+        rgb_files = list_files("rgb", "rgb_")
+        depth_vis_files = list_files("depth_vis", "depth_vis_")
+        depth_files = list_files("depth", "depth_")
+        session_name = os.path.basename(session_dir)
+        depth_vis_cache = self.depth_vis_caches.setdefault(session_dir, DepthVisCache(session_dir))
+        captures = []
+        for capture_id in sorted(rgb_files):
+            depth_vis = depth_vis_files.get(capture_id)
+            depth = depth_files.get(capture_id)
+            if depth_vis is None and depth is not None:
+                depth_vis = depth_vis_cache.expected_path(capture_id)
+            captures.append({"capture_id": capture_id,
+                             "session": session_name,
+                             "rgb": rgb_files[capture_id],
+                             "depth_vis": depth_vis,
+                             "depth": depth,
+                             "depth_vis_cache": depth_vis_cache})
+        return captures
+
+    def scan_archived_session(self, session_dir):
+        """已归档会话: 按归档的元数据表列出拍摄，缩略图直接从归档读取（只读，深度可视化不写回会话）"""
+        archive = open_archive(session_dir)
+        version_path = os.path.join(session_dir, ARCHIVE_INDEX_FILE)
+        session_name = os.path.basename(session_dir)
+
+        def member(path):
+            relative = os.path.relpath(path, session_dir) if path else None
+            return relative if relative and archive.has(relative) else None
+
+        captures = []
+        for metadata in load_session_records(session_dir):
+            paths = metadata["paths"]
+            rgb, depth, depth_vis = member(paths["rgb"]), member(paths["depth"]), member(paths.get("depth_vis"))
+            if rgb is None:
+                continue
+            capture = {"capture_id": metadata.get("capture_id") or "",
+                       "session": session_name,
+                       "rgb": paths["rgb"],
+                       "rgb_source": (version_path, lambda r=rgb: archive.read_image(r, cv2.IMREAD_COLOR)),
+                       "depth_vis": None,
+                       "depth": None}
+            if depth_vis is not None:
+                capture["depth_vis"] = paths["depth_vis"]
+                capture["depth_vis_source"] = (version_path,
+                                               lambda r=depth_vis: archive.read_image(r, cv2.IMREAD_COLOR))
+            elif depth is not None:
+                capture["depth_vis"] = os.path.join(session_dir, "depth_vis", f"depth_vis_{capture['capture_id']}")
+                capture["depth_vis_source"] = (version_path,
+                                               lambda r=depth: render_depth_vis(archive.load_array(r)))
+            captures.append(capture)
+        return captures
+
+    def materializer(self, capture):
+        """缩略图工作线程中调用: depth_vis 尚不存在时先由深度数据生成"""
+        if capture.get("depth") is None:
+            return None
+        return lambda: capture["depth_vis_cache"].get(capture["capture_id"], capture["depth"])
+
+    def relayout(self):
+        """窗口尺寸变化时重新计算列数和滚动区域"""
+        width = max(self.canvas.winfo_width(), self.tile_width)
+        self.columns = max(1, (width - self.TILE_GAP) // (self.tile_width + self.TILE_GAP))
+        rows = (len(self.captures) + self.columns - 1) // self.columns
+        total_height = rows * (self.tile_height + self.TILE_GAP) + self.TILE_GAP
+        self.canvas.configure(scrollregion=(0, 0, width, total_height))
+        self.schedule_redraw()
+
+    def on_mouse_wheel(self, event):
+        self.canvas.yview_scroll(int(-event.delta / 40), "units")
+
+    def schedule_redraw(self):
+        """合并同一轮事件中的多次重绘请求"""
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            self.window.after_idle(self.redraw)
+
+    def visible_range(self, extra_rows=0):
+        row_height = self.tile_height + self.TILE_GAP
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first_row = max(0, int(top // row_height) - extra_rows)
+        last_row = int(bottom // row_height) + 1 + extra_rows
+        return first_row * self.columns, min(len(self.captures), last_row * self.columns)
+
+    def redraw(self):
+        """只绘制可视区域内的拍摄，其余缩略图请求被取消"""
+        self.redraw_pending = False
+        if not self.window.winfo_exists():
+            return
+
+        self.canvas.delete("tile")
+        start, end = self.visible_range()
+        prefetch_start, prefetch_end = self.visible_range(self.PREFETCH_ROWS)
+
+        wanted = set()
+        for capture in self.captures[prefetch_start:prefetch_end]:
+            wanted.update(path for path in (capture["rgb"], capture["depth_vis"]) if path)
+        self.cache.set_wanted(wanted)
+
+        visible_photos = {}
+        for index in range(start, end):
+            capture = self.captures[index]
+            row, column = divmod(index, self.columns)
+            x = self.TILE_GAP + column * (self.tile_width + self.TILE_GAP)
+            y = self.TILE_GAP + row * (self.tile_height + self.TILE_GAP)
+
+            for offset, path, prepare, source in ((0, capture["rgb"], None, capture.get("rgb_source")),
+                                                  (self.thumb_width + self.TILE_GAP // 2, capture["depth_vis"],
+                                                   self.materializer(capture), capture.get("depth_vis_source"))):
+                photo = self.thumbnail_photo(path, visible_photos, prepare, source)
+                if photo is not None:
+                    tag = self.canvas.create_image(x + offset, y, image=photo, anchor='nw', tags=("tile",))
+                    self.canvas.tag_bind(tag, "<Double-Button-1>",
+                                         lambda e, p=path: self.open_file(p))
+                else:
+                    self.canvas.create_rectangle(x + offset, y, x + offset + self.thumb_width,
+                                                 y + self.thumb_height, fill='#FAFAFA',
+                                                 outline=self.colors['border'], tags=("tile",))
+
+            self.canvas.create_text(x, y + self.thumb_height + 4, anchor='nw',
+                                    text=f"{capture['session'][-15:]} · {capture['capture_id'][:4]}",
+                                    font=('Microsoft YaHei UI', 8), fill=self.colors['text_light'],
+                                    tags=("tile",))
+
+        # 后续几行也提前请求缩略图，滚动时可直接命中内存缓存
+        for capture in self.captures[end:prefetch_end] + self.captures[prefetch_start:start]:
+            for path, prepare, source in ((capture["rgb"], None, capture.get("rgb_source")),
+                                          (capture["depth_vis"], self.materializer(capture),
+                                           capture.get("depth_vis_source"))):
+                if path and self.cache.get(path, source) is None:
+                    self.cache.request(path, self.on_thumbnail_ready, prepare, source)
+
+        self.photos = visible_photos
+        stats = self.cache.stats
+        self.info_var.set(f"共 {len(self.captures)} 张 | 生成 {stats['generated']} | "
+                          f"磁盘命中 {stats['disk_hits']} | 内存命中 {stats['memory_hits']}")
+
+    def thumbnail_photo(self, path, visible_photos, prepare=None, source=None):
+        """返回可显示的PhotoImage，缓存未命中时发起后台请求"""
+        if not path:
+            return None
+        photo = self.photos.get(path)
+        if photo is None:
+            thumb = self.cache.get(path, source)
+            if thumb is None:
+                self.cache.request(path, self.on_thumbnail_ready, prepare, source)
+                return None
+            photo = ImageTk.PhotoImage(Image.fromarray(cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB)))
+        visible_photos[path] = photo
+        return photo
+
+    def on_thumbnail_ready(self, path, thumb):
+        """缩略图工作线程回调，转到UI线程重绘"""
+        if thumb is not None:
+            try:
+                self.window.after(0, self.schedule_redraw)
+            except (RuntimeError, tk.TclError):
+                pass
+
+    def open_file(self, path):
+        """用系统默认程序打开原图"""
+        if not os.path.exists(path):
+            self.app.log_debug(f"文件在已归档会话中，无法直接打开: {os.path.basename(path)}")
+            return
+        try:
+            if os.name == 'nt':
+                os.startfile(path)
+            elif os.name == 'posix':
+                os.system(f'open "{path}"' if sys.platform == 'darwin'
+                          else f'xdg-open "{path}"')
+        except Exception as e:
+            self.app.log_debug(f"无法打开文件: {str(e)}")
+
+    def close(self):
+        self.cache.set_wanted(set())
+        self.photos = {}
+        self.window.destroy()
+
+
 def main():
     """主函数"""
     root = tk.Tk()
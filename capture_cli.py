@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+命令行采集入口 - 无需图形界面（不导入tkinter/pygame）的定时、连拍和录制采集
+用法: python Camera.py capture --source synthetic --count 20 --interval 0.5
+      python Camera.py sync --target /mnt/nas/deepdata_backup
+      python Camera.py depth-vis --session all --colormap turbo --range 300,3000
+      python Camera.py depth-process --session all --chain fill:4,median:5,clip:300:3000,meters
+      python Camera.py compact --min-age-days 30 --throttle-mb 20
+      python Camera.py share-watch --duration 10
+会话保存布局与图形界面相同（deepdata/sessions/session_*），结束时输出JSON汇总
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+import numpy as np
+
+from frame_source import (PlaybackSource, SyntheticSource, OpenCVSource, RealSenseSource,
+                          AcquisitionROI, StreamRecorder, REALSENSE_AVAILABLE)
+from image_codec import FORMAT_PRESETS
+from execution_config import PRESET_NAMES, FrameTiming, preset_config
+from device_probe import CAPABILITIES_FILE, CapabilityCache, device_key, preferred_backends
+from session_sync import SessionSync
+from depth_fusion import FUSION_METHODS, DepthFusion
+from depth_estimator import ESTIMATORS, create_estimator
+from depth_vis import COLORMAPS, DEFAULT_COLORMAP, materialize_session
+from depth_process import DEFAULT_LAYER, OPERATIONS, parse_chain, process_session
+from session_reader import list_sessions
+from session_archive import SessionCompactor, lower_process_priority
+from frame_share import DEFAULT_SHARE_NAME, FramePublisher, FrameSubscriber
+from frame_accounting import FrameAccounting
+from capture_supervisor import (STATE_FAILED, STATE_RECONNECTING, CaptureSupervisor, ReconnectPolicy,
+                                SourceDisconnectedError)
+from session_store import (CaptureSession, StorageFullError, default_deepdata_path,
+                           ensure_deepdata_folders)
+
+
+def log(message):
+    """日志输出到stderr，stdout只保留JSON汇总"""
+    print(message, file=sys.stderr, flush=True)
+
+
+def create_source(spec, device=0, width=640, height=480, fps=30, speed=1.0, fourcc=None,
+                  estimator="edge", estimate_scale=1.0, disconnect_every=None, outage=1.0):
+    """根据 --source 参数创建帧源，返回 (帧源, 相机类型)"""
+    if spec.startswith("playback:"):
+        return PlaybackSource(spec[len("playback:"):], speed=speed), "playback"
+    if spec == "auto":
+        spec = "realsense" if REALSENSE_AVAILABLE else "opencv"
+    if spec == "realsense":
+        return RealSenseSource(), "realsense"
+    if spec == "opencv":
+        return OpenCVSource(device, width, height, fps, log=log, fourcc=fourcc,
+                            estimator=create_estimator(estimator), estimate_scale=estimate_scale), "opencv"
+    if spec == "synthetic":
+        return SyntheticSource(width, height, fps, disconnect_every=disconnect_every, outage=outage), "synthetic"
+    raise ValueError(f"未知帧源: {spec}")
+
+
+class FrameGrabber:
+    """抓帧线程: 持续读取帧源并保留最新一帧，可同时录制原始流或发布到共享内存
+
+    拍摄从最新帧取图，不会因为保存耗时而阻塞抓帧；序号用于连拍时等待新帧。
+    latest 为 (序号, RGB, 深度, 时间戳, 帧标记)，帧标记用于统计丢帧和帧龄。
+    指定 reconnect_policy 时实时帧源读取失败会自动重新打开，会话和序号保持连续。
+    """
+
+    def __init__(self, source, roi=None, recorder=None, execution_config=None, publisher=None, nominal_fps=None,
+                 reconnect_policy=None):
+        self.source = source
+        self.publisher = publisher
+        self.supervisor = None
+        if reconnect_policy is not None and source.live:
+            self.supervisor = CaptureSupervisor(source.open, source.close, reconnect_policy, log=log)
+        self.accounting = FrameAccounting(nominal_fps if source.live else None, live=source.live)
+        self.execution_config = execution_config
+        self.timing = FrameTiming()
+        self.roi = roi
+        self.recorder = recorder
+        self.frames = 0
+        self.sequence = 0
+        self.latest = None
+        self.sensor_shape = None
+        self.finished = False
+        self.error = None
+        self._running = False
+        self._thread = None
+        self._condition = threading.Condition()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        if self.execution_config is not None and self.execution_config.grab_core is not None:
+            if self.execution_config.pin_current_thread():
+                log(f"抓帧线程已绑定到CPU核心 {self.execution_config.grab_core}")
+        try:
+            while self._running:
+                self.accounting.begin_read()
+                try:
+                    frames = self.source.read()
+                except SourceDisconnectedError as e:
+                    # 只有帧源断开/等待帧超时才重连，其它错误直接结束抓帧
+                    if self.supervisor is None:
+                        raise
+                    if self.supervisor.recover(e, lambda: self._running):
+                        self.accounting.stream_restarted()
+                        continue
+                    if self._running:
+                        raise
+                    break
+                if frames is None:
+                    break
+                self.timing.record()
+                tag = self.accounting.tag(self.source.sensor_sequence, self.source.sensor_time)
+                rgb_frame, depth_frame = frames
+                if self.sensor_shape is None:
+                    self.sensor_shape = rgb_frame.shape
+                if self.roi is not None and self.source.live:
+                    rgb_frame = self.roi.apply(rgb_frame)
+                    depth_frame = self.roi.apply_depth(depth_frame) if depth_frame is not None else None
+                timestamp = time.time()
+                if self.recorder is not None:
+                    self.recorder.write(rgb_frame, depth_frame, timestamp)
+                if self.publisher is not None:
+                    self.publisher.publish(rgb_frame, depth_frame, timestamp)
+                with self._condition:
+                    self.frames += 1
+                    self.sequence += 1
+                    self.latest = (self.sequence, rgb_frame, depth_frame, timestamp, tag)
+                    self._condition.notify_all()
+                if self.supervisor is not None:
+                    self.supervisor.frame_ok()
+        except Exception as e:
+            self.error = str(e)
+            log(f"抓帧失败: {e}")
+        finally:
+            with self._condition:
+                self.finished = True
+                self._condition.notify_all()
+
+    def wait_for_frame(self, after_sequence=0, timeout=5.0):
+        """等待序号大于 after_sequence 的帧，帧源结束或超时返回None；相机重连期间不计入超时"""
+        ready = lambda: self.finished or (self.latest is not None and self.latest[0] > after_sequence)
+        with self._condition:
+            while not self._condition.wait_for(ready, timeout):
+                if self.supervisor is None or self.supervisor.state != STATE_RECONNECTING:
+                    break
+            if self.latest is None or self.latest[0] <= after_sequence:
+                return None
+            return self.latest
+
+    def end_reason(self):
+        """wait_for_frame 返回None时的停止原因"""
+        if not self.finished:
+            return "timeout"
+        if self.supervisor is not None and self.supervisor.state == STATE_FAILED:
+            return "camera_lost"
+        return "source_ended"
+
+    def stop(self):
+        self._running = False
+        if self.supervisor is not None:
+            self.supervisor.stop()
+        if self._thread:
+            self._thread.join(timeout=5.0)
+
+
+def fuse_depth(grabber, frame, frames, method):
+    """从 frame 开始依次累加 frames 帧深度，返回 (最后一帧序号, FusionResult)，帧源提前结束返回None"""
+    sequence, _, depth_frame, _, _ = frame
+    fusion = DepthFusion(depth_frame.shape, depth_frame.dtype, frames, method)
+    while not fusion.add(depth_frame):
+        frame = grabber.wait_for_frame(sequence)
+        if frame is None:
+            return None
+        sequence, _, depth_frame, _, _ = frame
+    return sequence, fusion.result()
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 3) if values else None
+
+
+def run_capture(args):
+    width, height = (int(value) for value in args.resolution.split('x'))
+    source, camera_type = create_source(args.source, args.device, width, height, args.fps, args.speed,
+                                       args.fourcc, args.depth_estimator, args.estimate_scale,
+                                       args.simulate_disconnect, args.outage)
+    execution_config = preset_config(args.preset)
+    execution_config.apply()
+    deepdata_path = args.output or default_deepdata_path()
+    capability_cache = CapabilityCache(os.path.join(deepdata_path, "temp", CAPABILITIES_FILE))
+    if isinstance(source, OpenCVSource):
+        key = device_key(args.device)
+        source.backends = preferred_backends(capability_cache.get_backend(key))
+        if source.fourcc is None:
+            # 未指定像素格式时使用图形界面探测并缓存的最佳模式
+            capabilities = capability_cache.get(key)
+            mode = capabilities.best_mode(width, height, args.fps) if capabilities else None
+            if mode is not None:
+                source.fourcc = mode.fourcc
+                log(f"使用缓存的相机模式: {mode}")
+
+    if not source.open():
+        log(f"无法打开帧源: {args.source}")
+        return 2
+    if isinstance(source, OpenCVSource):
+        capability_cache.put_backend(device_key(args.device), source.cap.getBackendName())
+
+    roi = AcquisitionROI.center(args.roi, args.scale)
+    ensure_deepdata_folders(deepdata_path)
+    session_info = {"entry_point": "cli"}
+    if source.depth_scale:
+        session_info["depth_scale"] = source.depth_scale
+    session = CaptureSession(deepdata_path, camera_type, args.device, args.resolution, args.fps,
+                             args.rgb_format, args.depth_vis_format, extra_info=session_info,
+                             lazy_depth_vis=args.lazy_depth_vis)
+    session.create()
+    log(f"创建会话: {session.path}")
+
+    recorder = StreamRecorder(session.path, args.fps) if args.record else None
+    publisher = FramePublisher(args.share, log=log) if args.share else None
+    reconnect_policy = ReconnectPolicy(max_attempts=args.reconnect) if args.reconnect > 0 else None
+    grabber = FrameGrabber(source, None if roi.is_identity else roi, recorder, execution_config, publisher,
+                           nominal_fps=args.fps, reconnect_policy=reconnect_policy)
+
+    save_latencies = []
+    total_bytes = 0
+    stop_reason = "completed"
+    start = time.perf_counter()
+    grabber.start()
+    try:
+        deadline = start + args.duration if args.duration else None
+        # --count 0 且未指定 --duration 时只录制不拍摄
+        record_only = args.count == 0 and deadline is None and args.record > 0
+        shot = 0
+        last_sequence = 0
+        while not record_only and (args.count == 0 or shot < args.count):
+            # 定时拍摄: 按计划时刻对齐，保存耗时不会累积成漂移
+            scheduled = start + shot * args.interval
+            delay = scheduled - time.perf_counter()
+            if deadline is not None and (scheduled > deadline):
+                stop_reason = "duration"
+                break
+            if delay > 0:
+                time.sleep(delay)
+
+            for burst_index in range(args.burst):
+                if burst_index and args.burst_interval:
+                    time.sleep(args.burst_interval)
+                # 触发时刻为计划拍摄时刻（连拍中为本张开始等待新帧的时刻）
+                trigger_time = scheduled if burst_index == 0 else time.perf_counter()
+                # 连拍中每张都等待一帧新的图像，避免重复保存同一帧
+                frame = grabber.wait_for_frame(last_sequence)
+                if frame is None:
+                    stop_reason = grabber.end_reason()
+                    break
+                last_sequence, rgb_frame, depth_frame, _, frame_tag = frame
+                extra_metadata = {"burst_index": burst_index,
+                                  "frame": grabber.accounting.capture_started(frame_tag, trigger_time)}
+                extra_layers = None
+                if args.fuse > 1 and depth_frame is not None:
+                    fused = fuse_depth(grabber, frame, args.fuse, args.fuse_method)
+                    if fused is None:
+                        stop_reason = grabber.end_reason()
+                        break
+                    last_sequence, fusion = fused
+                    depth_frame = fusion.depth
+                    extra_metadata["depth_fusion"] = fusion.metadata
+                    extra_layers = {"depth_std": fusion.stddev}
+                result = session.save_capture(rgb_frame, depth_frame, extra_metadata=extra_metadata,
+                                              extra_layers=extra_layers)
+                grabber.accounting.capture_finished(frame_tag, trigger_time)
+                save_latencies.append(result.save_ms)
+                total_bytes += result.total_bytes
+                if not args.quiet:
+                    log(f"保存 {result.capture_id} ({result.save_ms:.1f} ms)")
+            else:
+                shot += 1
+                continue
+            break
+
+        # 只录制（或拍摄结束后）继续录制到指定时长
+        if args.record and stop_reason == "completed":
+            remaining = start + args.record - time.perf_counter()
+            if remaining > 0 and not grabber.finished:
+                time.sleep(remaining)
+    except StorageFullError as e:
+        stop_reason = "storage_full"
+        log(f"存储空间不足，停止拍摄: {e}")
+    except KeyboardInterrupt:
+        stop_reason = "interrupted"
+    finally:
+        grabber.stop()
+        source.close()
+        if recorder is not None:
+            recorder.close()
+        frame_share = publisher.summary() if publisher is not None else None
+        if publisher is not None:
+            publisher.close()
+
+    elapsed = time.perf_counter() - start
+    execution = execution_config.to_dict()
+    execution["effects"] = grabber.timing.summary()
+    frame_accounting = grabber.accounting.summary()
+    reconnect = grabber.supervisor.summary() if grabber.supervisor is not None else None
+    extra_info = {"cli_args": vars(args), "execution": execution, "frame_share": frame_share,
+                  "frame_accounting": frame_accounting, "reconnect": reconnect}
+    if grabber.sensor_shape is not None and not roi.is_identity:
+        extra_info["acquisition"] = roi.metadata(grabber.sensor_shape)
+    session.finalize(extra_info)
+
+    summary = {
+        "session": session.path,
+        "source": args.source,
+        "stop_reason": stop_reason,
+        "captures": session.capture_count,
+        "elapsed_seconds": round(elapsed, 3),
+        "frames_grabbed": grabber.frames,
+        "grab_fps": round(grabber.frames / elapsed, 2) if elapsed > 0 else None,
+        "captures_per_second": round(session.capture_count / elapsed, 2) if elapsed > 0 else None,
+        "save_latency_ms": {
+            "mean": round(float(np.mean(save_latencies)), 3) if save_latencies else None,
+            "p50": percentile(save_latencies, 50),
+            "p95": percentile(save_latencies, 95),
+            "max": round(max(save_latencies), 3) if save_latencies else None,
+        },
+        "bytes_written": total_bytes,
+        "recorded_frames": recorder.frame_count if recorder is not None else 0,
+        "frame_share": frame_share,
+        "frame_accounting": frame_accounting,
+        "reconnect": reconnect,
+        "execution": execution,
+        "error": grabber.error,
+    }
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    finished = stop_reason in ("completed", "duration") or (
+        stop_reason == "source_ended" and isinstance(source, PlaybackSource))
+    return 0 if finished and grabber.error is None else 1
+
+
+def run_sync(args):
+    deepdata_path = args.output or default_deepdata_path()
+    sync = SessionSync(os.path.join(deepdata_path, "sessions"), args.target,
+                       hash_workers=args.hash_workers, copy_workers=args.copy_workers,
+                       include_active=args.include_active, log=log)
+    try:
+        stats = sync.run()
+    except KeyboardInterrupt:
+        # 已复制并校验的文件记录在目标清单中，再次运行会继续
+        log("同步被中断，再次运行将从中断处继续")
+        return 130
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+    return 0 if stats["errors"] == 0 else 1
+
+
+def archived_exit_code(args, results):
+    """报告跳过的已归档会话；指定的单个会话已归档（什么也没有生成）时返回1"""
+    archived = [result["session"] for result in results if result.get("archived")]
+    if archived:
+        log(f"{len(archived)} 个会话已归档，未处理: {', '.join(archived)}")
+    return 1 if args.session != "all" and archived and len(archived) == len(results) else 0
+
+
+def run_depth_vis(args):
+    deepdata_path = args.output or default_deepdata_path()
+    sessions = list_sessions(os.path.join(deepdata_path, "sessions") if args.session == "all" else args.session)
+    value_range = tuple(float(value) for value in args.range.split(',')) if args.range else None
+    results = []
+    try:
+        for session_path in sessions:
+            results.append(materialize_session(session_path, args.colormap, value_range, args.format,
+                                               workers=args.workers, log=log))
+    except KeyboardInterrupt:
+        # 已生成的图像会被保留，再次运行只生成剩余部分
+        log("生成被中断，再次运行将跳过已生成的图像")
+        return 130
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    return archived_exit_code(args, results)
+
+
+def run_depth_process(args):
+    try:
+        steps = parse_chain(args.chain)
+    except ValueError as e:
+        log(str(e))
+        return 2
+    deepdata_path = args.output or default_deepdata_path()
+    sessions = list_sessions(os.path.join(deepdata_path, "sessions") if args.session == "all" else args.session)
+    results = []
+    try:
+        for session_path in sessions:
+            results.append(process_session(session_path, steps, args.layer, workers=args.workers,
+                                           chunk_size=args.chunk_size, force=args.force, log=log))
+    except ValueError as e:
+        log(f"处理链不适用: {e}")
+        return 2
+    except KeyboardInterrupt:
+        # 已完成的结果会被保留，再次运行只处理剩余部分
+        log("处理被中断，再次运行将跳过已处理的深度")
+        return 130
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    return archived_exit_code(args, results)
+
+
+def run_compact(args):
+    if not args.normal_priority and lower_process_priority():
+        log("已降低归档进程的CPU优先级")
+    deepdata_path = args.output or default_deepdata_path()
+    compactor = SessionCompactor(os.path.join(deepdata_path, "sessions"), args.min_age_days,
+                                 args.throttle_mb or None, dry_run=args.dry_run, log=log)
+    try:
+        stats = compactor.run()
+    except KeyboardInterrupt:
+        # 未提交的归档会在下次运行时重新生成，原文件在校验通过前不会删除
+        log("归档被中断，原文件未受影响")
+        return 130
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+    return 0 if stats["sessions_failed"] == 0 else 1
+
+
+def run_share_watch(args):
+    """作为读取端连接帧共享，统计读取帧率、丢帧、落后帧数和帧龄"""
+    try:
+        subscriber = FrameSubscriber(args.name)
+    except FileNotFoundError:
+        log(f"帧共享 {args.name} 不存在，请先在图形界面开启帧共享或使用 capture --share")
+        return 2
+    lags, ages = [], []
+    start = time.perf_counter()
+    try:
+        while args.duration is None or time.perf_counter() - start < args.duration:
+            frame = subscriber.wait(timeout=2.0)
+            if frame is None:
+                if subscriber.closed:
+                    log("发布端已关闭帧共享")
+                break
+            ages.append(frame.age_ms)
+            lags.append(subscriber.lag)
+            if args.process_ms:
+                time.sleep(args.process_ms / 1000)
+            del frame
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.perf_counter() - start
+    stats = subscriber.stats()
+    subscriber.close()
+    stats.update({
+        "elapsed_seconds": round(elapsed, 3),
+        "read_fps": round(stats["frames_read"] / elapsed, 2) if elapsed > 0 else None,
+        "max_lag_frames": max(lags) if lags else None,
+        "frame_age_ms": {"p50": percentile(ages, 50), "p95": percentile(ages, 95)},
+    })
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="Camera.py", description="深度相机命令行采集")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    capture = subparsers.add_parser("capture", help="无界面定时/连拍/录制采集")
+    capture.add_argument("--source", default="auto",
+                         help="auto | opencv | realsense | synthetic | playback:<会话路径>")
+    capture.add_argument("--speed", type=float, default=1.0, help="回放速度，0表示不限速")
+    capture.add_argument("--device", type=int, default=0, help="USB相机编号")
+    capture.add_argument("--resolution", default="640x480", help="分辨率，例如 1280x720")
+    capture.add_argument("--fps", type=int, default=30)
+    capture.add_argument("--fourcc", default=None, help="USB相机像素格式，例如 MJPG 或 YUYV")
+    capture.add_argument("--depth-estimator", default="edge",
+                         choices=sorted(name for name, cls in ESTIMATORS.items() if not cls.needs_second_camera),
+                         help="USB相机的深度估计器（双目估计仅在图形界面中可用）")
+    capture.add_argument("--estimate-scale", type=float, default=1.0, help="深度估计的缩小比例，例如 0.5")
+    capture.add_argument("--count", type=int, default=1, help="拍摄次数，0表示直到 --duration 或帧源结束")
+    capture.add_argument("--interval", type=float, default=1.0, help="两次拍摄的间隔（秒）")
+    capture.add_argument("--duration", type=float, default=None, help="最长拍摄时长（秒）")
+    capture.add_argument("--burst", type=int, default=1, help="每次拍摄连拍张数")
+    capture.add_argument("--burst-interval", type=float, default=0.0, help="连拍间隔（秒）")
+    capture.add_argument("--record", type=float, default=0.0,
+                         help="同时录制原始流的时长（秒），写入会话的 stream 文件夹")
+    capture.add_argument("--fuse", type=int, default=1, help="每次拍摄融合的深度帧数，1表示不融合")
+    capture.add_argument("--fuse-method", default="mean", choices=FUSION_METHODS, help="深度融合方法")
+    capture.add_argument("--rgb-format", default="png:6", choices=FORMAT_PRESETS)
+    capture.add_argument("--depth-vis-format", default="png:1", choices=FORMAT_PRESETS)
+    capture.add_argument("--lazy-depth-vis", action="store_true",
+                         help="拍摄时不生成深度可视化，之后用 depth-vis 子命令或画廊按需生成")
+    capture.add_argument("--roi", type=float, default=1.0, help="中心ROI边长比例，例如 0.5")
+    capture.add_argument("--scale", type=float, default=1.0, help="输出缩放比例")
+    capture.add_argument("--preset", default="default", choices=sorted(PRESET_NAMES.values()),
+                         help="执行配置预设（OpenCV线程数、抓帧线程绑核）")
+    capture.add_argument("--output", default=None, help="deepdata文件夹路径，默认位于程序目录")
+    capture.add_argument("--share", nargs="?", const=DEFAULT_SHARE_NAME, default=None,
+                         help=f"把实时帧发布到命名共享内存（默认名称 {DEFAULT_SHARE_NAME}）")
+    capture.add_argument("--reconnect", type=int, default=5, help="相机断开时最多重连次数，0表示不重连")
+    capture.add_argument("--simulate-disconnect", type=int, default=None, metavar="FRAMES",
+                         help="合成测试源每输出该帧数后模拟一次断开，用于测试重连")
+    capture.add_argument("--outage", type=float, default=1.0, help="模拟断开的持续时间（秒）")
+    capture.add_argument("--quiet", action="store_true", help="不输出每次保存的日志")
+
+    sync = subparsers.add_parser("sync", help="按内容哈希把会话增量同步到备份目录")
+    sync.add_argument("--target", required=True, help="备份目录，例如挂载的NAS路径")
+    sync.add_argument("--output", default=None, help="deepdata文件夹路径，默认位于程序目录")
+    sync.add_argument("--hash-workers", type=int, default=None, help="计算哈希的进程数")
+    sync.add_argument("--copy-workers", type=int, default=2, help="同时复制的文件数")
+    sync.add_argument("--include-active", action="store_true", help="同时同步尚未结束的会话")
+
+    depth_vis = subparsers.add_parser("depth-vis", help="为会话批量生成深度可视化")
+    depth_vis.add_argument("--session", default="all", help="会话路径，all 表示全部会话")
+    depth_vis.add_argument("--colormap", default=DEFAULT_COLORMAP, choices=sorted(COLORMAPS))
+    depth_vis.add_argument("--range", default=None, help="深度范围（原始单位），例如 300,3000；默认与拍摄时相同")
+    depth_vis.add_argument("--format", default=None, choices=FORMAT_PRESETS,
+                           help="编码格式，默认使用会话记录的 --depth-vis-format")
+    depth_vis.add_argument("--workers", type=int, default=None, help="生成进程数")
+    depth_vis.add_argument("--output", default=None, help="deepdata文件夹路径，默认位于程序目录")
+
+    depth_process = subparsers.add_parser("depth-process", help="对会话深度执行后处理链，结果写入派生层")
+    depth_process.add_argument("--session", default="all", help="会话路径，all 表示全部会话")
+    depth_process.add_argument("--chain", required=True,
+                               help=f"处理链，例如 fill:4,median:5,bilateral:5:30,clip:300:3000,meters"
+                                    f"（可用: {', '.join(OPERATIONS)}）")
+    depth_process.add_argument("--layer", default=DEFAULT_LAYER, help="派生层名称（depth_processed/下的文件夹）")
+    depth_process.add_argument("--workers", type=int, default=None, help="处理进程数")
+    depth_process.add_argument("--chunk-size", type=int, default=16, help="每个任务处理的帧数")
+    depth_process.add_argument("--force", action="store_true", help="忽略已有结果，全部重新处理")
+    depth_process.add_argument("--output", default=None, help="deepdata文件夹路径，默认位于程序目录")
+
+    compact = subparsers.add_parser("compact", help="把已结束的旧会话压缩为归档")
+    compact.add_argument("--min-age-days", type=float, default=30, help="只归档结束超过该天数的会话")
+    compact.add_argument("--throttle-mb", type=float, default=20.0, help="读写速率上限（MB/s），0表示不限速")
+    compact.add_argument("--dry-run", action="store_true", help="只列出将要归档的会话")
+    compact.add_argument("--normal-priority", action="store_true", help="不降低进程优先级")
+    compact.add_argument("--output", default=None, help="deepdata文件夹路径，默认位于程序目录")
+
+    share_watch = subparsers.add_parser("share-watch", help="作为读取端连接帧共享并统计读取情况")
+    share_watch.add_argument("--name", default=DEFAULT_SHARE_NAME, help="共享内存名称")
+    share_watch.add_argument("--duration", type=float, default=None, help="读取时长（秒），默认直到发布端关闭")
+    share_watch.add_argument("--process-ms", type=float, default=0.0, help="模拟每帧的处理耗时（毫秒）")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "capture":
+        if (args.count == 0 and not args.duration and not args.record
+                and not args.source.startswith("playback:")):
+            log("--count 0 需要同时指定 --duration 或 --record")
+            return 2
+        return run_capture(args)
+    if args.command == "sync":
+        return run_sync(args)
+    if args.command == "depth-vis":
+        return run_depth_vis(args)
+    if args.command == "depth-process":
+        return run_depth_process(args)
+    if args.command == "compact":
+        return run_compact(args)
+    if args.command == "share-watch":
+        return run_share_watch(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
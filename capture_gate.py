@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拍摄门控模块 - 拍摄时拒绝模糊帧和近似重复帧
+清晰度使用缩小灰度图的拉普拉斯方差，重复检测使用64位差值哈希(dHash)与会话内最近拍摄比较
+"""
+
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class GateResult:
+    """门控判定结果"""
+
+    OK = "ok"
+    BLURRY = "blurry"
+    DUPLICATE = "duplicate"
+
+    def __init__(self, reason, sharpness, frame_hash, distance, elapsed_ms):
+        self.reason = reason
+        self.sharpness = sharpness
+        self.frame_hash = frame_hash
+        self.distance = distance
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def accepted(self):
+        return self.reason == self.OK
+
+    def to_dict(self):
+        return {
+            "result": self.reason,
+            "sharpness": round(self.sharpness, 2),
+            "dhash": f"{self.frame_hash:016x}",
+            "min_hash_distance": self.distance,
+            "elapsed_ms": round(self.elapsed_ms, 3),
+        }
+
+
+class CaptureGate:
+    """拍摄门控
+
+    sharpness_threshold: 拉普拉斯方差低于该值视为模糊；
+    duplicate_distance: 与最近 history 次拍摄的哈希汉明距离不超过该值视为重复。
+    """
+
+    def __init__(self, sharpness_threshold=60.0, duplicate_distance=5, history=8, analysis_width=320):
+        self.sharpness_threshold = sharpness_threshold
+        self.duplicate_distance = duplicate_distance
+        self.analysis_width = analysis_width
+        self.recent_hashes = deque(maxlen=history)
+
+    def prepare(self, frame):
+        """转为灰度并缩小到分析宽度"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        height, width = gray.shape[:2]
+        if width > self.analysis_width:
+            scale = self.analysis_width / width
+            gray = cv2.resize(gray, (self.analysis_width, max(1, int(height * scale))),
+                              interpolation=cv2.INTER_AREA)
+        return gray
+
+    @staticmethod
+    def sharpness(gray):
+        """拉普拉斯方差，越大越清晰"""
+        _, stddev = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))
+        return float(stddev[0][0]) ** 2
+
+    @staticmethod
+    def dhash(gray):
+        """64位差值哈希: 9x8缩略图相邻像素比较"""
+        small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+        bits = (small[:, 1:] > small[:, :-1]).ravel()
+        return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+    def evaluate(self, frame):
+        """评估一帧是否可以拍摄，不修改历史"""
+        start = time.perf_counter()
+        gray = self.prepare(frame)
+        sharpness = self.sharpness(gray)
+        frame_hash = self.dhash(gray)
+        distance = min(((frame_hash ^ previous).bit_count() for previous in self.recent_hashes), default=None)
+
+        if sharpness < self.sharpness_threshold:
+            reason = GateResult.BLURRY
+        elif distance is not None and distance <= self.duplicate_distance:
+            reason = GateResult.DUPLICATE
+        else:
+            reason = GateResult.OK
+
+        return GateResult(reason, sharpness, frame_hash, distance, (time.perf_counter() - start) * 1000)
+
+    def accept(self, result):
+        """拍摄保存成功后记录其哈希"""
+        self.recent_hashes.append(result.frame_hash)
+
+    def reset(self):
+        self.recent_hashes.clear()
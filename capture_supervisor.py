@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+采集监护模块 - 抓帧循环出错或等待帧超时时自动重连相机
+重连次数有上限，两次尝试之间按指数退避等待；连续失败超过上限才放弃。
+重连期间会话保持不变，断开次数、重连尝试和停机时长写入会话信息
+"""
+
+import time
+import threading
+
+
+# 等待一帧的超时（毫秒）: RealSense wait_for_frames 和 USB相机读取（后端支持时）
+FRAME_TIMEOUT_MS = 3000
+
+# 监护状态
+STATE_RUNNING = "running"
+STATE_RECONNECTING = "reconnecting"
+STATE_FAILED = "failed"
+STATE_STOPPED = "stopped"
+
+
+class SourceDisconnectedError(RuntimeError):
+    """相机断开或等待帧超时"""
+
+
+class ReconnectPolicy:
+    """重连策略: 最多 max_attempts 次，第n次尝试前等待 initial_delay * multiplier^(n-1) 秒（不超过 max_delay）"""
+
+    def __init__(self, max_attempts=5, initial_delay=0.5, max_delay=8.0, multiplier=2.0):
+        self.max_attempts = max_attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+
+    def delay(self, attempt):
+        """第 attempt 次（从1开始）尝试前的等待秒数"""
+        return min(self.max_delay, self.initial_delay * self.multiplier ** (attempt - 1))
+
+    def to_dict(self):
+        return {"max_attempts": self.max_attempts, "initial_delay": self.initial_delay,
+                "max_delay": self.max_delay, "multiplier": self.multiplier}
+
+
+class CaptureSupervisor:
+    """抓帧线程的监护
+
+    抓帧线程在帧源读取失败（SourceDisconnectedError）时调用 recover()，由它释放并重新打开相机；
+    处理代码本身的错误不应交给监护。每处理完一帧调用 frame_ok()。
+    重连成功后要等到真正收到一帧才结束本次中断，因此重新打开后立刻又断开的情况
+    会累计尝试次数，最终放弃而不是无限重连。
+    reopen() 返回是否打开成功，release() 释放相机；on_state(状态, 说明) 在抓帧线程中调用。
+    """
+
+    def __init__(self, reopen, release, policy=None, log=print, on_state=None):
+        self.reopen = reopen
+        self.release = release
+        self.policy = policy or ReconnectPolicy()
+        self.log = log
+        self.on_state = on_state
+        self.state = STATE_RUNNING
+        self.disconnects = 0
+        self.attempts = 0
+        self.reconnects = 0
+        self.downtime = 0.0
+        self.events = []
+        self._pending_attempts = 0
+        self._down_since = None
+        self._reason = None
+        self._stop = threading.Event()
+
+    def _set_state(self, state, message=None):
+        self.state = state
+        if self.on_state is not None:
+            self.on_state(state, message)
+
+    def frame_ok(self):
+        """收到并处理完一帧: 如处于中断中则记录本次停机时长"""
+        if self._down_since is None:
+            return
+        downtime = time.perf_counter() - self._down_since
+        self.downtime += downtime
+        self.events.append({"time": time.strftime("%Y-%m-%d %H:%M:%S"), "reason": self._reason,
+                            "attempts": self._pending_attempts, "downtime_s": round(downtime, 3)})
+        self.log(f"相机已恢复，中断 {downtime:.1f} 秒，尝试 {self._pending_attempts} 次")
+        self._down_since = None
+        self._pending_attempts = 0
+        self._set_state(STATE_RUNNING)
+
+    def recover(self, reason, is_running=lambda: True):
+        """抓帧出错后重连，成功返回True；达到尝试上限或已停止时返回False"""
+        if self._down_since is None:
+            self._down_since = time.perf_counter()
+            self._reason = str(reason)
+            self.disconnects += 1
+            self.log(f"相机中断: {reason}")
+
+        while is_running() and not self._stop.is_set():
+            if self._pending_attempts >= self.policy.max_attempts:
+                self.log(f"重连 {self._pending_attempts} 次均失败，放弃")
+                self._set_state(STATE_FAILED, str(reason))
+                return False
+            self._pending_attempts += 1
+            self.attempts += 1
+            attempt = self._pending_attempts
+            delay = self.policy.delay(attempt)
+            self._set_state(STATE_RECONNECTING, f"{attempt}/{self.policy.max_attempts}")
+            if self._stop.wait(delay) or not is_running():
+                break
+
+            self.release()
+            try:
+                opened = self.reopen()
+                error = None
+            except Exception as e:
+                opened, error = False, e
+            if not opened:
+                self.log(f"重连失败 ({attempt}/{self.policy.max_attempts})" + (f": {error}" if error else ""))
+                continue
+            if not is_running():
+                # 重连期间相机已被停止，释放刚打开的设备
+                self.release()
+                break
+            self.reconnects += 1
+            self.log(f"相机已重新打开 ({attempt}/{self.policy.max_attempts})")
+            return True
+        self._set_state(STATE_STOPPED)
+        return False
+
+    def stop(self):
+        """停止相机时调用，中断重连等待"""
+        self._stop.set()
+
+    def summary(self):
+        downtime = self.downtime
+        if self._down_since is not None:
+            downtime += time.perf_counter() - self._down_since
+        return {
+            "state": self.state,
+            "disconnects": self.disconnects,
+            "reconnect_attempts": self.attempts,
+            "reconnects": self.reconnects,
+            "downtime_s": round(downtime, 3),
+            "policy": self.policy.to_dict(),
+            "events": self.events[-20:],
+        }
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地控制服务模块 - 为无人值守的采集设备提供HTTP控制接口和MJPEG预览流
+控制接口: GET /status, POST /start /stop /capture /burst /mode
+预览流:   GET /preview.mjpg（多客户端共享同一次JPEG编码），GET /preview.jpg
+每次启动生成一个随机令牌（写入令牌文件），所有请求都需携带；带浏览器 Origin 头或 Host 不是本机的请求
+一律拒绝，防止网页通过跨站请求或DNS重绑定操作相机
+"""
+
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import cv2
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MJPEG_BOUNDARY = "depthframe"
+
+# 令牌: 请求头 X-Control-Token，或查询参数 token（便于在浏览器/播放器中打开预览流）
+TOKEN_HEADER = "X-Control-Token"
+DEFAULT_TOKEN_FILE = os.path.join(os.path.expanduser("~"), ".depthcam_control_token")
+LOOPBACK_HOSTS = {"127.0.0.1", "localhost", "::1"}
+
+
+def read_token(path=DEFAULT_TOKEN_FILE):
+    """读取控制服务写入的令牌，文件不存在时返回None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _host_name(host_header):
+    """Host 头中的主机名（去掉端口和IPv6方括号）"""
+    host = host_header.strip().lower()
+    if host.startswith('['):
+        return host[1:].partition(']')[0]
+    return host.rpartition(':')[0] if host.count(':') == 1 else host
+
+
+class PreviewBroadcaster:
+    """预览帧广播: 每帧只编码一次JPEG，所有客户端共享编码结果
+
+    没有客户端连接时 publish() 直接返回，不产生编码开销；
+    max_fps 限制编码频率，慢速客户端只会跳帧，不会拖慢采集循环。
+    """
+
+    def __init__(self, quality=80, max_fps=15):
+        self.quality = quality
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.clients = 0
+        self.sequence = 0
+        self.jpeg = None
+        self.encode_ms = None
+        self._last_publish = 0.0
+        self._condition = threading.Condition()
+
+    def publish(self, frame):
+        """由采集循环调用，提交最新预览帧"""
+        if self.clients == 0 or frame is None:
+            return
+        now = time.perf_counter()
+        if now - self._last_publish < self.min_interval:
+            return
+        self._last_publish = now
+
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        with self._condition:
+            self.jpeg = buffer.tobytes()
+            self.sequence += 1
+            self.encode_ms = (time.perf_counter() - now) * 1000
+            self._condition.notify_all()
+
+    def wait_for_frame(self, last_sequence, timeout=2.0):
+        """等待比 last_sequence 更新的帧，返回 (序号, JPEG字节)，超时返回 (last_sequence, None)"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.sequence != last_sequence, timeout)
+            if self.sequence == last_sequence:
+                return last_sequence, None
+            return self.sequence, self.jpeg
+
+    def add_client(self):
+        with self._condition:
+            self.clients += 1
+
+    def remove_client(self):
+        with self._condition:
+            self.clients = max(0, self.clients - 1)
+
+
+class ControlServer:
+    """本地HTTP控制服务
+
+    controller 需提供 start() / stop() / capture() / burst(count, interval) /
+    set_mode(count) / status() 方法，均返回可JSON序列化的字典。
+    token 为None时每次启动随机生成，写入 token_file（仅当前用户可读），服务停止时删除。
+    """
+
+    def __init__(self, controller, broadcaster=None, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 token=None, token_file=DEFAULT_TOKEN_FILE):
+        self.controller = controller
+        self.broadcaster = broadcaster or PreviewBroadcaster()
+        self.host = host
+        self.port = port
+        self.token = token
+        self.token_file = token_file
+        self.httpd = None
+        self.thread = None
+
+    def start(self):
+        """在后台线程中启动服务，port为0时自动分配端口"""
+        self.token = self.token or secrets.token_urlsafe(24)
+        self.httpd = ThreadingHTTPServer((self.host, self.port), self.make_handler())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        if self.token_file:
+            self.write_token_file()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.port
+
+    def write_token_file(self):
+        """写入令牌文件，权限为仅当前用户可读写"""
+        temp_path = f"{self.token_file}.{os.getpid()}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(self.token)
+        os.replace(temp_path, self.token_file)
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+            # 只删除本服务写入的令牌文件，其他实例已覆盖时保留
+            if self.token_file and read_token(self.token_file) == self.token:
+                try:
+                    os.remove(self.token_file)
+                except OSError:
+                    pass
+
+    def allowed_hosts(self):
+        return LOOPBACK_HOSTS | {self.host.lower()}
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):
+                pass
+
+            def send_json(self, data, status=200):
+                body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def authorize(self):
+                """检查来源和令牌，不通过时返回错误响应并返回False"""
+                if self.headers.get("Origin") is not None:
+                    # 浏览器中网页发起的请求（跨站请求）
+                    self.send_json({"ok": False, "error": "不接受浏览器跨站请求"}, 403)
+                    return False
+                if _host_name(self.headers.get("Host") or "") not in server.allowed_hosts():
+                    # Host 不是本机: DNS重绑定
+                    self.send_json({"ok": False, "error": "Host 不是本机地址"}, 403)
+                    return False
+                token = self.headers.get(TOKEN_HEADER)
+                if token is None:
+                    token = parse_qs(urlparse(self.path).query).get("token", [""])[-1]
+                if not hmac.compare_digest(token.encode('utf-8'), server.token.encode('utf-8')):
+                    self.send_json({"ok": False, "error": "令牌无效"}, 401)
+                    return False
+                return True
+
+            def read_params(self):
+                """合并查询参数和JSON请求体"""
+                parsed = urlparse(self.path)
+                params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    try:
+                        params.update(json.loads(self.rfile.read(length).decode('utf-8')))
+                    except ValueError:
+                        pass
+                return parsed.path, params
+
+            def do_GET(self):
+                if not self.authorize():
+                    return
+                path, _ = self.read_params()
+                if path == "/status":
+                    self.send_json(server.controller.status())
+                elif path == "/preview.mjpg":
+                    self.stream_mjpeg()
+                elif path == "/preview.jpg":
+                    self.send_single_frame()
+                else:
+                    self.send_json({"ok": False, "error": "未知接口"}, 404)
+
+            def do_POST(self):
+                if not self.authorize():
+                    return
+                path, params = self.read_params()
+                controller = server.controller
+                try:
+                    if path == "/start":
+                        result = controller.start()
+                    elif path == "/stop":
+                        result = controller.stop()
+                    elif path == "/capture":
+                        result = controller.capture()
+                    elif path == "/burst":
+                        result = controller.burst(int(params.get("count", 5)),
+                                                  float(params.get("interval", 0.2)))
+                    elif path == "/mode":
+                        result = controller.set_mode(int(params.get("count", 20)))
+                    else:
+                        self.send_json({"ok": False, "error": "未知接口"}, 404)
+                        return
+                except Exception as e:
+                    self.send_json({"ok": False, "error": str(e)}, 500)
+                    return
+                self.send_json(result, 200 if result.get("ok", True) else 409)
+
+            def send_single_frame(self):
+                broadcaster = server.broadcaster
+                broadcaster.add_client()
+                try:
+                    # 等待一帧新编码的预览，避免返回客户端连接前的旧帧
+                    _, jpeg = broadcaster.wait_for_frame(broadcaster.sequence)
+                finally:
+                    broadcaster.remove_client()
+                if jpeg is None:
+                    self.send_json({"ok": False, "error": "暂无预览帧"}, 503)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(jpeg)))
+                self.end_headers()
+                self.wfile.write(jpeg)
+
+            def stream_mjpeg(self):
+                broadcaster = server.broadcaster
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+
+                broadcaster.add_client()
+                sequence = 0
+                try:
+                    while server.httpd is not None:
+                        sequence, jpeg = broadcaster.wait_for_frame(sequence)
+                        if jpeg is None:
+                            continue
+                        self.wfile.write(f"--{MJPEG_BOUNDARY}\r\n"
+                                         f"Content-Type: image/jpeg\r\n"
+                                         f"Content-Length: {len(jpeg)}\r\n\r\n".encode('ascii'))
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    broadcaster.remove_client()
+                    self.close_connection = True
+
+        return Handler
+
+
+class ControlClient:
+    """控制服务的本地客户端，token 为None时从令牌文件读取"""
+
+    def __init__(self, url=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout=10.0, token=None,
+                 token_file=DEFAULT_TOKEN_FILE):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.token = token or read_token(token_file) or ""
+
+    def request(self, method, path, params=None):
+        data = json.dumps(params).encode('utf-8') if params is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json",
+                                                  TOKEN_HEADER: self.token})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            return json.loads(e.read().decode('utf-8'))
+
+    def status(self):
+        return self.request("GET", "/status")
+
+    def start(self):
+        return self.request("POST", "/start")
+
+    def stop(self):
+        return self.request("POST", "/stop")
+
+    def capture(self):
+        return self.request("POST", "/capture")
+
+    def burst(self, count, interval=0.2):
+        return self.request("POST", "/burst", {"count": count, "interval": interval})
+
+    def set_mode(self, count):
+        return self.request("POST", "/mode", {"count": count})
+
+    def preview_frames(self, max_frames=None):
+        """读取MJPEG预览流，逐帧返回JPEG字节"""
+        request = urllib.request.Request(self.url + "/preview.mjpg", headers={TOKEN_HEADER: self.token})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            received = 0
+            while max_frames is None or received < max_frames:
+                line = response.readline()
+                if not line:
+                    return
+                if not line.startswith(f"--{MJPEG_BOUNDARY}".encode('ascii')):
+                    continue
+                length = 0
+                while True:
+                    header = response.readline().strip()
+                    if not header:
+                        break
+                    name, _, value = header.decode('ascii').partition(':')
+                    if name.lower() == "content-length":
+                        length = int(value)
+                yield response.read(length)
+                received += 1
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+深度估计模块 - USB相机模式下可插拔的深度估计器
+注册表中包含边缘模拟、双目块匹配（StereoBM/StereoSGBM，需要两台USB相机）和"无"；
+估计器在缩小的分辨率上运行，DepthStage 在工作线程中只处理最新一帧并统计耗时，
+抓帧和预览不必等待深度计算
+"""
+
+import time
+import threading
+
+import cv2
+import numpy as np
+
+
+def edge_depth(frame):
+    """USB相机模式下的深度模拟: 边缘检测后反转并平滑"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    # 使用边缘检测来模拟深度信息
+    edges = cv2.Canny(gray, 50, 150)
+    depth_simulation = 255 - edges  # 反转边缘，边缘处深度较小
+
+    # 应用高斯模糊来平滑深度图
+    return cv2.GaussianBlur(depth_simulation, (5, 5), 0)
+
+
+ESTIMATORS = {}
+
+
+def register_estimator(cls):
+    """注册估计器类，键为类的 name 属性"""
+    ESTIMATORS[cls.name] = cls
+    return cls
+
+
+def create_estimator(name, **options):
+    if name not in ESTIMATORS:
+        raise ValueError(f"未知深度估计器: {name}")
+    return ESTIMATORS[name](**options)
+
+
+class DepthEstimator:
+    """深度估计器基类
+
+    estimate(rgb, secondary, scale) 的输入已缩小 scale 倍，返回同尺寸的深度图，不输出深度时返回None；
+    needs_second_camera 为True时 secondary 为第二台相机的同步帧。
+    """
+
+    name = "base"
+    needs_second_camera = False
+
+    def estimate(self, rgb, secondary=None, scale=1.0):
+        raise NotImplementedError
+
+
+@register_estimator
+class EdgeDepthEstimator(DepthEstimator):
+    """边缘检测模拟深度（0-255灰度，与原有实现相同）"""
+
+    name = "edge"
+
+    def estimate(self, rgb, secondary=None, scale=1.0):
+        return edge_depth(rgb)
+
+
+@register_estimator
+class NoDepthEstimator(DepthEstimator):
+    """不估计深度，只采集RGB"""
+
+    name = "none"
+
+    def estimate(self, rgb, secondary=None, scale=1.0):
+        return None
+
+
+class StereoDepthEstimator(DepthEstimator):
+    """双目块匹配，假设左右两台相机已经水平放置且图像已校正
+
+    提供 focal_px（全分辨率下的焦距，像素）和 baseline_mm 时输出 uint16 毫米深度；
+    未标定时输出与边缘模拟相同约定的 uint8 相对深度（越近值越小，0为无效）。
+    视差搜索范围默认随输入宽度缩放，缩小分辨率后匹配代价按比例下降。
+    """
+
+    needs_second_camera = True
+
+    def __init__(self, num_disparities=None, block_size=None, focal_px=None, baseline_mm=None):
+        self.num_disparities = num_disparities
+        self.block_size = block_size
+        self.focal_px = focal_px
+        self.baseline_mm = baseline_mm
+        self._matcher = None
+        self._matcher_key = None
+
+    def create_matcher(self, num_disparities):
+        raise NotImplementedError
+
+    def estimate(self, rgb, secondary=None, scale=1.0):
+        if secondary is None:
+            return None
+        left = cv2.cvtColor(rgb, cv2.COLOR_BGR2GRAY)
+        right = cv2.cvtColor(secondary, cv2.COLOR_BGR2GRAY)
+        if right.shape != left.shape:
+            right = cv2.resize(right, (left.shape[1], left.shape[0]), interpolation=cv2.INTER_AREA)
+
+        # 视差范围必须是16的倍数
+        num_disparities = self.num_disparities or max(16, left.shape[1] // 8 // 16 * 16)
+        if self._matcher is None or self._matcher_key != num_disparities:
+            self._matcher = self.create_matcher(num_disparities)
+            self._matcher_key = num_disparities
+
+        # 匹配结果为定点数（实际视差的16倍）
+        disparity = self._matcher.compute(left, right).astype(np.float32) / 16.0
+        valid = disparity > 0
+
+        if self.focal_px and self.baseline_mm:
+            depth = np.zeros(disparity.shape, dtype=np.float32)
+            np.divide(self.focal_px * scale * self.baseline_mm, disparity, out=depth, where=valid)
+            return np.clip(depth, 0, np.iinfo(np.uint16).max).astype(np.uint16)
+
+        relative = 254 - np.clip(disparity * (253.0 / num_disparities), 0, 253)
+        return np.where(valid, relative, 0).astype(np.uint8)
+
+
+@register_estimator
+class StereoBMEstimator(StereoDepthEstimator):
+    """StereoBM: 速度快，纹理少的区域空洞较多"""
+
+    name = "stereo_bm"
+
+    def create_matcher(self, num_disparities):
+        return cv2.StereoBM_create(numDisparities=num_disparities, blockSize=self.block_size or 15)
+
+
+@register_estimator
+class StereoSGBMEstimator(StereoDepthEstimator):
+    """StereoSGBM: 半全局匹配，结果更平滑，耗时约为BM的数倍"""
+
+    name = "stereo_sgbm"
+
+    def create_matcher(self, num_disparities):
+        block_size = self.block_size or 5
+        return cv2.StereoSGBM_create(minDisparity=0, numDisparities=num_disparities, blockSize=block_size,
+                                     P1=8 * block_size * block_size, P2=32 * block_size * block_size,
+                                     uniquenessRatio=10, speckleWindowSize=100, speckleRange=2,
+                                     mode=cv2.STEREO_SGBM_MODE_SGBM_3WAY)
+
+
+# 界面选项: 中文名称 -> 注册表键
+ESTIMATOR_NAMES = {
+    "边缘模拟": "edge",
+    "双目BM": "stereo_bm",
+    "双目SGBM": "stereo_sgbm",
+    "无": "none",
+}
+
+
+def run_estimator(estimator, rgb, secondary=None, scale=1.0):
+    """按 scale 缩小输入后估计深度，再以最近邻放大回原尺寸（不在深度边缘混合前后景）"""
+    height, width = rgb.shape[:2]
+    if scale != 1.0:
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        rgb = cv2.resize(rgb, size, interpolation=cv2.INTER_AREA)
+        if secondary is not None:
+            secondary = cv2.resize(secondary, size, interpolation=cv2.INTER_AREA)
+    depth = estimator.estimate(rgb, secondary, scale)
+    if depth is not None and depth.shape[:2] != (height, width):
+        depth = cv2.resize(depth, (width, height), interpolation=cv2.INTER_NEAREST)
+    return depth
+
+
+class DepthStage:
+    """深度估计阶段
+
+    抓帧线程调用 submit() 提交最新帧后立即返回；工作线程只处理最新提交的帧，
+    来不及处理的帧直接跳过并计数。latest_result 为最近一次的 (估计结果, 提交时的帧标记)，
+    整体替换，对应的帧可能落后一两帧。估计出错时记录并跳过该帧，工作线程继续运行。
+    """
+
+    def __init__(self, estimator, scale=0.5, log=print):
+        self.estimator = estimator
+        self.scale = scale
+        self.log = log
+        self.latest_result = None
+        self.frames_estimated = 0
+        self.frames_skipped = 0
+        self.errors = 0
+        self.last_error = None
+        self.estimate_ms = None
+        self.total_ms = 0.0
+        self._pending = None
+        self._running = False
+        self._thread = None
+        self._condition = threading.Condition()
+
+    @property
+    def latest(self):
+        """最近一次的估计结果"""
+        result = self.latest_result
+        return result[0] if result is not None else None
+
+    @property
+    def active(self):
+        return not isinstance(self.estimator, NoDepthEstimator)
+
+    def start(self):
+        if not self.active:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="depth-estimator")
+        self._thread.start()
+
+    def submit(self, rgb, secondary=None, tag=None):
+        """提交最新帧，tag 为该帧的标记，随估计结果一起返回"""
+        if not self._running:
+            return
+        with self._condition:
+            if self._pending is not None:
+                self.frames_skipped += 1
+            self._pending = (rgb, secondary, tag)
+            self._condition.notify()
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None or not self._running)
+                if not self._running:
+                    return
+                rgb, secondary, tag = self._pending
+                self._pending = None
+
+            start = time.perf_counter()
+            try:
+                depth = run_estimator(self.estimator, rgb, secondary, self.scale)
+            except Exception as e:
+                # 估计器出错不结束工作线程: 跳过该帧，同一错误只记录一次，次数写入汇总
+                self.errors += 1
+                message = f"{type(e).__name__}: {e}"
+                if message != self.last_error:
+                    self.log(f"深度估计失败: {message}")
+                self.last_error = message
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            self.latest_result = (depth, tag)
+            self.frames_estimated += 1
+            self.total_ms += elapsed
+            self.estimate_ms = elapsed if self.estimate_ms is None else self.estimate_ms + 0.1 * (elapsed - self.estimate_ms)
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def summary(self):
+        """会话信息中的深度估计开销"""
+        return {
+            "estimator": self.estimator.name,
+            "scale": self.scale,
+            "frames_estimated": self.frames_estimated,
+            "frames_skipped": self.frames_skipped,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "avg_estimate_ms": round(self.total_ms / self.frames_estimated, 3) if self.frames_estimated else None,
+            "recent_estimate_ms": round(self.estimate_ms, 3) if self.estimate_ms is not None else None,
+        }
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多帧深度融合模块 - 把拍摄后的K帧深度融合为一张，降低单帧噪声
+均值和标准差使用逐像素Welford流式累加（每个像素只保存计数、均值和M2），
+中值使用长度为K的小环形缓冲；所有缓冲在开始时一次性分配，每帧累加不产生新数组，
+累加在抓帧线程中逐帧进行，不会阻塞实时预览
+"""
+
+import time
+
+import numpy as np
+
+from depth_stats import DEFAULT_VALID_RANGES
+
+
+FUSION_METHODS = ("mean", "median")
+
+
+class FusionResult:
+    """融合结果: 深度图、逐像素标准差、有效帧计数及统计信息"""
+
+    def __init__(self, depth, stddev, count, metadata):
+        self.depth = depth
+        self.stddev = stddev
+        self.count = count
+        self.metadata = metadata
+
+
+class DepthFusion:
+    """K帧深度融合器
+
+    只有落在有效范围内的像素参与统计（0为空洞）；有效帧数少于 min_valid_frames 的像素输出为0。
+    context 为调用方附带的数据（如触发时的RGB帧），随融合器一起传递，完成后原样取回。
+    """
+
+    def __init__(self, shape, dtype=np.uint16, frames=5, method="mean", valid_range=None,
+                 min_valid_frames=None, context=None):
+        if method not in FUSION_METHODS:
+            raise ValueError(f"未知融合方法: {method}")
+        self.shape = tuple(shape[:2])
+        self.dtype = np.dtype(dtype)
+        self.frames = frames
+        self.method = method
+        self.low, self.high = valid_range or DEFAULT_VALID_RANGES.get(self.dtype, (1e-6, np.inf))
+        self.min_valid_frames = min_valid_frames or (frames + 1) // 2
+        self.context = context
+
+        # 预分配的累加缓冲
+        self.count = np.zeros(self.shape, dtype=np.uint16)
+        self.mean = np.zeros(self.shape, dtype=np.float32)
+        self.m2 = np.zeros(self.shape, dtype=np.float32)
+        self._value = np.empty(self.shape, dtype=np.float32)
+        self._delta = np.empty(self.shape, dtype=np.float32)
+        self._valid = np.empty(self.shape, dtype=bool)
+        self._scratch = np.empty(self.shape, dtype=bool)
+        self.ring = np.zeros((frames,) + self.shape, dtype=self.dtype) if method == "median" else None
+
+        self.added = 0
+        self.first_valid_ratio = None
+        self.accumulate_ms = 0.0
+        self.started = time.perf_counter()
+
+    @property
+    def done(self):
+        return self.added >= self.frames
+
+    def add(self, depth):
+        """累加一帧深度，尺寸或类型不一致时抛出ValueError；返回是否已收集足够帧数"""
+        if self.done:
+            return True
+        if depth.shape[:2] != self.shape or depth.dtype != self.dtype:
+            raise ValueError(f"深度帧尺寸或类型变化: {depth.shape} {depth.dtype}")
+        start = time.perf_counter()
+
+        valid, value, delta = self._valid, self._value, self._delta
+        np.greater_equal(depth, self.low, out=valid)
+        np.less_equal(depth, self.high, out=self._scratch)
+        np.logical_and(valid, self._scratch, out=valid)
+        if self.first_valid_ratio is None:
+            self.first_valid_ratio = float(np.count_nonzero(valid)) / valid.size
+
+        # Welford: count += 1; delta = x - mean; mean += delta / count; M2 += delta * (x - mean)
+        np.add(self.count, valid, out=self.count, casting='unsafe')
+        np.copyto(value, depth, casting='unsafe')
+        np.subtract(value, self.mean, out=delta)
+        np.divide(delta, np.maximum(self.count, 1), out=value)
+        np.add(self.mean, value, out=self.mean, where=valid)
+        np.copyto(value, depth, casting='unsafe')
+        np.subtract(value, self.mean, out=value)
+        np.multiply(delta, value, out=delta)
+        np.add(self.m2, delta, out=self.m2, where=valid)
+
+        if self.ring is not None:
+            # 无效像素写为0，求中值时排在最前面
+            np.multiply(depth, valid, out=self.ring[self.added], casting='unsafe')
+
+        self.added += 1
+        self.accumulate_ms += (time.perf_counter() - start) * 1000
+        return self.done
+
+    def result(self):
+        """计算融合结果"""
+        start = time.perf_counter()
+        keep = self.count >= self.min_valid_frames
+
+        if self.method == "median":
+            fused = self._ring_median()
+        else:
+            fused = self.mean
+        if np.issubdtype(self.dtype, np.integer):
+            fused = np.rint(fused)
+        depth = np.where(keep, fused, 0).astype(self.dtype)
+
+        stddev = np.zeros(self.shape, dtype=np.float32)
+        multi = self.count >= 2
+        np.sqrt(self.m2 / np.maximum(self.count - 1, 1), out=stddev, where=multi)
+        stddev[~keep] = 0
+
+        kept_std = stddev[keep & multi]
+        metadata = {
+            "method": self.method,
+            "frames": self.added,
+            "min_valid_frames": self.min_valid_frames,
+            "valid_range": [float(self.low), float(self.high) if np.isfinite(self.high) else None],
+            "single_frame_valid_ratio": round(self.first_valid_ratio, 4) if self.first_valid_ratio is not None else None,
+            "fused_valid_ratio": round(float(np.count_nonzero(keep)) / keep.size, 4),
+            "noise_std_mean": round(float(kept_std.mean()), 3) if kept_std.size else None,
+            "noise_std_median": round(float(np.median(kept_std)), 3) if kept_std.size else None,
+            "noise_std_p95": round(float(np.percentile(kept_std, 95)), 3) if kept_std.size else None,
+            "accumulate_ms_per_frame": round(self.accumulate_ms / max(1, self.added), 3),
+            "finalize_ms": None,
+            "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 1),
+        }
+        metadata["finalize_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return FusionResult(depth, stddev, self.count.copy(), metadata)
+
+    def _ring_median(self):
+        """环形缓冲按帧排序后，取每个像素有效值的中值（偶数个时取中间两值的平均）"""
+        frames = self.ring[:self.added]
+        ordered = np.sort(frames, axis=0)
+        count = self.count.astype(np.int64)
+        invalid = self.added - count
+        # 没有有效值的像素索引会越界，截断后结果无意义，由调用方按计数置为空洞
+        low = np.minimum(invalid + np.maximum(count - 1, 0) // 2, self.added - 1)
+        high = np.minimum(invalid + count // 2, self.added - 1)
+        lower = np.take_along_axis(ordered, low[None], axis=0)[0].astype(np.float32)
+        upper = np.take_along_axis(ordered, high[None], axis=0)[0].astype(np.float32)
+        return (lower + upper) / 2
+
+
+# 界面选项: 名称 -> (融合方法, 帧数)，None 表示只保存单帧
+FUSION_PRESETS = {
+    "单帧": None,
+    "均值 5帧": ("mean", 5),
+    "均值 10帧": ("mean", 10),
+    "中值 5帧": ("median", 5),
+    "中值 9帧": ("median", 9),
+}
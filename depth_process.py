@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+深度后处理模块 - 对已保存会话的深度数据批量执行一串向量化处理
+可用处理: 空洞填充、中值滤波、双边滤波、范围裁剪、z16→米。处理链用字符串描述，例如
+"fill:4,median:5,bilateral:5:30,clip:300:3000,meters"（冒号后为按顺序的参数）。
+结果作为派生层写入 depth_processed/<层名>/，原始 depth/ 和元数据不做任何修改；
+层信息（处理链、每步吞吐量）保存在该文件夹的 layer_info.json
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from session_journal import atomic_write_json
+from session_archive import is_archived, open_archive
+from depth_vis import session_depth_files
+
+
+PROCESSED_FOLDER = "depth_processed"
+PROCESSED_PREFIX = "depth_"
+LAYER_INFO_FILE = "layer_info.json"
+DEFAULT_LAYER = "default"
+
+# RealSense z16 的默认深度单位（米/单位），会话信息中有 depth_scale（启动RealSense时记录）时以其为准
+DEFAULT_DEPTH_SCALE = 0.001
+
+FILL_MODES = ("near", "far")
+
+
+def fill_holes(depth, max_distance=4, mode="near"):
+    """空洞填充: 每次迭代用3x3邻域中的有效深度填充空洞(0)，最多向空洞内推进 max_distance 像素
+
+    mode 为 "near" 时取邻域中最近（最小）的深度，"far" 取最远（最大），与RealSense空洞填充滤波器的两种模式相同。
+    """
+    if mode not in FILL_MODES:
+        raise ValueError(f"空洞填充模式只能为 {'/'.join(FILL_MODES)}: {mode}")
+    result = depth.copy()
+    kernel = np.ones((3, 3), np.uint8)
+    empty = np.array(np.finfo(depth.dtype).max if depth.dtype.kind == 'f' else np.iinfo(depth.dtype).max,
+                     dtype=depth.dtype)
+    for _ in range(int(max_distance)):
+        holes = result == 0
+        if not holes.any():
+            break
+        if mode == "far":
+            candidate = cv2.dilate(result, kernel)
+        else:
+            # 求最小值前把空洞换成最大值，避免0被当作最近的深度
+            candidate = cv2.erode(np.where(holes, empty, result), kernel)
+            candidate[candidate == empty] = 0
+        result[holes] = candidate[holes]
+    return result
+
+
+def median_filter(depth, ksize=5):
+    """中值滤波，空洞保持为空洞；uint16/float32 只支持3和5（OpenCV限制）"""
+    ksize = int(ksize)
+    if depth.dtype != np.uint8 and ksize not in (3, 5):
+        raise ValueError(f"{depth.dtype} 深度的中值滤波窗口只能为3或5: {ksize}")
+    source = depth.astype(np.float32) if depth.dtype.kind == 'f' else depth
+    result = cv2.medianBlur(source, ksize).astype(depth.dtype, copy=False)
+    result[depth == 0] = 0
+    return result
+
+
+def bilateral_filter(depth, diameter=5, sigma_depth=30.0, sigma_space=5.0):
+    """双边滤波（保边平滑），sigma_depth 为深度差的标准差（当前深度单位）；空洞保持为空洞"""
+    result = cv2.bilateralFilter(depth.astype(np.float32), int(diameter), float(sigma_depth), float(sigma_space))
+    result[depth == 0] = 0
+    if depth.dtype.kind in 'ui':
+        result = np.clip(np.rint(result), 0, np.iinfo(depth.dtype).max)
+    return result.astype(depth.dtype, copy=False)
+
+
+def clip_range(depth, near=100.0, far=10000.0):
+    """范围裁剪: 不在 [near, far] 内的深度置为0（空洞），单位为当前深度单位"""
+    result = depth.copy()
+    result[(depth < near) | (depth > far)] = 0
+    return result
+
+
+def to_meters(depth, scale=None):
+    """z16 转换为 float32 米: 深度 × scale（米/单位），空洞仍为0；scale 为None时使用会话的深度单位"""
+    return depth.astype(np.float32) * np.float32(scale if scale else DEFAULT_DEPTH_SCALE)
+
+
+# 名称 -> (函数, 参数名)，处理链字符串中冒号后的参数按顺序对应参数名
+OPERATIONS = {
+    "fill": (fill_holes, ("max_distance", "mode")),
+    "median": (median_filter, ("ksize",)),
+    "bilateral": (bilateral_filter, ("diameter", "sigma_depth", "sigma_space")),
+    "clip": (clip_range, ("near", "far")),
+    "meters": (to_meters, ("scale",)),
+}
+
+
+def _parse_value(text):
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def parse_chain(spec):
+    """解析处理链字符串，返回 [(名称, {参数})]；格式错误抛出 ValueError"""
+    steps = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, *values = item.split(':')
+        if name not in OPERATIONS:
+            raise ValueError(f"未知深度处理: {name}（可用: {', '.join(OPERATIONS)}）")
+        param_names = OPERATIONS[name][1]
+        if len(values) > len(param_names):
+            raise ValueError(f"{name} 最多 {len(param_names)} 个参数: {item}")
+        params = {key: _parse_value(value) for key, value in zip(param_names, values)}
+        if name == "fill" and params.get("mode", FILL_MODES[0]) not in FILL_MODES:
+            raise ValueError(f"空洞填充模式只能为 {'/'.join(FILL_MODES)}: {item}")
+        steps.append((name, params))
+    if not steps:
+        raise ValueError("处理链为空")
+    return steps
+
+
+def chain_to_string(steps):
+    return ",".join(":".join([name] + [f"{value:g}" if isinstance(value, float) else str(value)
+                                       for value in params.values()]) for name, params in steps)
+
+
+def apply_chain(depth, steps, timings=None):
+    """按顺序执行处理链；timings 为 {步骤键: 累计秒数} 时记录每步耗时（键见 step_key）"""
+    for index, (name, params) in enumerate(steps):
+        start = time.perf_counter()
+        depth = OPERATIONS[name][0](depth, **params)
+        if timings is not None:
+            key = step_key(index, name)
+            timings[key] = timings.get(key, 0.0) + time.perf_counter() - start
+    return depth
+
+
+def step_key(index, name):
+    """处理链中一步的计时键: 同一处理在链中出现多次时分别计时"""
+    return f"{index}:{name}"
+
+
+def session_depth_scale(session_path):
+    """会话信息中记录的深度单位（米/单位），没有时返回None"""
+    try:
+        with open(os.path.join(session_path, "session_info.json"), 'r', encoding='utf-8') as f:
+            return json.load(f).get("depth_scale")
+    except (OSError, ValueError):
+        return None
+
+
+def layer_folder(session_path, layer=DEFAULT_LAYER):
+    return os.path.join(session_path, PROCESSED_FOLDER, layer)
+
+
+def processed_depth_path(session_path, capture_id, layer=DEFAULT_LAYER):
+    """派生层中一次拍摄的深度文件路径"""
+    return os.path.join(layer_folder(session_path, layer), f"{PROCESSED_PREFIX}{capture_id}.npy")
+
+
+def _process_chunk(chunk, steps):
+    """处理一块深度文件（定义在模块级以便进程池调用），返回 (处理张数, {处理: 秒数})"""
+    timings = {}
+    for depth_path, output_path in chunk:
+        result = apply_chain(np.load(depth_path), steps, timings)
+        # 先写临时文件再重命名，中断时不会留下不完整的结果
+        temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+        np.save(temp_path, result)
+        os.replace(temp_path, output_path)
+    return len(chunk), timings
+
+
+def process_session(session_path, chain, layer=DEFAULT_LAYER, workers=None, chunk_size=16, force=False, log=print):
+    """对会话执行深度处理链，结果写入派生层，返回统计信息；处理链不适用于该会话的深度时抛出 ValueError
+
+    层中已有、且由同一处理链生成并比原始深度新的结果会被跳过（中断后再次运行只处理剩余部分）；
+    处理链变化或 force 时全部重新生成。已归档的会话只读，不处理，统计信息中 archived 为True。
+    """
+    start = time.perf_counter()
+    steps = parse_chain(chain) if isinstance(chain, str) else chain
+    if is_archived(session_path):
+        log(f"{os.path.basename(session_path)} 已归档，不生成深度派生层（归档会话只读）")
+        return {"session": os.path.basename(session_path), "layer": layer, "archived": True,
+                "captures": len(open_archive(session_path).captures), "cached": 0, "processed": 0,
+                "missing_depth": 0, "elapsed_seconds": 0.0, "frames_per_second": None, "operations": []}
+    scale = session_depth_scale(session_path)
+    steps = [(name, dict(params, scale=params.get("scale") or scale or DEFAULT_DEPTH_SCALE))
+             if name == "meters" else (name, params) for name, params in steps]
+    chain_text = chain_to_string(steps)
+
+    folder = layer_folder(session_path, layer)
+    info_path = os.path.join(folder, LAYER_INFO_FILE)
+    try:
+        with open(info_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = None
+    reuse = not force and previous is not None and previous.get("chain") == chain_text
+
+    stats = {"session": os.path.basename(session_path), "layer": layer, "chain": chain_text, "archived": False,
+             "captures": 0, "cached": 0, "processed": 0, "missing_depth": 0}
+    pending = []
+    for capture_id, depth_path in session_depth_files(session_path):
+        stats["captures"] += 1
+        if not depth_path or not os.path.exists(depth_path):
+            stats["missing_depth"] += 1
+            continue
+        output_path = processed_depth_path(session_path, capture_id, layer)
+        if reuse and os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(depth_path):
+            stats["cached"] += 1
+        else:
+            pending.append((depth_path, output_path))
+
+    timings = {}
+    if pending:
+        # 先在一帧上试运行，参数与深度类型不匹配时在修改派生层之前报错
+        apply_chain(np.load(pending[0][0]), steps)
+        os.makedirs(folder, exist_ok=True)
+        if not reuse:
+            # 处理链变化: 删除该层中旧处理链的结果，避免与新结果混在一起
+            for entry in os.scandir(folder):
+                if entry.name.startswith(PROCESSED_PREFIX) and entry.name.endswith(".npy"):
+                    os.remove(entry.path)
+        # 处理链写在结果之前: 中断后再次运行时可据此判断已有结果是否可复用
+        atomic_write_json(info_path, {"chain": chain_text, "source": "depth", "completed": False})
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        workers = workers or max(1, min(4, os.cpu_count() or 1))
+        log(f"深度处理 {stats['session']}: {len(pending)} 张，{workers} 个进程，处理链 {chain_text}")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_process_chunk, chunk, steps) for chunk in chunks]
+            for future in futures:
+                count, chunk_timings = future.result()
+                stats["processed"] += count
+                for name, seconds in chunk_timings.items():
+                    timings[name] = timings.get(name, 0.0) + seconds
+
+    elapsed = time.perf_counter() - start
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["frames_per_second"] = (round(stats["processed"] / elapsed, 2)
+                                  if stats["processed"] and elapsed > 0 else None)
+    # 每步的吞吐量按单个进程的处理时间计算（不含读写），用于比较各步的开销；重复出现的处理各占一项
+    stats["operations"] = []
+    for index, (name, params) in enumerate(steps):
+        seconds = timings.get(step_key(index, name))
+        stats["operations"].append({
+            "step": index, "name": name, "params": params,
+            "seconds": round(seconds, 4) if seconds is not None else None,
+            "frames_per_second": round(stats["processed"] / seconds, 1) if seconds else None})
+
+    if pending:
+        atomic_write_json(info_path, {
+            "chain": chain_text,
+            "source": "depth",
+            "completed": True,
+            "updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "captures": stats["captures"] - stats["missing_depth"],
+            "last_run": {key: stats[key] for key in ("processed", "cached", "elapsed_seconds",
+                                                     "frames_per_second", "operations")},
+        })
+    return stats
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+深度质量统计模块 - 在保存路径中计算每次拍摄的深度统计
+整数深度图只做一次 bincount 遍历，所有统计量都从计数直方图推导；
+结果随元数据和会话日志保存，无需加载深度数组即可按质量筛选拍摄
+"""
+
+import os
+import json
+import time
+
+import numpy as np
+
+from session_journal import read_journal
+from session_archive import is_archived, open_archive
+
+
+# 默认有效范围（原始深度单位）: RealSense z16 为毫米，模拟深度为 0-255 灰度（255为最近处，属于有效值）
+DEFAULT_VALID_RANGES = {
+    np.dtype(np.uint16): (100, 10000),
+    np.dtype(np.uint8): (1, 255),
+}
+
+# 只有 z16 传感器深度的类型最大值表示饱和（超出量程），8位模拟深度没有饱和值
+SATURATION_VALUES = {
+    np.dtype(np.uint16): np.iinfo(np.uint16).max,
+}
+
+
+def compute_depth_stats(depth, valid_range=None, roi_fraction=0.5, bins=16):
+    """计算深度图质量统计
+
+    hole: 深度为0的像素；saturated: z16 深度的类型最大值（8位模拟深度不计饱和）；out_of_range: 超出有效范围的其余像素。
+    center_hole_fraction 为中心ROI（边长为图像的 roi_fraction）内的空洞比例。
+    """
+    start = time.perf_counter()
+    depth = np.asarray(depth)
+    if depth.ndim == 3:
+        depth = depth[:, :, 0]
+    total = depth.size
+    if total == 0:
+        return None
+
+    if depth.dtype in (np.uint8, np.uint16):
+        stats = _integer_stats(depth, valid_range, bins)
+    else:
+        stats = _float_stats(depth, valid_range, bins)
+
+    height, width = depth.shape
+    roi_h, roi_w = max(1, int(height * roi_fraction)), max(1, int(width * roi_fraction))
+    top, left = (height - roi_h) // 2, (width - roi_w) // 2
+    roi = depth[top:top + roi_h, left:left + roi_w]
+
+    stats.update({
+        "pixels": total,
+        "valid_ratio": round(stats.pop("valid_count") / total, 4),
+        "hole_fraction": round(stats.pop("hole_count") / total, 4),
+        "saturated_fraction": round(stats.pop("saturated_count") / total, 4),
+        "out_of_range_fraction": round(stats.pop("out_of_range_count") / total, 4),
+        "center_roi": [left, top, roi_w, roi_h],
+        "center_hole_fraction": round(int(np.count_nonzero(roi == 0)) / roi.size, 4),
+        "compute_ms": round((time.perf_counter() - start) * 1000, 3),
+    })
+    return stats
+
+
+def _integer_stats(depth, valid_range, bins):
+    """整数深度: 一次bincount得到完整计数直方图，其余统计量都由它推导"""
+    max_value = np.iinfo(depth.dtype).max
+    saturation = SATURATION_VALUES.get(depth.dtype)
+    low, high = valid_range or DEFAULT_VALID_RANGES[depth.dtype]
+    low, high = max(1, int(low)), min(max_value - 1 if saturation is not None else max_value, int(high))
+
+    counts = np.bincount(depth.ravel(), minlength=max_value + 1)
+    valid_counts = counts[low:high + 1]
+    valid_count = int(valid_counts.sum())
+
+    hole_count = int(counts[0])
+    saturated_count = int(counts[saturation]) if saturation is not None else 0
+    stats = {
+        "valid_count": valid_count,
+        "hole_count": hole_count,
+        "saturated_count": saturated_count,
+        "out_of_range_count": depth.size - valid_count - hole_count - saturated_count,
+        "valid_range": [low, high],
+        "min": None, "max": None, "median": None,
+        "histogram": [0] * bins,
+        "histogram_edges": None,
+    }
+    if valid_count == 0:
+        return stats
+
+    nonzero = np.flatnonzero(valid_counts)
+    cumulative = np.cumsum(valid_counts)
+    stats["min"] = int(low + nonzero[0])
+    stats["max"] = int(low + nonzero[-1])
+    stats["median"] = int(low + np.searchsorted(cumulative, (valid_count + 1) // 2))
+
+    # 等宽区间: 8位深度按整个取值域划分（16个区间时即 value >> 4），z16 从有效范围下限开始划分；
+    # 宽度向上取整，最后一个区间可能超出有效范围上限。各区间之和等于有效像素数，区间边界一并保存
+    start, end = (0, max_value + 1) if depth.dtype == np.uint8 else (low, high + 1)
+    width = max(1, -(-(end - start) // bins))
+    bin_index = (np.arange(low, high + 1) - start) // width
+    stats["histogram"] = np.bincount(bin_index, weights=valid_counts, minlength=bins).astype(np.int64).tolist()
+    stats["histogram_edges"] = [start + i * width for i in range(bins + 1)]
+    return stats
+
+
+def _float_stats(depth, valid_range, bins):
+    """浮点深度（如米制）: 掩码后用分区求中位数"""
+    low, high = valid_range or (1e-6, np.inf)
+    finite = np.isfinite(depth)
+    hole = (depth == 0) | ~finite
+    valid = finite & (depth >= low) & (depth <= high)
+    values = depth[valid]
+    valid_count = int(values.size)
+    hole_count = int(np.count_nonzero(hole))
+
+    stats = {
+        "valid_count": valid_count,
+        "hole_count": hole_count,
+        "saturated_count": 0,
+        "out_of_range_count": depth.size - valid_count - hole_count,
+        "valid_range": [float(low), float(high) if np.isfinite(high) else None],
+        "min": None, "max": None, "median": None,
+        "histogram": [0] * bins,
+        "histogram_edges": None,
+    }
+    if valid_count == 0:
+        return stats
+
+    stats["min"] = float(values.min())
+    stats["max"] = float(values.max())
+    stats["median"] = float(np.partition(values, valid_count // 2)[valid_count // 2])
+    histogram, edges = np.histogram(values, bins=bins, range=(stats["min"], stats["max"]))
+    stats["histogram"] = histogram.astype(int).tolist()
+    stats["histogram_edges"] = [round(float(edge), 6) for edge in edges]
+    return stats
+
+
+def load_capture_stats(session_path):
+    """读取会话中每次拍摄的深度统计，优先使用会话日志（只读一个文件）
+
+    已归档的会话没有独立的日志和元数据文件，从归档索引的元数据表读取。
+    """
+    if is_archived(session_path):
+        return {metadata["capture_id"]: metadata["depth_stats"]
+                for metadata in open_archive(session_path).captures if metadata.get("depth_stats")}
+
+    captures = [record for record in read_journal(session_path)
+                if record.get("type") == "capture" and "depth_stats" in record]
+    if captures:
+        return {record["capture_id"]: record["depth_stats"] for record in captures}
+
+    # 没有日志时回退到逐个读取元数据
+    stats = {}
+    metadata_dir = os.path.join(session_path, "metadata")
+    if os.path.exists(metadata_dir):
+        for entry in os.scandir(metadata_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if metadata.get("depth_stats"):
+                stats[metadata["capture_id"]] = metadata["depth_stats"]
+    return stats
+
+
+def filter_captures(session_path, min_valid_ratio=0.0, max_center_hole=1.0, max_saturated=1.0):
+    """按深度质量筛选拍摄，返回满足条件的capture_id列表"""
+    selected = []
+    for capture_id, stats in sorted(load_capture_stats(session_path).items()):
+        if (stats["valid_ratio"] >= min_valid_ratio and
+                stats["center_hole_fraction"] <= max_center_hole and
+                stats["saturated_fraction"] <= max_saturated):
+            selected.append(capture_id)
+    return selected
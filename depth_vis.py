@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+深度可视化模块 - 按需生成 depth_vis 图像
+depth_vis 完全由深度数据派生，拍摄时可以不生成；之后在画廊/读取器查看时按需生成，
+或对整个会话批量并行生成。缓存按色表和深度范围区分：默认参数与拍摄时生成的图像相同，
+直接写在 depth_vis/ 下，其它参数写在 depth_vis/<色表_范围>/ 子文件夹；
+未指定编码格式时使用会话信息中记录的 depth_vis_format，与拍摄时生成的图像一致
+"""
+
+import os
+import glob
+import json
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from image_codec import EncodingConfig, encode_image
+from session_store import colorize_depth
+from session_archive import is_archived, open_archive, read_session_info
+
+
+DEPTH_VIS_FOLDER = "depth_vis"
+DEPTH_VIS_PREFIX = "depth_vis_"
+DEFAULT_COLORMAP = "jet"
+DEFAULT_ENCODING = "png:1"
+
+COLORMAPS = {
+    "jet": cv2.COLORMAP_JET,
+    "turbo": getattr(cv2, "COLORMAP_TURBO", cv2.COLORMAP_JET),
+    "viridis": cv2.COLORMAP_VIRIDIS,
+    "inferno": cv2.COLORMAP_INFERNO,
+    "bone": cv2.COLORMAP_BONE,
+}
+
+
+def session_depth_vis_format(session_path):
+    """会话信息中记录的深度可视化编码格式，没有时返回默认格式"""
+    session_info = read_session_info(session_path) or {}
+    return session_info.get("depth_vis_format") or DEFAULT_ENCODING
+
+
+def render_depth_vis(depth, colormap=DEFAULT_COLORMAP, value_range=None):
+    """深度着色
+
+    value_range 为None时与拍摄时的 colorize_depth 相同（8位直接着色，16位按0.03缩放）；
+    指定 (近, 远) 时线性拉伸到该范围，空洞(0)显示为黑色。
+    """
+    if colormap not in COLORMAPS:
+        raise ValueError(f"未知色表: {colormap}")
+    if value_range is None:
+        if colormap == DEFAULT_COLORMAP:
+            return colorize_depth(depth)
+        scaled = depth if depth.dtype == np.uint8 else cv2.convertScaleAbs(depth, alpha=0.03)
+        return cv2.applyColorMap(scaled, COLORMAPS[colormap])
+
+    low, high = value_range
+    scaled = (depth.astype(np.float32) - low) * (255.0 / max(high - low, 1e-6))
+    vis = cv2.applyColorMap(np.clip(scaled, 0, 255).astype(np.uint8), COLORMAPS[colormap])
+    vis[depth == 0] = 0
+    return vis
+
+
+def cache_key(colormap=DEFAULT_COLORMAP, value_range=None):
+    """缓存子文件夹名，默认参数返回空字符串（即 depth_vis/ 本身）"""
+    if colormap == DEFAULT_COLORMAP and value_range is None:
+        return ""
+    if value_range is None:
+        return f"{colormap}_auto"
+    return f"{colormap}_{value_range[0]:g}-{value_range[1]:g}"
+
+
+def write_depth_vis(depth_path, output_base, colormap, value_range, encoding):
+    """读取深度并写入可视化图像，返回写入的路径（定义在模块级以便进程池调用）"""
+    depth = np.load(depth_path)
+    data, _ = encode_image(render_depth_vis(depth, colormap, value_range), encoding)
+    path = output_base + encoding.extension
+    # 先写临时文件再重命名，画廊和批量任务同时生成同一张时不会读到不完整的文件
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return path
+
+
+def _render_chunk(chunk, colormap, value_range, encoding):
+    return [write_depth_vis(depth_path, output_base, colormap, value_range, encoding)
+            for depth_path, output_base in chunk]
+
+
+class DepthVisCache:
+    """一个会话、一组着色参数下的 depth_vis 缓存
+
+    get() 返回可视化图像路径，缺失或比深度文件旧时生成；可在多个线程中调用。
+    encoding 为None时使用会话记录的 depth_vis_format。
+    """
+
+    def __init__(self, session_path, colormap=DEFAULT_COLORMAP, value_range=None, encoding=None):
+        self.session_path = session_path
+        self.colormap = colormap
+        self.value_range = tuple(value_range) if value_range is not None else None
+        encoding = encoding or session_depth_vis_format(session_path)
+        self.encoding = EncodingConfig.parse(encoding) if isinstance(encoding, str) else encoding
+        self.folder = os.path.join(session_path, DEPTH_VIS_FOLDER, cache_key(colormap, self.value_range))
+        self._index = None
+        self._lock = threading.Lock()
+
+    def index(self):
+        """capture_id -> 已有的可视化文件（任意格式），首次调用时扫描一次目录"""
+        with self._lock:
+            if self._index is None:
+                self._index = {}
+                if os.path.isdir(self.folder):
+                    for entry in os.scandir(self.folder):
+                        if entry.is_file() and entry.name.startswith(DEPTH_VIS_PREFIX) and \
+                                not entry.name.endswith(".tmp"):
+                            capture_id = os.path.splitext(entry.name)[0][len(DEPTH_VIS_PREFIX):]
+                            self._index[capture_id] = entry.path
+            return self._index
+
+    def output_base(self, capture_id):
+        return os.path.join(self.folder, f"{DEPTH_VIS_PREFIX}{capture_id}")
+
+    def expected_path(self, capture_id):
+        """可视化图像所在（或将要生成）的路径"""
+        return self.index().get(capture_id) or self.output_base(capture_id) + self.encoding.extension
+
+    def cached(self, capture_id, depth_path):
+        path = self.index().get(capture_id)
+        if path is None:
+            return None
+        try:
+            if os.path.getmtime(path) >= os.path.getmtime(depth_path):
+                return path
+        except OSError:
+            pass
+        return None
+
+    def get(self, capture_id, depth_path):
+        """返回可视化图像路径，没有深度数据时返回None"""
+        path = self.cached(capture_id, depth_path)
+        if path is not None:
+            return path
+        if not depth_path or not os.path.exists(depth_path):
+            return None
+        os.makedirs(self.folder, exist_ok=True)
+        path = write_depth_vis(depth_path, self.output_base(capture_id), self.colormap,
+                               self.value_range, self.encoding)
+        with self._lock:
+            self._index[capture_id] = path
+        return path
+
+    def load(self, capture_id, depth_path):
+        """返回可视化图像（BGR数组）"""
+        path = self.get(capture_id, depth_path)
+        return cv2.imread(path, cv2.IMREAD_COLOR) if path else None
+
+
+def session_depth_files(session_path):
+    """按元数据列出会话中每次拍摄的 (capture_id, 深度文件路径)，没有深度的拍摄路径为None"""
+    captures = []
+    for metadata_path in sorted(glob.glob(os.path.join(session_path, "metadata", "metadata_*.json"))):
+        try:
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            continue
+        relative = (metadata.get("relative_paths") or {}).get("depth") or \
+            (os.path.join("depth", metadata["depth_file"]) if metadata.get("depth_file") else None)
+        captures.append((metadata.get("capture_id"), os.path.join(session_path, relative) if relative else None))
+    return captures
+
+
+def materialize_session(session_path, colormap=DEFAULT_COLORMAP, value_range=None, encoding=None,
+                        workers=None, chunk_size=16, log=print):
+    """为会话中缺少可视化的拍摄批量生成 depth_vis，按块分给进程池，返回统计信息
+
+    encoding 为None时使用会话记录的 depth_vis_format；已归档的会话只读，不生成，统计信息中 archived 为True。
+    """
+    start = time.perf_counter()
+    if is_archived(session_path):
+        log(f"{os.path.basename(session_path)} 已归档，不生成深度可视化（归档会话只读，查看时直接着色）")
+        return {"session": os.path.basename(session_path), "archived": True,
+                "captures": len(open_archive(session_path).captures), "cached": 0, "generated": 0,
+                "missing_depth": 0, "elapsed_seconds": 0.0, "frames_per_second": None}
+    cache = DepthVisCache(session_path, colormap, value_range, encoding)
+    pending = []
+    stats = {"session": os.path.basename(session_path), "archived": False, "captures": 0, "cached": 0,
+             "generated": 0, "missing_depth": 0}
+    for capture_id, depth_path in session_depth_files(session_path):
+        stats["captures"] += 1
+        if not depth_path or not os.path.exists(depth_path):
+            stats["missing_depth"] += 1
+        elif cache.cached(capture_id, depth_path):
+            stats["cached"] += 1
+        else:
+            pending.append((depth_path, cache.output_base(capture_id)))
+
+    if pending:
+        os.makedirs(cache.folder, exist_ok=True)
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        workers = workers or max(1, min(4, os.cpu_count() or 1))
+        log(f"生成深度可视化 {stats['session']}: {len(pending)} 张，{workers} 个进程")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_render_chunk, chunk, colormap, cache.value_range, cache.encoding)
+                       for chunk in chunks]
+            for future in futures:
+                stats["generated"] += len(future.result())
+
+    elapsed = time.perf_counter() - start
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["frames_per_second"] = round(stats["generated"] / elapsed, 2) if stats["generated"] and elapsed > 0 else None
+    return stats
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相机能力探测模块 - 探测USB相机支持的分辨率、像素格式(FOURCC)和实测帧率
+每个设备只探测一次，结果缓存到 deepdata/temp/device_capabilities.json；
+USB 2.0 下未压缩格式(YUYV)受总线带宽限制，高分辨率通常只有MJPG能达到目标帧率
+"""
+
+import os
+import sys
+import json
+import time
+from datetime import datetime
+
+import cv2
+
+from session_journal import atomic_write_json
+
+
+CAPABILITIES_FILE = "device_capabilities.json"
+DEFAULT_RESOLUTIONS = [(320, 240), (640, 480), (800, 600), (1024, 768), (1280, 720), (1920, 1080)]
+DEFAULT_FOURCCS = ["MJPG", "YUYV"]
+STANDARD_FPS = [5, 10, 15, 30, 60]
+PROBE_FPS = 60
+
+# USB 2.0 高速等时传输的实际上限约 24 MB/s（每微帧 3 x 1024 字节）
+USB2_BANDWIDTH = 24_000_000
+UNCOMPRESSED_BYTES_PER_PIXEL = {"YUYV": 2.0, "UYVY": 2.0, "NV12": 1.5, "I420": 1.5, "GREY": 1.0}
+
+# 实测帧率达到请求帧率的比例即视为可达
+FPS_TOLERANCE = 0.9
+
+
+def platform_backends(platform=None):
+    """按平台排列的后端尝试顺序: Windows先DirectShow，macOS先AVFoundation，Linux先V4L2"""
+    platform = platform or sys.platform
+    if platform.startswith("win"):
+        names = ["DSHOW", "MSMF"]
+    elif platform == "darwin":
+        names = ["AVFOUNDATION"]
+    else:
+        names = ["V4L2"]
+    return [getattr(cv2, f"CAP_{name}") for name in names if hasattr(cv2, f"CAP_{name}")] + [cv2.CAP_ANY]
+
+
+KNOWN_BACKENDS = ["ANY", "V4L2", "DSHOW", "MSMF", "AVFOUNDATION", "GSTREAMER", "FFMPEG"]
+
+
+def backend_name(backend):
+    """后端常量对应的名称，与 cap.getBackendName() 的返回值一致（CAP_ 之后的部分）"""
+    for name in KNOWN_BACKENDS:
+        if getattr(cv2, f"CAP_{name}", None) == backend:
+            return name
+    return str(backend)
+
+
+def preferred_backends(cached_name=None, platform=None):
+    """上次成功的后端排在最前，其余按平台顺序"""
+    backends = platform_backends(platform)
+    cached = getattr(cv2, f"CAP_{cached_name}", None) if cached_name else None
+    if cached is None:
+        return backends
+    return [cached] + [backend for backend in backends if backend != cached]
+
+
+def fourcc_to_str(value):
+    value = int(value)
+    if value <= 0:
+        return ""
+    return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ")
+
+
+def required_bandwidth(width, height, fps, fourcc):
+    """未压缩格式所需的总线带宽（字节/秒），压缩格式返回None"""
+    bytes_per_pixel = UNCOMPRESSED_BYTES_PER_PIXEL.get(fourcc)
+    if bytes_per_pixel is None:
+        return None
+    return width * height * bytes_per_pixel * fps
+
+
+def max_uncompressed_fps(width, height, fourcc, bandwidth=USB2_BANDWIDTH):
+    """总线带宽允许的最高未压缩帧率，压缩格式返回None"""
+    per_frame = required_bandwidth(width, height, 1, fourcc)
+    if per_frame is None:
+        return None
+    return bandwidth / per_frame
+
+
+def read_sysfs(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def device_name(camera_index):
+    """Linux下从sysfs读取设备名称，其它平台返回None"""
+    return read_sysfs(f"/sys/class/video4linux/video{camera_index}/name")
+
+
+def usb_speed_mbps(camera_index):
+    """Linux下读取设备所在USB端口速率（480为USB 2.0），无法判断时返回None"""
+    device_path = f"/sys/class/video4linux/video{camera_index}/device"
+    for relative in ("speed", "../speed"):
+        speed = read_sysfs(os.path.join(device_path, relative))
+        if speed:
+            try:
+                return float(speed)
+            except ValueError:
+                return None
+    return None
+
+
+def device_key(camera_index):
+    """缓存键: 设备编号加名称，换插其它相机后不会误用旧结果"""
+    name = device_name(camera_index)
+    return f"{camera_index}:{name}" if name else str(camera_index)
+
+
+class CameraMode:
+    """一种相机模式及其实测帧率"""
+
+    def __init__(self, width, height, fourcc, reported_fps, measured_fps, bandwidth_limited=False):
+        self.width = width
+        self.height = height
+        self.fourcc = fourcc
+        self.reported_fps = reported_fps
+        self.measured_fps = measured_fps
+        self.bandwidth_limited = bandwidth_limited
+
+    @property
+    def resolution(self):
+        return f"{self.width}x{self.height}"
+
+    def achieves(self, fps):
+        return self.measured_fps >= fps * FPS_TOLERANCE
+
+    def to_dict(self):
+        return {
+            "width": self.width,
+            "height": self.height,
+            "fourcc": self.fourcc,
+            "reported_fps": self.reported_fps,
+            "measured_fps": self.measured_fps,
+            "bandwidth_limited": self.bandwidth_limited,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["width"], data["height"], data["fourcc"], data["reported_fps"],
+                   data["measured_fps"], data.get("bandwidth_limited", False))
+
+    def __str__(self):
+        return f"{self.resolution} {self.fourcc or '默认格式'} 实测{self.measured_fps:.1f}fps"
+
+
+class DeviceCapabilities:
+    """一个设备的探测结果"""
+
+    def __init__(self, key, modes, usb_speed=None, probed_at=None, probe_seconds=None):
+        self.key = key
+        self.modes = modes
+        self.usb_speed = usb_speed
+        self.probed_at = probed_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.probe_seconds = probe_seconds
+
+    def resolutions(self):
+        """可用分辨率，按像素数排序"""
+        sizes = sorted({(mode.width, mode.height) for mode in self.modes}, key=lambda size: size[0] * size[1])
+        return [f"{width}x{height}" for width, height in sizes]
+
+    def modes_for(self, width, height):
+        return [mode for mode in self.modes if mode.width == width and mode.height == height]
+
+    def best_mode(self, width, height, fps):
+        """为请求的分辨率和帧率选择像素格式
+
+        优先选择能达到请求帧率的模式，其中未压缩格式优先（无需解码）；
+        都达不到时选择实测帧率最高的模式。
+        """
+        candidates = self.modes_for(width, height)
+        if not candidates:
+            return None
+        achieving = [mode for mode in candidates if mode.achieves(fps)]
+        if achieving:
+            return min(achieving, key=lambda mode: (mode.fourcc not in UNCOMPRESSED_BYTES_PER_PIXEL,
+                                                    -mode.measured_fps))
+        return max(candidates, key=lambda mode: mode.measured_fps)
+
+    def fps_options(self, width, height):
+        """该分辨率下可达到的标准帧率及对应模式，返回 [(fps, mode)]"""
+        options = []
+        for fps in STANDARD_FPS:
+            mode = self.best_mode(width, height, fps)
+            if mode is not None and mode.achieves(fps):
+                options.append((fps, mode))
+        if not options:
+            # 连最低标准帧率都达不到时，按实测帧率提供唯一选项
+            mode = max(self.modes_for(width, height), key=lambda m: m.measured_fps, default=None)
+            if mode is not None:
+                options.append((max(1, int(mode.measured_fps)), mode))
+        return options
+
+    def to_dict(self):
+        return {
+            "key": self.key,
+            "usb_speed_mbps": self.usb_speed,
+            "probed_at": self.probed_at,
+            "probe_seconds": self.probe_seconds,
+            "modes": [mode.to_dict() for mode in self.modes],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["key"], [CameraMode.from_dict(mode) for mode in data.get("modes", [])],
+                   data.get("usb_speed_mbps"), data.get("probed_at"), data.get("probe_seconds"))
+
+
+def measure_fps(cap, frames=20, warmup=3, max_seconds=3.0):
+    """连续读取若干帧测量实际帧率，读取失败返回0"""
+    for _ in range(warmup):
+        if not cap.read()[0]:
+            return 0.0
+    start = time.perf_counter()
+    count = 0
+    while count < frames and time.perf_counter() - start < max_seconds:
+        if not cap.read()[0]:
+            break
+        count += 1
+    elapsed = time.perf_counter() - start
+    return round(count / elapsed, 2) if count and elapsed > 0 else 0.0
+
+
+def probe_device(camera_index, backend=None, resolutions=None, fourccs=None,
+                 measure_frames=20, log=print):
+    """探测设备支持的模式，返回 DeviceCapabilities，无法打开设备时返回None
+
+    对每个 FOURCC 和分辨率先设置格式再设置尺寸（V4L2要求的顺序），以设备回读的尺寸为准；
+    USB 2.0 下总线带宽连5fps都不够的未压缩模式直接跳过，不浪费探测时间。
+    """
+    start = time.perf_counter()
+    cap = cv2.VideoCapture(camera_index, platform_backends()[0] if backend is None else backend)
+    if not cap.isOpened():
+        cap.release()
+        return None
+
+    usb_speed = usb_speed_mbps(camera_index)
+    usb2 = usb_speed is None or usb_speed <= 480
+    seen = set()
+    modes = []
+    try:
+        for fourcc in fourccs or DEFAULT_FOURCCS:
+            for width, height in resolutions or DEFAULT_RESOLUTIONS:
+                limit = max_uncompressed_fps(width, height, fourcc) if usb2 else None
+                if limit is not None and limit < STANDARD_FPS[0]:
+                    log(f"跳过 {width}x{height} {fourcc}: USB 2.0 带宽仅够 {limit:.1f}fps")
+                    continue
+
+                cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+                cap.set(cv2.CAP_PROP_FPS, PROBE_FPS)
+
+                actual = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+                actual_fourcc = fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC)) or fourcc
+                key = (actual, actual_fourcc)
+                if key in seen:
+                    continue
+                seen.add(key)
+
+                measured = measure_fps(cap, measure_frames)
+                if measured <= 0:
+                    continue
+                mode = CameraMode(actual[0], actual[1], actual_fourcc, round(cap.get(cv2.CAP_PROP_FPS), 2),
+                                  measured, bandwidth_limited=limit is not None and limit < PROBE_FPS)
+                modes.append(mode)
+                log(f"探测模式: {mode}")
+    finally:
+        cap.release()
+
+    return DeviceCapabilities(device_key(camera_index), modes, usb_speed,
+                              probe_seconds=round(time.perf_counter() - start, 2))
+
+
+class CapabilityCache:
+    """设备能力缓存，以 device_key 为键保存在JSON文件中"""
+
+    def __init__(self, path):
+        self.path = path
+        self.devices = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.devices = json.load(f)
+        except (OSError, ValueError):
+            self.devices = {}
+
+    def get(self, key):
+        data = self.devices.get(key)
+        return DeviceCapabilities.from_dict(data) if data and data.get("modes") else None
+
+    def put(self, capabilities):
+        data = capabilities.to_dict()
+        backend = self.devices.get(capabilities.key, {}).get("backend")
+        if backend:
+            data["backend"] = backend
+        self.devices[capabilities.key] = data
+        self.save()
+
+    def get_backend(self, key):
+        """上次成功打开该设备的后端名称（如 "V4L2"）"""
+        return self.devices.get(key, {}).get("backend")
+
+    def put_backend(self, key, name):
+        if not name or self.get_backend(key) == name:
+            return
+        self.devices.setdefault(key, {"key": key})["backend"] = name
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        atomic_write_json(self.path, self.devices)
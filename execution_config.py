@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+执行配置模块 - 统一分配OpenCV内部线程、工作线程池、预览帧率和抓帧线程的CPU核心
+4核采集设备上OpenCV线程池、抓帧线程、保存和界面线程互相争抢CPU会造成帧间隔抖动；
+预设在低延迟、高吞吐和低功耗之间取舍，所选配置和实测效果写入会话信息
+"""
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+
+# 导入时（应用任何预设之前）的OpenCV线程数，默认预设恢复为该值
+DEFAULT_CV_THREADS = cv2.getNumThreads()
+
+
+class ExecutionConfig:
+    """一组执行参数
+
+    cv_threads: cv2.setNumThreads 的值（None 表示OpenCV默认，即恢复为应用任何预设前的线程数）；
+    worker_threads: 缩略图等后台线程池的大小；preview_max_fps: 预览帧率上限；
+    grab_core: 抓帧线程绑定的CPU核心（None 表示不绑定，仅Linux支持）。
+    """
+
+    def __init__(self, name, cv_threads=None, worker_threads=4, preview_max_fps=30, grab_core=None):
+        self.name = name
+        self.cv_threads = cv_threads
+        self.worker_threads = worker_threads
+        self.preview_max_fps = preview_max_fps
+        self.grab_core = grab_core
+
+    def apply(self):
+        """应用进程级设置，返回实际生效的OpenCV线程数"""
+        cv2.setNumThreads(self.cv_threads if self.cv_threads is not None else DEFAULT_CV_THREADS)
+        return cv2.getNumThreads()
+
+    def pin_current_thread(self):
+        """把调用线程绑定到 grab_core，成功返回True"""
+        if self.grab_core is None or not hasattr(os, "sched_setaffinity"):
+            return False
+        try:
+            # Linux下pid为0时只作用于调用线程
+            os.sched_setaffinity(0, {self.grab_core})
+            return True
+        except OSError:
+            return False
+
+    def to_dict(self):
+        return {
+            "preset": self.name,
+            "cpu_count": os.cpu_count(),
+            "cv_threads": self.cv_threads,
+            "cv_threads_effective": cv2.getNumThreads(),
+            "worker_threads": self.worker_threads,
+            "preview_max_fps": self.preview_max_fps,
+            "grab_core": self.grab_core,
+        }
+
+
+PRESET_NAMES = {
+    "默认": "default",
+    "低延迟": "low_latency",
+    "高吞吐": "high_throughput",
+    "低功耗": "low_power",
+}
+
+
+def preset_config(name, cpu_count=None):
+    """按CPU核心数生成预设配置，name 可以是中文名称或英文键"""
+    key = PRESET_NAMES.get(name, name)
+    cores = cpu_count or os.cpu_count() or 1
+
+    if key == "low_latency":
+        # 抓帧线程独占最后一个核心，OpenCV和后台线程让出两个核心给抓帧和界面
+        return ExecutionConfig(key, cv_threads=max(1, cores - 2), worker_threads=1,
+                               preview_max_fps=30, grab_core=cores - 1 if cores > 2 else None)
+    if key == "high_throughput":
+        return ExecutionConfig(key, cv_threads=cores, worker_threads=max(2, cores),
+                               preview_max_fps=15)
+    if key == "low_power":
+        return ExecutionConfig(key, cv_threads=1, worker_threads=1, preview_max_fps=10)
+    if key == "default":
+        return ExecutionConfig(key, cv_threads=None, worker_threads=4, preview_max_fps=30)
+    raise ValueError(f"未知执行预设: {name}")
+
+
+class FrameTiming:
+    """抓帧间隔和进程CPU占用统计，用于衡量执行配置的实际效果"""
+
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self.intervals = []
+        self._last = None
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    def record(self, now=None):
+        now = time.perf_counter() if now is None else now
+        if self._last is not None and len(self.intervals) < self.max_samples:
+            self.intervals.append(now - self._last)
+        self._last = now
+
+    def summary(self):
+        wall = time.perf_counter() - self._wall_start
+        cpu = time.process_time() - self._cpu_start
+        summary = {
+            "frames": len(self.intervals) + (1 if self._last is not None else 0),
+            "cpu_percent": round(100.0 * cpu / wall, 1) if wall > 0 else None,
+        }
+        if self.intervals:
+            intervals = np.asarray(self.intervals) * 1000
+            summary.update({
+                "fps": round(1000.0 / intervals.mean(), 2),
+                "interval_mean_ms": round(float(intervals.mean()), 3),
+                "interval_std_ms": round(float(intervals.std()), 3),
+                "interval_p95_ms": round(float(np.percentile(intervals, 95)), 3),
+                "interval_max_ms": round(float(intervals.max()), 3),
+            })
+        return summary
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧统计模块 - 为每一帧打上序号和采集时刻，逐个交接点统计丢帧、重复帧和帧龄
+交接点: 传感器→抓帧（驱动缓冲丢帧或抓帧循环来不及读取）、抓帧→预览（节拍抽帧、Tk事件队列）、
+抓帧→深度估计（沿用旧的估计结果）、触发→保存（重复保存同一帧）。
+时间统一使用 time.perf_counter()；帧源能提供传感器时间戳时以传感器时刻为起点（"glass"），否则以抓帧时刻为起点
+"""
+
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class FrameTag:
+    """一帧的标记: 抓帧序号、抓帧时刻，以及帧源提供的传感器序号和采集时刻（perf_counter 时间轴）
+
+    depth_sequence 为与该帧一起使用的深度所来自的帧序号: 默认与RGB同一帧，
+    USB相机模式下深度估计在工作线程中进行，可能来自较早的帧；没有深度时为None。
+    """
+
+    __slots__ = ("sequence", "grab_time", "sensor_sequence", "sensor_time", "depth_sequence")
+
+    def __init__(self, sequence, grab_time, sensor_sequence=None, sensor_time=None):
+        self.sequence = sequence
+        self.grab_time = grab_time
+        self.sensor_sequence = sensor_sequence
+        self.sensor_time = sensor_time
+        self.depth_sequence = sequence
+
+    @property
+    def capture_time(self):
+        """帧的采集时刻: 有传感器时间戳时为传感器时刻，否则为抓帧时刻"""
+        return self.sensor_time if self.sensor_time is not None else self.grab_time
+
+    def age_ms(self, now=None):
+        now = time.perf_counter() if now is None else now
+        return (now - self.capture_time) * 1000
+
+    def to_dict(self):
+        return {"sequence": self.sequence, "sensor_sequence": self.sensor_sequence,
+                "clock": "sensor" if self.sensor_time is not None else "grab"}
+
+
+def wall_time_to_perf(timestamp_ms):
+    """把墙上时钟毫秒时间戳换算到 perf_counter 时间轴"""
+    return time.perf_counter() - (time.time() - timestamp_ms / 1000.0)
+
+
+def monotonic_time_to_perf(timestamp_ms, tolerance=2.0):
+    """把单调时钟毫秒时间戳（如V4L2缓冲时间戳）换算到 perf_counter 时间轴
+
+    时间戳与当前单调时钟相差超过 tolerance 秒（不是同一时钟，例如从流开始计时的位置）时返回None。
+    """
+    age = time.monotonic() - timestamp_ms / 1000.0
+    if not 0 <= age < tolerance:
+        return None
+    return time.perf_counter() - age
+
+
+class StageCounter:
+    """一个交接点按帧序号统计: 序号跳过的帧计为丢帧，序号重复计为重复帧"""
+
+    def __init__(self, count_gaps=True):
+        self.count_gaps = count_gaps
+        self.frames = 0
+        self.dropped = 0
+        self.duplicates = 0
+        self.last_sequence = None
+
+    def see(self, sequence):
+        """记录经过该交接点的帧，重复帧返回False"""
+        last = self.last_sequence
+        if last is not None and sequence <= last:
+            self.duplicates += 1
+            return False
+        if last is not None and self.count_gaps:
+            self.dropped += sequence - last - 1
+        self.last_sequence = sequence
+        self.frames += 1
+        return True
+
+    def summary(self):
+        summary = {"frames": self.frames, "duplicates": self.duplicates}
+        if self.count_gaps:
+            summary["dropped"] = self.dropped
+        return summary
+
+
+class LatencyWindow:
+    """延迟统计（毫秒）: 最近样本窗口用于分位数，指数平均用于实时显示"""
+
+    def __init__(self, size=512, smoothing=0.1):
+        self.samples = deque(maxlen=size)
+        self.smoothing = smoothing
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+        self.recent = None
+
+    def add(self, value_ms):
+        self.samples.append(value_ms)
+        self.count += 1
+        self.total += value_ms
+        self.max = value_ms if self.max is None else max(self.max, value_ms)
+        self.recent = value_ms if self.recent is None else self.recent + self.smoothing * (value_ms - self.recent)
+
+    def summary(self):
+        if not self.count:
+            return None
+        samples = np.asarray(self.samples)
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3),
+            "p50": round(float(np.percentile(samples, 50)), 3),
+            "p95": round(float(np.percentile(samples, 95)), 3),
+            "max": round(self.max, 3),
+        }
+
+
+class SensorDropDetector:
+    """传感器→抓帧的丢帧检测
+
+    有传感器序号时按序号间隔计数；否则按采集时刻间隔与名义帧间隔之比估计。
+    丢帧按原因归类: 两次读取之间抓帧循环本身（处理、sleep）已超过一个帧间隔时计为 grab_loop，
+    循环按时等待新帧时仍有间隔则计为 driver（驱动/USB缓冲丢帧）。
+    """
+
+    def __init__(self, nominal_fps=None):
+        self.period = 1.0 / nominal_fps if nominal_fps else None
+        self.driver = 0
+        self.grab_loop = 0
+        self.duplicates = 0
+        self._last_sequence = None
+        self._last_time = None
+        self._intervals = deque(maxlen=32)
+
+    def record(self, tag, loop_busy):
+        """loop_busy: 上一帧读取返回到这一次开始读取之间的秒数"""
+        interval = tag.capture_time - self._last_time if self._last_time is not None else None
+        if interval is not None:
+            self._intervals.append(interval)
+        # 未指定名义帧率时以近期间隔的中位数作为帧间隔
+        period = self.period or (float(np.median(self._intervals)) if self._intervals else None)
+
+        if tag.sensor_sequence is not None and self._last_sequence is not None:
+            gap = tag.sensor_sequence - self._last_sequence
+            if gap <= 0:
+                self.duplicates += 1
+                return
+            missed = gap - 1
+        elif interval is not None and period:
+            missed = max(0, int(round(interval / period)) - 1)
+        else:
+            missed = 0
+
+        if missed:
+            if period is not None and loop_busy is not None and loop_busy > period:
+                self.grab_loop += missed
+            else:
+                self.driver += missed
+        self._last_sequence = tag.sensor_sequence
+        self._last_time = tag.capture_time
+
+    def reset(self):
+        """帧流重新开始（重连相机）: 不与中断前的最后一帧比较"""
+        self._last_sequence = None
+        self._last_time = None
+
+    @property
+    def dropped(self):
+        return self.driver + self.grab_loop
+
+    def summary(self):
+        return {"dropped": self.dropped, "dropped_driver": self.driver, "dropped_grab_loop": self.grab_loop,
+                "duplicates": self.duplicates,
+                "nominal_period_ms": round(self.period * 1000, 3) if self.period else None}
+
+
+class FrameAccounting:
+    """整条管线的帧统计
+
+    抓帧线程调用 begin_read()/tag()，界面线程调用 displayed()/capture_started()/capture_finished()；
+    summary() 写入会话信息，status_text() 用于状态栏。回放（live=False）不统计传感器丢帧。
+    """
+
+    def __init__(self, nominal_fps=None, live=True):
+        self.live = live
+        self.sequence = 0
+        self.sensor = SensorDropDetector(nominal_fps)
+        self.preview = StageCounter()
+        self.preview_discarded = 0
+        self.depth = StageCounter(count_gaps=False)
+        self.capture = StageCounter(count_gaps=False)
+        self.latency = {
+            "sensor_to_grab": LatencyWindow(),
+            "grab_to_queue": LatencyWindow(),
+            "tk_queue": LatencyWindow(),
+            "glass_to_display": LatencyWindow(),
+            "trigger_to_save": LatencyWindow(),
+            "frame_age_at_trigger": LatencyWindow(),
+            "frame_age_at_save": LatencyWindow(),
+        }
+        self._read_start = None
+        self._last_read_end = None
+        self._lock = threading.Lock()
+
+    def begin_read(self):
+        """抓帧线程开始读取（阻塞等待帧）之前调用，用于区分循环自身耗时和等待新帧的时间"""
+        self._read_start = time.perf_counter()
+
+    def tag(self, sensor_sequence=None, sensor_time=None):
+        """读取到一帧后立即调用，返回该帧的标记"""
+        now = time.perf_counter()
+        loop_busy = None
+        if self._read_start is not None and self._last_read_end is not None:
+            loop_busy = self._read_start - self._last_read_end
+        self._last_read_end = now
+
+        with self._lock:
+            self.sequence += 1
+            tag = FrameTag(self.sequence, now, sensor_sequence, sensor_time)
+            if sensor_time is not None:
+                self.latency["sensor_to_grab"].add((now - sensor_time) * 1000)
+            if self.live:
+                self.sensor.record(tag, loop_busy)
+        return tag
+
+    def stream_restarted(self):
+        """相机重新打开后调用: 传感器序号和时间从头开始，中断期间不计为丢帧"""
+        with self._lock:
+            self.sensor.reset()
+            self._last_read_end = None
+
+    def queued(self, tag):
+        """预览帧交给界面线程时调用，返回入队时刻"""
+        now = time.perf_counter()
+        with self._lock:
+            self.latency["grab_to_queue"].add((now - tag.grab_time) * 1000)
+        return now
+
+    def displayed(self, tag, queued_at, render_start):
+        """预览帧在界面上显示后调用（界面线程）"""
+        now = time.perf_counter()
+        with self._lock:
+            self.preview.see(tag.sequence)
+            self.latency["tk_queue"].add((render_start - queued_at) * 1000)
+            self.latency["glass_to_display"].add((now - tag.capture_time) * 1000)
+
+    def discarded(self, tag):
+        """已入队的预览帧因相机停止等原因未显示"""
+        with self._lock:
+            self.preview_discarded += 1
+
+    def depth_result(self, reused):
+        """USB相机模式下每帧记录深度是新的估计结果还是沿用上一次的结果"""
+        with self._lock:
+            if reused:
+                self.depth.duplicates += 1
+            else:
+                self.depth.frames += 1
+
+    def capture_started(self, tag, trigger_time):
+        """开始保存前调用（界面线程），返回写入元数据的帧时序信息；同一帧重复保存时 duplicate 为True"""
+        now = time.perf_counter()
+        info = {"sequence": None, "duplicate": False, "clock": None,
+                "trigger_wait_ms": round((now - trigger_time) * 1000, 3) if trigger_time is not None else None}
+        if tag is None:
+            return info
+        with self._lock:
+            info.update({
+                "sequence": tag.sequence,
+                "sensor_sequence": tag.sensor_sequence,
+                "depth_sequence": tag.depth_sequence,
+                "depth_lag_frames": tag.sequence - tag.depth_sequence if tag.depth_sequence is not None else None,
+                "clock": tag.to_dict()["clock"],
+                "duplicate": not self.capture.see(tag.sequence),
+                "frame_age_ms": round(tag.age_ms(now), 3),
+            })
+            if trigger_time is not None:
+                # 负值表示保存的帧在触发之后才采集（等待清晰帧或融合后续帧）
+                info["frame_age_at_trigger_ms"] = round((trigger_time - tag.capture_time) * 1000, 3)
+                self.latency["frame_age_at_trigger"].add(info["frame_age_at_trigger_ms"])
+        return info
+
+    def capture_finished(self, tag, trigger_time):
+        """保存完成后调用，记录触发到保存完成的耗时和保存完成时的帧龄，返回触发到保存完成的毫秒数"""
+        now = time.perf_counter()
+        with self._lock:
+            if tag is not None:
+                self.latency["frame_age_at_save"].add(tag.age_ms(now))
+            if trigger_time is None:
+                return None
+            elapsed = (now - trigger_time) * 1000
+            self.latency["trigger_to_save"].add(elapsed)
+        return elapsed
+
+    def status_text(self):
+        """状态栏: 丢帧数和当前显示帧的帧龄"""
+        parts = []
+        if self.sensor.dropped:
+            parts.append(f"丢帧 {self.sensor.dropped}")
+        display = self.latency["glass_to_display"].recent
+        if display is not None:
+            parts.append(f"显示延迟 {display:.0f}ms")
+        return "".join(f" · {part}" for part in parts)
+
+    def summary(self):
+        with self._lock:
+            return {
+                "frames": self.sequence,
+                "sensor": self.sensor.summary() if self.live else None,
+                # 未显示的帧包括预览节拍的主动抽帧，原因见会话信息的 preview 字段
+                "preview": {"displayed": self.preview.frames, "not_displayed": self.preview.dropped,
+                            "duplicates": self.preview.duplicates, "discarded": self.preview_discarded},
+                "depth": {"new_estimates": self.depth.frames, "reused_estimates": self.depth.duplicates},
+                "capture": self.capture.summary(),
+                "latency_ms": {name: window.summary() for name, window in self.latency.items()},
+            }
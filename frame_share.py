@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧共享模块 - 通过命名共享内存把实时RGB/深度帧提供给本机其它进程（标注、质检工具）
+共享内存中是一个N槽环形缓冲: 头部记录最新序号，每个槽有自己的序号、时间戳、形状和类型，
+发布端按序号轮流写槽，从不等待读取端；读取端直接在共享内存上构造numpy视图（不复制），
+用完后以 SharedFrame.valid() 确认该槽未被覆盖。读取端在头部的读取者表中登记已读序号，
+发布端据此统计每个读取端落后的帧数
+
+读取示例:
+    from frame_share import FrameSubscriber
+    with FrameSubscriber() as subscriber:
+        while True:
+            frame = subscriber.wait(timeout=1.0)
+            if frame is None:
+                break
+            process(frame.rgb, frame.depth)   # 共享内存上的视图
+            if not frame.valid():
+                ...                           # 处理期间该槽已被覆盖，结果作废
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from session_journal import pid_alive
+
+
+DEFAULT_SHARE_NAME = "depthcam_frames"
+SHARE_MAGIC = b"DCFS"
+SHARE_VERSION = 1
+DEFAULT_SLOTS = 4
+DEFAULT_MAX_READERS = 8
+# 超过该时间未读取的读取端视为已退出，其登记位置可被新的读取端使用
+READER_STALE_SECONDS = 30.0
+DATA_ALIGNMENT = 64
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S4"), ("version", "<u4"), ("slot_count", "<u4"), ("max_readers", "<u4"),
+    ("slot_capacity", "<u8"), ("write_seq", "<u8"), ("writer_pid", "<i8"), ("closed", "<u4"),
+], align=True)
+READER_DTYPE = np.dtype([
+    ("pid", "<i8"), ("last_seq", "<u8"), ("last_time", "<f8"), ("frames_read", "<u8"),
+], align=True)
+ARRAY_DTYPE = np.dtype([
+    ("dtype", "S8"), ("ndim", "<u4"), ("shape", "<u4", (4,)), ("offset", "<u8"), ("nbytes", "<u8"),
+], align=True)
+SLOT_DTYPE = np.dtype([
+    ("seq", "<u8"), ("timestamp", "<f8"), ("rgb", ARRAY_DTYPE), ("depth", ARRAY_DTYPE),
+], align=True)
+
+
+def _aligned(size):
+    return (size + DATA_ALIGNMENT - 1) // DATA_ALIGNMENT * DATA_ALIGNMENT
+
+
+class ShareLayout:
+    """共享内存布局: 头部 | 读取者表 | 槽头 | 槽数据"""
+
+    def __init__(self, slot_count, max_readers, slot_capacity):
+        self.slot_count = slot_count
+        self.max_readers = max_readers
+        self.slot_capacity = slot_capacity
+        self.readers_offset = _aligned(HEADER_DTYPE.itemsize)
+        self.slots_offset = _aligned(self.readers_offset + READER_DTYPE.itemsize * max_readers)
+        self.data_offset = _aligned(self.slots_offset + SLOT_DTYPE.itemsize * slot_count)
+        self.size = self.data_offset + slot_capacity * slot_count
+
+    def views(self, buf):
+        """返回 (头部, 读取者表, 槽头) 的numpy视图"""
+        header = np.ndarray((), HEADER_DTYPE, buffer=buf, offset=0)
+        readers = np.ndarray((self.max_readers,), READER_DTYPE, buffer=buf, offset=self.readers_offset)
+        slots = np.ndarray((self.slot_count,), SLOT_DTYPE, buffer=buf, offset=self.slots_offset)
+        return header, readers, slots
+
+    def slot_data_offset(self, index):
+        return self.data_offset + index * self.slot_capacity
+
+
+def attach_shared_memory(name):
+    """连接已有的共享内存，读取端退出时不删除它
+
+    Python 3.13 之前连接方也会登记到 resource_tracker，进程退出时会把发布端的共享内存删除，需要取消登记。
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name != "nt":
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class ShareInUseError(FileExistsError):
+    """同名帧共享正由另一个仍在运行的发布端使用"""
+
+
+@contextmanager
+def registration_lock(name):
+    """跨进程的读取者表登记锁（临时目录中的锁文件），保证同一登记位置不会被两个读取端同时占用"""
+    path = os.path.join(tempfile.gettempdir(), f"{name}.readers.lock")
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        if os.name == "nt":
+            import msvcrt
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def _segment_owner(name):
+    """已有同名共享内存的发布端进程号；已关闭时返回0，不是帧共享格式时返回None"""
+    shm = attach_shared_memory(name)
+    try:
+        if shm.size < HEADER_DTYPE.itemsize:
+            return None
+        header = np.ndarray((), HEADER_DTYPE, buffer=shm.buf, offset=0)
+        try:
+            if bytes(header["magic"]) != SHARE_MAGIC:
+                return None
+            return 0 if header["closed"] else int(header["writer_pid"])
+        finally:
+            del header
+    finally:
+        shm.close()
+
+
+def _write_array_meta(meta, array, offset):
+    if array is None:
+        meta["ndim"] = 0
+        meta["nbytes"] = 0
+        return
+    meta["dtype"] = array.dtype.str.encode("ascii")
+    meta["ndim"] = array.ndim
+    meta["shape"] = tuple(array.shape) + (0,) * (4 - array.ndim)
+    meta["offset"] = offset
+    meta["nbytes"] = array.nbytes
+
+
+def _array_view(meta, buf):
+    ndim = int(meta["ndim"])
+    if ndim == 0:
+        return None
+    shape = tuple(int(value) for value in meta["shape"][:ndim])
+    return np.ndarray(shape, np.dtype(meta["dtype"].decode("ascii")), buffer=buf, offset=int(meta["offset"]))
+
+
+class FramePublisher:
+    """帧发布端，由采集循环调用 publish()
+
+    共享内存在第一帧时按帧尺寸创建（深度按每像素2字节预留，深度估计尚未输出时也能容纳）；
+    帧尺寸超出槽容量时重新创建，已连接的读取端看到 closed 标志后需要重新连接。
+    """
+
+    def __init__(self, name=DEFAULT_SHARE_NAME, slots=DEFAULT_SLOTS, max_readers=DEFAULT_MAX_READERS, log=print):
+        self.name = name
+        self.slots = slots
+        self.max_readers = max_readers
+        self.log = log
+        self.sequence = 0
+        self.frames_published = 0
+        self.frames_skipped = 0
+        self.publish_ms = None
+        self.created_segments = 0
+        self.closed = False
+        self._shm = None
+        self._layout = None
+        self._header = None
+        self._readers = None
+        self._slot_headers = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self._shm is not None
+
+    def _create(self, rgb, depth):
+        pixels = rgb.shape[0] * rgb.shape[1]
+        depth_bytes = max(depth.nbytes if depth is not None else 0, pixels * 2)
+        layout = ShareLayout(self.slots, self.max_readers, _aligned(rgb.nbytes) + _aligned(depth_bytes))
+        try:
+            shm = shared_memory.SharedMemory(name=self.name, create=True, size=layout.size)
+        except FileExistsError:
+            # 只回收发布端已退出（上次异常退出残留）或已关闭的同名共享内存
+            owner = _segment_owner(self.name)
+            if owner is None:
+                raise ShareInUseError(f"共享内存 {self.name} 已存在且不是帧共享格式")
+            if owner and pid_alive(owner):
+                raise ShareInUseError(f"帧共享 {self.name} 正由进程 {owner} 发布")
+            stale = shared_memory.SharedMemory(name=self.name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=self.name, create=True, size=layout.size)
+
+        header, readers, slot_headers = layout.views(shm.buf)
+        readers[...] = 0
+        slot_headers[...] = 0
+        header["magic"] = SHARE_MAGIC
+        header["version"] = SHARE_VERSION
+        header["slot_count"] = layout.slot_count
+        header["max_readers"] = layout.max_readers
+        header["slot_capacity"] = layout.slot_capacity
+        header["write_seq"] = 0
+        header["writer_pid"] = os.getpid()
+        header["closed"] = 0
+
+        self._shm, self._layout = shm, layout
+        self._header, self._readers, self._slot_headers = header, readers, slot_headers
+        self.created_segments += 1
+        self.log(f"帧共享已创建: {self.name}，{layout.slot_count} 槽 × {layout.slot_capacity / 1e6:.1f} MB")
+
+    def publish(self, rgb, depth=None, timestamp=None):
+        """写入下一个槽，返回帧序号；已关闭或无法创建共享内存时返回None"""
+        if rgb is None:
+            return None
+        start = time.perf_counter()
+        with self._lock:
+            if self.closed:
+                return None
+            needed = _aligned(rgb.nbytes) + _aligned(depth.nbytes if depth is not None else 0)
+            if self._shm is not None and needed > self._layout.slot_capacity:
+                self._close_segment()
+            if self._shm is None:
+                try:
+                    self._create(rgb, depth)
+                except ShareInUseError as e:
+                    # 不抢占其他发布端的共享内存，停止发布
+                    self.closed = True
+                    self.frames_skipped += 1
+                    self.log(f"帧共享未启动: {e}")
+                    return None
+                except OSError as e:
+                    self.frames_skipped += 1
+                    self.log(f"创建帧共享失败: {e}")
+                    return None
+
+            self.sequence += 1
+            index = self.sequence % self._layout.slot_count
+            slot = self._slot_headers[index]
+            base = self._layout.slot_data_offset(index)
+
+            # 序号置0表示正在写入，写完数据和形状后再写入新序号
+            slot["seq"] = 0
+            buf = self._shm.buf
+            rgb_offset, depth_offset = base, base + _aligned(rgb.nbytes)
+            _write_array_meta(slot["rgb"], rgb, rgb_offset)
+            np.copyto(_array_view(slot["rgb"], buf), rgb)
+            _write_array_meta(slot["depth"], depth, depth_offset)
+            if depth is not None:
+                np.copyto(_array_view(slot["depth"], buf), depth)
+            slot["timestamp"] = timestamp if timestamp is not None else time.time()
+            slot["seq"] = self.sequence
+            self._header["write_seq"] = self.sequence
+            self.frames_published += 1
+
+        elapsed = (time.perf_counter() - start) * 1000
+        self.publish_ms = elapsed if self.publish_ms is None else self.publish_ms + 0.1 * (elapsed - self.publish_ms)
+        return self.sequence
+
+    def reader_stats(self):
+        """已登记读取端的状态: 落后帧数（最新序号减已读序号）和距上次读取的秒数"""
+        with self._lock:
+            if self._shm is None:
+                return []
+            write_seq = int(self._header["write_seq"])
+            now = time.time()
+            stats = []
+            for reader in self._readers:
+                if reader["pid"] == 0 or now - reader["last_time"] > READER_STALE_SECONDS:
+                    continue
+                stats.append({
+                    "pid": int(reader["pid"]),
+                    "lag_frames": max(0, write_seq - int(reader["last_seq"])),
+                    "idle_seconds": round(now - float(reader["last_time"]), 3),
+                    "frames_read": int(reader["frames_read"]),
+                })
+            return stats
+
+    def summary(self):
+        readers = self.reader_stats()
+        return {
+            "name": self.name,
+            "slots": self.slots,
+            "frames_published": self.frames_published,
+            "frames_skipped": self.frames_skipped,
+            "publish_ms": round(self.publish_ms, 3) if self.publish_ms is not None else None,
+            "segments_created": self.created_segments,
+            "readers": readers,
+            "max_reader_lag_frames": max((reader["lag_frames"] for reader in readers), default=None),
+        }
+
+    def _close_segment(self):
+        self._header["closed"] = 1
+        self._header = self._readers = self._slot_headers = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+        self._shm = None
+
+    def close(self):
+        """标记关闭并删除共享内存（已连接的读取端仍可读完已映射的数据）"""
+        with self._lock:
+            self.closed = True
+            if self._shm is not None:
+                self._close_segment()
+
+
+class SharedFrame:
+    """共享内存中的一帧: rgb/depth 是共享内存上的视图，发布端写满一圈后会被覆盖"""
+
+    def __init__(self, subscriber, slot_index, seq, timestamp, rgb, depth):
+        self.subscriber = subscriber
+        self.slot_index = slot_index
+        self.seq = seq
+        self.timestamp = timestamp
+        self.rgb = rgb
+        self.depth = depth
+
+    @property
+    def age_ms(self):
+        """帧发布至今的毫秒数"""
+        return (time.time() - self.timestamp) * 1000
+
+    def valid(self):
+        """该槽仍是这一帧（未被发布端覆盖）"""
+        return self.subscriber.slot_seq(self.slot_index) == self.seq
+
+    def copy(self):
+        """复制为普通数组，复制期间被覆盖时返回None"""
+        rgb = self.rgb.copy()
+        depth = self.depth.copy() if self.depth is not None else None
+        if not self.valid():
+            return None
+        return rgb, depth
+
+
+class FrameSubscriber:
+    """帧读取端，连接发布端创建的共享内存；发布端未运行时抛出 FileNotFoundError"""
+
+    def __init__(self, name=DEFAULT_SHARE_NAME):
+        self.name = name
+        self.last_seq = 0
+        self.frames_read = 0
+        self.frames_missed = 0
+        self.torn_reads = 0
+        self._shm = attach_shared_memory(name)
+        header = np.ndarray((), HEADER_DTYPE, buffer=self._shm.buf, offset=0)
+        if bytes(header["magic"]) != SHARE_MAGIC or int(header["version"]) != SHARE_VERSION:
+            del header
+            self._shm.close()
+            raise ValueError(f"不是帧共享内存或版本不兼容: {name}")
+        self._layout = ShareLayout(int(header["slot_count"]), int(header["max_readers"]),
+                                   int(header["slot_capacity"]))
+        del header
+        self._header, self._readers, self._slots = self._layout.views(self._shm.buf)
+        self._reader = self._register()
+
+    def _register(self):
+        """在读取者表中登记，表满时不登记（仍可读取，但发布端看不到该读取端的落后情况）
+
+        查找空位和写入进程号在跨进程锁内完成，多个读取端同时启动时不会占用同一位置；
+        进程已退出或长时间未读取的登记位置可被复用。
+        """
+        with registration_lock(self.name):
+            now = time.time()
+            for index in range(self._layout.max_readers):
+                reader = self._readers[index]
+                pid = int(reader["pid"])
+                if pid == 0 or now - reader["last_time"] > READER_STALE_SECONDS or not pid_alive(pid):
+                    reader["last_seq"] = self._header["write_seq"]
+                    reader["last_time"] = now
+                    reader["frames_read"] = 0
+                    reader["pid"] = os.getpid()
+                    return reader
+        return None
+
+    @property
+    def closed(self):
+        return self._shm is None or bool(self._header["closed"])
+
+    @property
+    def latest_seq(self):
+        return int(self._header["write_seq"])
+
+    @property
+    def lag(self):
+        """发布端最新序号与本读取端已读序号之差"""
+        return max(0, self.latest_seq - self.last_seq)
+
+    def slot_seq(self, index):
+        return int(self._slots[index]["seq"])
+
+    def latest(self):
+        """返回最新一帧（零拷贝视图），还没有帧或正在被覆盖时返回None"""
+        seq = self.latest_seq
+        if seq == 0:
+            return None
+        index = seq % self._layout.slot_count
+        slot = self._slots[index]
+        if int(slot["seq"]) != seq:
+            self.torn_reads += 1
+            return None
+        buf = self._shm.buf
+        frame = SharedFrame(self, index, seq, float(slot["timestamp"]),
+                            _array_view(slot["rgb"], buf), _array_view(slot["depth"], buf))
+        # 构造视图期间槽被覆盖时形状信息可能不一致
+        if int(slot["seq"]) != seq:
+            self.torn_reads += 1
+            return None
+
+        if seq > self.last_seq:
+            if self.last_seq:
+                self.frames_missed += seq - self.last_seq - 1
+            self.frames_read += 1
+            self.last_seq = seq
+            if self._reader is not None:
+                self._reader["last_seq"] = seq
+                self._reader["frames_read"] = self.frames_read
+        if self._reader is not None:
+            self._reader["last_time"] = time.time()
+        return frame
+
+    def wait(self, timeout=1.0, poll_interval=0.001):
+        """等待比已读序号更新的一帧，超时或发布端关闭时返回None"""
+        deadline = time.perf_counter() + timeout
+        while not self.closed:
+            if self.latest_seq > self.last_seq:
+                frame = self.latest()
+                if frame is not None:
+                    return frame
+            if time.perf_counter() >= deadline:
+                return None
+            time.sleep(poll_interval)
+        return None
+
+    def stats(self):
+        return {"name": self.name, "frames_read": self.frames_read, "frames_missed": self.frames_missed,
+                "torn_reads": self.torn_reads, "lag_frames": self.lag if not self.closed else None}
+
+    def close(self):
+        """注销读取端并断开连接；之前返回的 SharedFrame 视图需先释放"""
+        if self._shm is None:
+            return
+        if self._reader is not None and not self._header["closed"]:
+            self._reader["pid"] = 0
+        self._header = self._readers = self._slots = self._reader = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # 调用方仍持有帧视图，映射在进程退出时释放
+            pass
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,780 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帧源模块 - 为实时预览管线提供统一的帧输入
+包含会话回放源（静态拍摄或录制流），支持O(1)跳转和后台预取
+"""
+
+import os
+import json
+import glob
+import time
+import struct
+import threading
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from image_codec import read_image
+from device_probe import fourcc_to_str, backend_name, platform_backends
+from depth_estimator import EdgeDepthEstimator, run_estimator
+from session_archive import is_archived, open_archive
+from frame_accounting import monotonic_time_to_perf, wall_time_to_perf
+from capture_supervisor import FRAME_TIMEOUT_MS, SourceDisconnectedError
+
+# 尝试导入pyrealsense2库
+try:
+    import pyrealsense2 as rs
+
+    REALSENSE_AVAILABLE = True
+except ImportError:
+    REALSENSE_AVAILABLE = False
+
+
+# 录制流的文件布局（位于会话目录下的 stream/ 子文件夹）
+STREAM_FOLDER = "stream"
+STREAM_INFO_FILE = "stream_info.json"
+STREAM_RGB_FILE = "rgb.raw"
+STREAM_DEPTH_FILE = "depth.raw"
+STREAM_TIMESTAMP_FILE = "timestamps.bin"
+
+# 静态拍摄回放时相邻两帧的最大间隔（秒），避免拍摄间隙导致长时间等待
+MAX_STILL_GAP = 1.0
+
+
+class FrameSource:
+    """帧源基类，read() 返回 (rgb_frame, depth_frame)，没有更多帧时返回 None
+
+    实时帧源在相机断开或等待帧超时时抛出 SourceDisconnectedError，可 close() 后重新 open()。
+
+    live 为True表示实时帧源（采集ROI等抓帧后处理对其生效），回放源为False。
+    sensor_sequence/sensor_time 为最近一帧的传感器序号和采集时刻（perf_counter 时间轴），帧源不提供时为None。
+    depth_scale 为深度的单位（米/单位），open() 后已知时给出，记入会话信息供深度后处理使用。
+    """
+
+    name = "base"
+    live = False
+    sensor_sequence = None
+    sensor_time = None
+    depth_scale = None
+
+    def open(self):
+        return True
+
+    def read(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def open_video_capture(camera_index, width, height, fps, log=print, fourcc=None, backends=None):
+    """打开USB相机并设置参数，按顺序尝试后端，失败返回None
+
+    fourcc 为像素格式（如 "MJPG"），需在设置分辨率之前设置才会生效；
+    backends 默认按平台排序（见 device_probe.preferred_backends），成功的后端可通过 cap.getBackendName() 获得。
+    """
+    log(f"正在启动相机 {camera_index}...")
+
+    cap = None
+    for backend in backends or platform_backends():
+        open_start = time.perf_counter()
+        cap = cv2.VideoCapture(camera_index, backend)
+
+        if cap.isOpened():
+            log(f"成功使用后端 {backend_name(backend)} 打开相机 ({(time.perf_counter() - open_start) * 1000:.0f} ms)")
+            break
+        else:
+            log(f"后端 {backend_name(backend)} 打开相机失败")
+            cap.release()
+            cap = None
+
+    if not cap or not cap.isOpened():
+        log("所有后端都无法打开相机")
+        return None
+
+    # 设置相机参数
+    if fourcc:
+        log(f"设置像素格式: {fourcc}")
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    log(f"设置分辨率: {width}x{height}")
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    cap.set(cv2.CAP_PROP_FPS, fps)
+
+    # 设置缓冲区大小以减少延迟
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    # 读取超时（OpenCV 4.6+，部分后端支持），相机拔出时 read() 不会长时间阻塞
+    if hasattr(cv2, "CAP_PROP_READ_TIMEOUT_MSEC"):
+        cap.set(cv2.CAP_PROP_READ_TIMEOUT_MSEC, FRAME_TIMEOUT_MS)
+
+    # 验证设置
+    actual_width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
+    actual_height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+    actual_fps = cap.get(cv2.CAP_PROP_FPS)
+
+    actual_format = fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC))
+
+    log(f"实际设置 - 分辨率: {int(actual_width)}x{int(actual_height)}, 帧率: {int(actual_fps)}, "
+        f"格式: {actual_format or '未知'}")
+
+    # 测试读取
+    ret, frame = cap.read()
+    if not ret:
+        log("错误: 无法读取相机图像")
+        cap.release()
+        return None
+
+    log(f"读取测试成功，图像尺寸: {frame.shape}")
+    return cap
+
+
+def start_realsense_pipeline(width=640, height=480, fps=30):
+    """启动RealSense深度和彩色流，返回 (pipeline, align)"""
+    pipeline = rs.pipeline()
+    config = rs.config()
+
+    config.enable_stream(rs.stream.depth, width, height, rs.format.z16, fps)
+    config.enable_stream(rs.stream.color, width, height, rs.format.bgr8, fps)
+
+    pipeline.start(config)
+    return pipeline, rs.align(rs.stream.color)
+
+
+def realsense_depth_scale(pipeline):
+    """已启动的RealSense管线的深度单位（米/单位），读取失败时返回None"""
+    try:
+        return float(pipeline.get_active_profile().get_device().first_depth_sensor().get_depth_scale())
+    except (RuntimeError, AttributeError):
+        return None
+
+
+def opencv_sensor_time(cap):
+    """USB相机最近一帧的驱动时间戳换算到 perf_counter 时间轴
+
+    V4L2后端的 CAP_PROP_POS_MSEC 是单调时钟的缓冲时间戳；其它后端为流内位置或0，无法换算时返回None。
+    """
+    timestamp = cap.get(cv2.CAP_PROP_POS_MSEC)
+    return monotonic_time_to_perf(timestamp) if timestamp > 0 else None
+
+
+def realsense_frame_info(frame):
+    """RealSense帧的 (传感器帧号, perf_counter 时间轴上的采集时刻)，硬件时钟的时间戳无法换算时为None"""
+    sensor_time = None
+    if frame.get_frame_timestamp_domain() in (rs.timestamp_domain.system_time, rs.timestamp_domain.global_time):
+        sensor_time = wall_time_to_perf(frame.get_timestamp())
+    return frame.get_frame_number(), sensor_time
+
+
+class AcquisitionROI:
+    """采集ROI和输出缩放，在抓帧后立即应用
+
+    roi 为归一化的 (x, y, w, h)，取值0-1；裁剪只生成视图不复制数据，
+    仅在 scale != 1 时缩放产生一次拷贝（深度图使用最近邻插值，避免混合空洞和有效深度）。
+    """
+
+    PRESETS = {"全画面": None, "中心 75%": 0.75, "中心 50%": 0.5, "中心 25%": 0.25}
+
+    def __init__(self, roi=None, scale=1.0):
+        self.roi = tuple(roi) if roi else None
+        self.scale = float(scale)
+
+    @classmethod
+    def center(cls, fraction, scale=1.0):
+        if not fraction or fraction >= 1.0:
+            return cls(None, scale)
+        offset = (1.0 - fraction) / 2
+        return cls((offset, offset, fraction, fraction), scale)
+
+    @property
+    def is_identity(self):
+        return self.roi is None and self.scale == 1.0
+
+    def pixel_roi(self, shape):
+        """归一化ROI换算为传感器像素坐标 (x, y, w, h)"""
+        height, width = shape[:2]
+        if self.roi is None:
+            return 0, 0, width, height
+        x, y, w, h = self.roi
+        left, top = int(round(x * width)), int(round(y * height))
+        return left, top, max(1, int(round(w * width))), max(1, int(round(h * height)))
+
+    def apply(self, frame, interpolation=cv2.INTER_AREA):
+        if frame is None or self.is_identity:
+            return frame
+        left, top, width, height = self.pixel_roi(frame.shape)
+        view = frame[top:top + height, left:left + width]
+        if self.scale == 1.0:
+            return view
+        size = (max(1, int(width * self.scale)), max(1, int(height * self.scale)))
+        return cv2.resize(view, size, interpolation=interpolation)
+
+    def apply_depth(self, depth):
+        return self.apply(depth, interpolation=cv2.INTER_NEAREST)
+
+    def output_shape(self, shape):
+        _, _, width, height = self.pixel_roi(shape)
+        return max(1, int(height * self.scale)), max(1, int(width * self.scale))
+
+    def pixel_fraction(self, shape):
+        """输出像素数占传感器整帧的比例，近似反映后续各阶段的CPU和字节开销"""
+        out_height, out_width = self.output_shape(shape)
+        return (out_height * out_width) / float(shape[0] * shape[1])
+
+    def metadata(self, shape):
+        """写入元数据，输出坐标 (u, v) 对应传感器坐标 (x + u / scale, y + v / scale)"""
+        left, top, width, height = self.pixel_roi(shape)
+        out_height, out_width = self.output_shape(shape)
+        return {
+            "sensor_size": [int(shape[1]), int(shape[0])],
+            "roi": [left, top, width, height],
+            "scale": self.scale,
+            "output_size": [out_width, out_height],
+            "pixel_fraction": round(self.pixel_fraction(shape), 4),
+        }
+
+
+class SessionIndex:
+    """会话帧索引，每一帧对应一个条目，按下标O(1)定位"""
+
+    def __init__(self, session_path):
+        self.session_path = session_path
+        self.kind = None
+        self.entries = []
+        self.stream_info = None
+        # 已归档的会话从归档中读取，条目中的路径仍相对于会话目录给出
+        self.archive = open_archive(session_path) if is_archived(session_path) else None
+        self.build()
+
+    def build(self):
+        """优先使用录制流，否则从metadata构建静态拍摄索引"""
+        stream_path = os.path.join(self.session_path, STREAM_FOLDER)
+        if self.archive is not None:
+            has_stream = self.archive.has(f"{STREAM_FOLDER}/{STREAM_INFO_FILE}")
+        else:
+            has_stream = os.path.exists(os.path.join(stream_path, STREAM_INFO_FILE))
+        if has_stream:
+            self.build_stream_index(stream_path)
+        else:
+            self.build_still_index()
+
+    def build_stream_index(self, stream_path):
+        """录制流: 定长帧记录，第i帧的偏移量为 i * 帧字节数"""
+        if self.archive is not None:
+            self.stream_info = self.archive.read_json(f"{STREAM_FOLDER}/{STREAM_INFO_FILE}")
+            timestamp_file = f"{STREAM_FOLDER}/{STREAM_TIMESTAMP_FILE}"
+            timestamps = (np.frombuffer(self.archive.read_bytes(timestamp_file), dtype='<f8')
+                          if self.archive.has(timestamp_file) else np.zeros(0))
+            rgb_size = self.archive.entry(f"{STREAM_FOLDER}/{STREAM_RGB_FILE}")["size"]
+        else:
+            with open(os.path.join(stream_path, STREAM_INFO_FILE), 'r', encoding='utf-8') as f:
+                self.stream_info = json.load(f)
+            timestamp_path = os.path.join(stream_path, STREAM_TIMESTAMP_FILE)
+            timestamps = np.fromfile(timestamp_path, dtype='<f8') if os.path.exists(timestamp_path) else np.zeros(0)
+            rgb_size = os.path.getsize(os.path.join(stream_path, STREAM_RGB_FILE))
+
+        # 以实际写入的数据量为准，兼容未正常结束的录制
+        rgb_bytes = int(np.prod(self.stream_info["rgb_shape"])) * np.dtype(self.stream_info["rgb_dtype"]).itemsize
+        count = min(len(timestamps), rgb_size // rgb_bytes)
+
+        self.kind = "stream"
+        self.entries = [{"index": i, "timestamp": float(timestamps[i])} for i in range(count)]
+
+    def build_still_index(self):
+        """静态拍摄: 按拍摄序号排序metadata，缺失metadata时回退到扫描rgb文件夹"""
+        self.kind = "stills"
+        if self.archive is not None:
+            all_metadata = self.archive.captures
+        else:
+            all_metadata = []
+            for metadata_path in sorted(glob.glob(os.path.join(self.session_path, "metadata", "metadata_*.json"))):
+                try:
+                    with open(metadata_path, 'r', encoding='utf-8') as f:
+                        all_metadata.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+
+        entries = []
+        for metadata in all_metadata:
+            relative_paths = metadata.get("relative_paths", {})
+            entries.append({
+                "capture_index": metadata.get("capture_index", len(entries) + 1),
+                "rgb": os.path.join(self.session_path, relative_paths.get("rgb") or
+                                    os.path.join("rgb", metadata.get("rgb_file", ""))),
+                "depth": os.path.join(self.session_path, relative_paths.get("depth") or
+                                      os.path.join("depth", metadata.get("depth_file") or "")),
+                "timestamp": parse_timestamp(metadata.get("timestamp")),
+            })
+
+        if not entries:
+            for rgb_path in sorted(glob.glob(os.path.join(self.session_path, "rgb", "rgb_*"))):
+                capture_id = os.path.splitext(os.path.basename(rgb_path))[0][len("rgb_"):]
+                entries.append({
+                    "capture_index": len(entries) + 1,
+                    "rgb": rgb_path,
+                    "depth": os.path.join(self.session_path, "depth", f"depth_{capture_id}.npy"),
+                    "timestamp": os.path.getmtime(rgb_path),
+                })
+
+        entries.sort(key=lambda entry: entry["capture_index"])
+
+        # 将拍摄时间换算为回放时间轴，压缩过长的间隔
+        playback_time = 0.0
+        previous = None
+        for entry in entries:
+            timestamp = entry["timestamp"]
+            if previous is not None:
+                gap = timestamp - previous if timestamp is not None else MAX_STILL_GAP
+                playback_time += min(max(gap, 0.0), MAX_STILL_GAP)
+            if timestamp is not None:
+                previous = timestamp
+            entry["playback_time"] = playback_time
+
+        self.entries = entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def playback_time(self, index):
+        """返回第index帧在回放时间轴上的位置（秒）"""
+        entry = self.entries[index]
+        if self.kind == "stream":
+            return entry["timestamp"] - self.entries[0]["timestamp"]
+        return entry["playback_time"]
+
+
+def parse_timestamp(value):
+    """解析metadata中的时间戳字符串，失败时返回None"""
+    if not value:
+        return None
+    for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+class PlaybackSource(FrameSource):
+    """会话回放帧源
+
+    speed 为回放倍速（如0.25、1、4），speed <= 0 表示不做节拍控制、尽可能快地输出，
+    用于处理性能基准测试。后台线程预取即将播放的帧，回放不会因磁盘读取而停顿。
+    """
+
+    name = "playback"
+
+    def __init__(self, session_path, speed=1.0, prefetch=16, loop=False):
+        self.session_path = session_path
+        self.speed = speed
+        self.prefetch = max(1, int(prefetch))
+        self.loop = loop
+
+        self.index = None
+        self.position = 0
+
+        self._cache = {}
+        self._next_to_load = 0
+        self._generation = 0
+        self._condition = threading.Condition()
+        self._prefetch_thread = None
+        self._running = False
+
+        self._stream_rgb = None
+        self._stream_depth = None
+
+        self._clock_start = None
+        self._clock_origin = 0.0
+
+        self.frames_read = 0
+        self.prefetch_misses = 0
+        self.read_start_time = None
+
+    def open(self):
+        """构建索引并启动预取线程"""
+        self.index = SessionIndex(self.session_path)
+        if len(self.index) == 0:
+            return False
+
+        if self.index.kind == "stream":
+            self.open_stream_maps()
+
+        self._running = True
+        self._prefetch_thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+        self._prefetch_thread.start()
+        return True
+
+    def open_stream_maps(self):
+        """以内存映射方式打开录制流，按帧偏移直接定位"""
+        info = self.index.stream_info
+        stream_path = os.path.join(self.session_path, STREAM_FOLDER)
+        count = len(self.index)
+
+        archive = self.index.archive
+        if archive is not None:
+            # 归档中录制流原样存储，按偏移直接映射
+            self._stream_rgb = archive.memmap(f"{STREAM_FOLDER}/{STREAM_RGB_FILE}", np.dtype(info["rgb_dtype"]),
+                                              (count, *info["rgb_shape"]))
+            depth_file = f"{STREAM_FOLDER}/{STREAM_DEPTH_FILE}"
+            if info.get("depth_shape") and archive.has(depth_file):
+                self._stream_depth = archive.memmap(depth_file, np.dtype(info["depth_dtype"]),
+                                                    (count, *info["depth_shape"]))
+            return
+
+        self._stream_rgb = np.memmap(os.path.join(stream_path, STREAM_RGB_FILE),
+                                     dtype=np.dtype(info["rgb_dtype"]), mode='r',
+                                     shape=(count, *info["rgb_shape"]))
+
+        depth_path = os.path.join(stream_path, STREAM_DEPTH_FILE)
+        if info.get("depth_shape") and os.path.exists(depth_path):
+            self._stream_depth = np.memmap(depth_path, dtype=np.dtype(info["depth_dtype"]), mode='r',
+                                           shape=(count, *info["depth_shape"]))
+
+    def load_frame(self, index):
+        """从磁盘读取并解码一帧"""
+        if self.index.kind == "stream":
+            rgb = np.array(self._stream_rgb[index])
+            depth = np.array(self._stream_depth[index]) if self._stream_depth is not None else None
+            return rgb, depth
+
+        entry = self.index.entries[index]
+        archive = self.index.archive
+        if archive is not None:
+            rgb_relative = os.path.relpath(entry["rgb"], self.session_path)
+            depth_relative = os.path.relpath(entry["depth"], self.session_path)
+            rgb = archive.read_image(rgb_relative) if archive.has(rgb_relative) else None
+            depth = archive.load_array(depth_relative) if archive.has(depth_relative) else None
+            return rgb, depth
+        rgb = read_image(entry["rgb"])
+        depth = np.load(entry["depth"]) if os.path.isfile(entry["depth"]) else None
+        return rgb, depth
+
+    def _prefetch_loop(self):
+        """预取线程: 保持当前位置之后的若干帧已解码在内存中"""
+        while True:
+            with self._condition:
+                while self._running and (self._next_to_load >= len(self.index) or
+                                         self._next_to_load - self.position >= self.prefetch):
+                    self._condition.wait()
+                if not self._running:
+                    return
+                index = self._next_to_load
+                generation = self._generation
+
+            try:
+                frame = self.load_frame(index)
+            except Exception as e:
+                print(f"回放预取失败 (帧 {index}): {e}")
+                frame = (None, None)
+
+            with self._condition:
+                # 期间发生跳转则丢弃过期结果
+                if generation == self._generation:
+                    self._cache[index] = frame
+                    self._next_to_load = index + 1
+                    self._condition.notify_all()
+
+    def seek(self, index):
+        """跳转到指定帧，清空预取缓存并重置节拍时钟"""
+        if self.index is None or len(self.index) == 0:
+            return
+        index = max(0, min(int(index), len(self.index) - 1))
+        with self._condition:
+            self._generation += 1
+            self.position = index
+            self._cache = {k: v for k, v in self._cache.items() if index <= k < index + self.prefetch}
+            self._next_to_load = index
+            while self._next_to_load in self._cache:
+                self._next_to_load += 1
+            self._clock_start = None
+            self._condition.notify_all()
+
+    def set_speed(self, speed):
+        """修改回放倍速，从当前帧重新计时"""
+        self.speed = speed
+        self._clock_start = None
+
+    def _wait_for_schedule(self, index):
+        """按回放倍速等待该帧的播放时刻"""
+        if self.speed is None or self.speed <= 0:
+            return
+        frame_time = self.index.playback_time(index)
+        now = time.perf_counter()
+        if self._clock_start is None:
+            self._clock_start = now
+            self._clock_origin = frame_time
+            return
+        delay = (frame_time - self._clock_origin) / self.speed - (now - self._clock_start)
+        if delay > 0:
+            time.sleep(delay)
+
+    def read(self):
+        """返回下一帧 (rgb, depth)，回放结束返回None"""
+        if self.index is None:
+            return None
+
+        if self.read_start_time is None:
+            self.read_start_time = time.perf_counter()
+
+        with self._condition:
+            missed = False
+            while True:
+                if not self._running:
+                    return None
+                if self.position >= len(self.index):
+                    if not self.loop:
+                        return None
+                    self.seek(0)
+                index = self.position
+                if index in self._cache:
+                    break
+                if not missed:
+                    missed = True
+                    self.prefetch_misses += 1
+                self._condition.wait(0.5)
+
+            rgb, depth = self._cache.pop(index)
+            self.position = index + 1
+            self._condition.notify_all()
+
+        self._wait_for_schedule(index)
+        self.frames_read += 1
+        return rgb, depth
+
+    def stats(self):
+        """返回回放统计，用于处理速度基准"""
+        elapsed = time.perf_counter() - self.read_start_time if self.read_start_time else 0.0
+        return {
+            "frames": self.frames_read,
+            "elapsed_seconds": round(elapsed, 3),
+            "fps": round(self.frames_read / elapsed, 2) if elapsed > 0 else 0.0,
+            "prefetch_misses": self.prefetch_misses,
+            "kind": self.index.kind if self.index else None,
+        }
+
+    def close(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._prefetch_thread:
+            self._prefetch_thread.join(timeout=1.0)
+            self._prefetch_thread = None
+        self._cache = {}
+        self._stream_rgb = None
+        self._stream_depth = None
+
+
+class OpenCVSource(FrameSource):
+    """USB相机帧源，深度由估计器生成（默认边缘检测模拟），estimate_scale 为估计时的缩小比例"""
+
+    name = "opencv"
+    live = True
+
+    def __init__(self, camera_index=0, width=640, height=480, fps=30, log=print, fourcc=None, backends=None,
+                 estimator=None, estimate_scale=1.0):
+        self.camera_index = camera_index
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.log = log
+        self.fourcc = fourcc
+        self.backends = backends
+        self.estimator = estimator or EdgeDepthEstimator()
+        self.estimate_scale = estimate_scale
+        self.cap = None
+
+    def open(self):
+        self.cap = open_video_capture(self.camera_index, self.width, self.height, self.fps, self.log,
+                                      self.fourcc, self.backends)
+        return self.cap is not None
+
+    def read(self):
+        try:
+            ret, frame = self.cap.read()
+        except cv2.error as e:
+            raise SourceDisconnectedError(f"读取帧失败: {e}") from e
+        if not ret:
+            raise SourceDisconnectedError("读取帧失败")
+        self.sensor_time = opencv_sensor_time(self.cap)
+        return frame, run_estimator(self.estimator, frame, None, self.estimate_scale)
+
+    def close(self):
+        if self.cap:
+            self.cap.release()
+            self.cap = None
+
+
+class RealSenseSource(FrameSource):
+    """Intel RealSense帧源，深度对齐到彩色图像"""
+
+    name = "realsense"
+    live = True
+
+    def __init__(self, width=640, height=480, fps=30):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.pipeline = None
+        self.align = None
+
+    def open(self):
+        if not REALSENSE_AVAILABLE:
+            return False
+        self.pipeline, self.align = start_realsense_pipeline(self.width, self.height, self.fps)
+        self.depth_scale = realsense_depth_scale(self.pipeline)
+        return True
+
+    def read(self):
+        while True:
+            try:
+                frames = self.pipeline.wait_for_frames(FRAME_TIMEOUT_MS)
+            except RuntimeError as e:
+                raise SourceDisconnectedError(f"等待帧超时: {e}") from e
+            aligned_frames = self.align.process(frames)
+            color_frame = aligned_frames.get_color_frame()
+            depth_frame = aligned_frames.get_depth_frame()
+            if color_frame and depth_frame:
+                self.sensor_sequence, self.sensor_time = realsense_frame_info(color_frame)
+                return np.asanyarray(color_frame.get_data()), np.asanyarray(depth_frame.get_data())
+
+    def close(self):
+        if self.pipeline:
+            self.pipeline.stop()
+            self.pipeline = None
+
+
+class SyntheticSource(FrameSource):
+    """合成测试帧源: 生成移动的彩色图案和uint16深度，无需相机即可测试整条管线
+
+    disconnect_every 为模拟断开的间隔帧数: 每输出这么多帧后 read() 抛出 SourceDisconnectedError，
+    之后 outage 秒内 open() 失败（设备不在），用于测试自动重连。
+    """
+
+    name = "synthetic"
+    live = True
+
+    def __init__(self, width=640, height=480, fps=30, max_frames=None, disconnect_every=None, outage=1.0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.max_frames = max_frames
+        self.disconnect_every = disconnect_every
+        self.outage = outage
+        self.frame_index = 0
+        self._frames_since_open = 0
+        self._offline_until = None
+        self._pattern = None
+        self._depth = None
+        self._next_time = None
+
+    def open(self):
+        """预先生成图案，读帧时只做平移"""
+        if self._offline_until is not None and time.perf_counter() < self._offline_until:
+            return False
+        self._frames_since_open = 0
+        self._next_time = time.perf_counter()
+        if self._pattern is not None:
+            return True
+        y, x = np.mgrid[0:self.height, 0:self.width].astype(np.float32)
+        self._pattern = np.dstack([
+            (np.sin(x / 23.0) * 127 + 128),
+            (np.sin(y / 17.0) * 127 + 128),
+            ((x + y) / (self.width + self.height) * 255),
+        ]).astype(np.uint8)
+
+        # 深度: 倾斜平面上的一个半球，单位毫米，左上角留出空洞区域
+        radius = min(self.width, self.height) / 4
+        distance = np.sqrt((x - self.width / 2) ** 2 + (y - self.height / 2) ** 2)
+        sphere = np.clip(radius ** 2 - distance ** 2, 0, None) ** 0.5
+        depth = 1500 + y * 2 - sphere * 3
+        depth[:self.height // 10, :self.width // 10] = 0
+        self._depth = depth.astype(np.uint16)
+        return True
+
+    def read(self):
+        if self.max_frames is not None and self.frame_index >= self.max_frames:
+            return None
+        if self.disconnect_every and self._frames_since_open >= self.disconnect_every:
+            self._frames_since_open = 0
+            self._offline_until = time.perf_counter() + self.outage
+            raise SourceDisconnectedError("模拟相机断开")
+
+        # 按设定帧率节拍输出
+        if self.fps:
+            self._next_time += 1.0 / self.fps
+            delay = self._next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self._next_time = time.perf_counter()
+
+        shift = (self.frame_index * 4) % self.width
+        rgb = np.roll(self._pattern, shift, axis=1)
+        cv2.putText(rgb, f"#{self.frame_index}", (10, self.height - 15),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        depth = np.roll(self._depth, shift // 2, axis=1)
+        self.sensor_sequence = self.frame_index
+        self.sensor_time = self._next_time if self.fps else time.perf_counter()
+        self.frame_index += 1
+        self._frames_since_open += 1
+        return rgb, depth
+
+
+class StreamRecorder:
+    """录制流写入器: 定长原始帧追加写入，配合 SessionIndex 实现O(1)跳转"""
+
+    def __init__(self, session_path, fps=None):
+        self.stream_path = os.path.join(session_path, STREAM_FOLDER)
+        self.fps = fps
+        self.info = None
+        self.frame_count = 0
+        self._rgb_file = None
+        self._depth_file = None
+        self._timestamp_file = None
+
+    def write(self, rgb_frame, depth_frame=None, timestamp=None):
+        """追加一帧，首帧决定整个流的尺寸和数据类型"""
+        if self.info is None:
+            self._open(rgb_frame, depth_frame)
+
+        if list(rgb_frame.shape) != self.info["rgb_shape"]:
+            raise ValueError(f"录制流帧尺寸不一致: {rgb_frame.shape}")
+
+        self._rgb_file.write(np.ascontiguousarray(rgb_frame).tobytes())
+        if self._depth_file is not None:
+            if depth_frame is None:
+                depth_frame = np.zeros(self.info["depth_shape"], dtype=self.info["depth_dtype"])
+            self._depth_file.write(np.ascontiguousarray(depth_frame).tobytes())
+        self._timestamp_file.write(struct.pack('<d', time.time() if timestamp is None else timestamp))
+        self.frame_count += 1
+
+    def _open(self, rgb_frame, depth_frame):
+        os.makedirs(self.stream_path, exist_ok=True)
+        self.info = {
+            "rgb_shape": list(rgb_frame.shape),
+            "rgb_dtype": str(rgb_frame.dtype),
+            "depth_shape": list(depth_frame.shape) if depth_frame is not None else None,
+            "depth_dtype": str(depth_frame.dtype) if depth_frame is not None else None,
+            "fps": self.fps,
+            "frame_count": 0,
+        }
+        self._write_info()
+
+        self._rgb_file = open(os.path.join(self.stream_path, STREAM_RGB_FILE), 'ab')
+        if depth_frame is not None:
+            self._depth_file = open(os.path.join(self.stream_path, STREAM_DEPTH_FILE), 'ab')
+        self._timestamp_file = open(os.path.join(self.stream_path, STREAM_TIMESTAMP_FILE), 'ab')
+
+    def _write_info(self):
+        with open(os.path.join(self.stream_path, STREAM_INFO_FILE), 'w', encoding='utf-8') as f:
+            json.dump(self.info, f, indent=2, ensure_ascii=False)
+
+    def close(self):
+        for handle in (self._rgb_file, self._depth_file, self._timestamp_file):
+            if handle:
+                handle.close()
+        self._rgb_file = self._depth_file = self._timestamp_file = None
+        if self.info is not None:
+            self.info["frame_count"] = self.frame_count
+            self._write_info()
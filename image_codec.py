@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图像编码模块 - 可配置的存储格式（PNG/无损WebP/JPEG/原始数组）
+直接用OpenCV写入BGR数据，并测量每种格式的编码耗时和字节数
+"""
+
+import io
+import os
+import time
+
+import cv2
+import numpy as np
+
+
+# 格式名 -> (扩展名, OpenCV参数, 默认等级, 等级范围)
+FORMATS = {
+    "png": (".png", cv2.IMWRITE_PNG_COMPRESSION, 3, (0, 9)),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY, 101, (101, 101)),  # 质量>100为无损模式
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY, 95, (1, 100)),
+    "raw": (".npy", None, None, None),
+}
+
+# 界面中提供的预设
+FORMAT_PRESETS = ["png:1", "png:3", "png:6", "png:9", "webp", "jpeg:95", "jpeg:85", "raw"]
+
+
+class EncodingConfig:
+    """单个数据流的存储格式配置，例如 png:6、jpeg:90、webp、raw"""
+
+    def __init__(self, fmt="png", level=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"不支持的图像格式: {fmt}")
+        self.format = fmt
+        extension, param, default_level, level_range = FORMATS[fmt]
+        self.extension = extension
+        self.param = param
+        if level is None:
+            level = default_level
+        if level_range is not None:
+            level = max(level_range[0], min(level_range[1], int(level)))
+        self.level = level
+
+    @classmethod
+    def parse(cls, spec):
+        """解析 "格式:等级" 形式的配置字符串"""
+        fmt, _, level = spec.strip().lower().partition(':')
+        if fmt == "jpg":
+            fmt = "jpeg"
+        return cls(fmt, int(level) if level else None)
+
+    def with_level(self, level):
+        return EncodingConfig(self.format, level)
+
+    def imencode_params(self):
+        return [self.param, self.level] if self.param is not None else []
+
+    def __str__(self):
+        if self.format in ("png", "jpeg"):
+            return f"{self.format}:{self.level}"
+        return self.format
+
+
+class EncodeResult:
+    """一次编码写入的结果和耗时"""
+
+    def __init__(self, path, encoding, encode_ms, write_ms, num_bytes):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.encoding = encoding
+        self.encode_ms = encode_ms
+        self.write_ms = write_ms
+        self.num_bytes = num_bytes
+
+    def to_dict(self):
+        return {
+            "format": str(self.encoding),
+            "encode_ms": round(self.encode_ms, 3),
+            "write_ms": round(self.write_ms, 3),
+            "bytes": self.num_bytes,
+        }
+
+
+def encode_image(image, encoding):
+    """将BGR图像编码为字节串，返回 (数据, 编码耗时ms)"""
+    start = time.perf_counter()
+    if encoding.format == "raw":
+        data = npy_bytes(image)
+    else:
+        ok, buffer = cv2.imencode(encoding.extension, image, encoding.imencode_params())
+        if not ok:
+            raise RuntimeError(f"图像编码失败: {encoding}")
+        data = buffer.tobytes()
+    return data, (time.perf_counter() - start) * 1000
+
+
+def npy_bytes(array):
+    """生成带头信息的.npy字节串，可直接用np.load读取"""
+    array = np.ascontiguousarray(array)
+    header = np.lib.format.header_data_from_array_1_0(array)
+    buffer = io.BytesIO()
+    np.lib.format.write_array_header_1_0(buffer, header)
+    return buffer.getvalue() + array.tobytes()
+
+
+def write_image(image, base_path, encoding):
+    """按配置编码并写入 base_path + 扩展名，返回 EncodeResult"""
+    data, encode_ms = encode_image(image, encoding)
+    path = base_path + encoding.extension
+
+    start = time.perf_counter()
+    with open(path, 'wb') as f:
+        f.write(data)
+    write_ms = (time.perf_counter() - start) * 1000
+
+    return EncodeResult(path, encoding, encode_ms, write_ms, len(data))
+
+
+def read_image(path, flags=cv2.IMREAD_UNCHANGED):
+    """读取任意支持格式保存的图像，返回BGR数组"""
+    if path.endswith(".npy"):
+        return np.load(path)
+    return cv2.imread(path, flags)
+
+
+def decode_image(data, name, flags=cv2.IMREAD_UNCHANGED):
+    """解码内存中的图像数据，name 用于按扩展名区分原始数组"""
+    if name.endswith(".npy"):
+        return np.load(io.BytesIO(data))
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+
+
+class EncodingStats:
+    """按数据流累计编码开销，用于写入会话信息"""
+
+    def __init__(self):
+        self.streams = {}
+
+    def add(self, stream, result):
+        entry = self.streams.setdefault(stream, {"format": str(result.encoding), "count": 0,
+                                                 "encode_ms": 0.0, "write_ms": 0.0, "bytes": 0})
+        entry["format"] = str(result.encoding)
+        entry["count"] += 1
+        entry["encode_ms"] += result.encode_ms
+        entry["write_ms"] += result.write_ms
+        entry["bytes"] += result.num_bytes
+
+    def summary(self):
+        summary = {}
+        for stream, entry in self.streams.items():
+            count = max(entry["count"], 1)
+            summary[stream] = {
+                "format": entry["format"],
+                "count": entry["count"],
+                "avg_encode_ms": round(entry["encode_ms"] / count, 3),
+                "avg_write_ms": round(entry["write_ms"] / count, 3),
+                "avg_bytes": int(entry["bytes"] / count),
+                "total_bytes": entry["bytes"],
+            }
+        return summary
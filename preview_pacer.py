@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预览节拍模块 - 预览刷新与采集帧率解耦
+采集线程每帧都保留全分辨率数据供拍摄使用，预览只按节拍抽帧；
+节拍根据界面线程的实测渲染耗时自适应降低，并跳过内容未变化的帧
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+
+class PreviewPacer:
+    """预览节拍器
+
+    max_fps: 预览帧率上限；ui_budget: 预览渲染最多占用界面线程时间的比例，
+    渲染越慢预览间隔越长（不低于 min_fps）。上一帧尚未在界面线程渲染完成时直接丢弃新帧，
+    不会在Tk事件队列中堆积。
+    """
+
+    def __init__(self, max_fps=30, min_fps=2, ui_budget=0.5, smoothing=0.2, sample_size=64):
+        self.min_fps = min_fps
+        self.ui_budget = ui_budget
+        self.smoothing = smoothing
+        self.sample_size = sample_size
+        self.max_fps = max_fps
+        self.render_ms = None
+        self.interval = 1.0 / max_fps
+        self.pending = False
+        self._next_due = 0.0
+        self._last_sample = None
+        self._window_start = time.perf_counter()
+        self._window_rendered = 0
+        self.measured_fps = None
+        self.stats = {"rendered": 0, "skipped_rate": 0, "skipped_busy": 0, "skipped_unchanged": 0}
+
+    def set_max_fps(self, max_fps):
+        self.max_fps = max_fps
+        self._update_interval()
+
+    def should_render(self, now=None):
+        """采集线程每帧调用，判断这一帧是否需要预览"""
+        now = time.perf_counter() if now is None else now
+        if self.pending:
+            self.stats["skipped_busy"] += 1
+            return False
+        if now < self._next_due:
+            self.stats["skipped_rate"] += 1
+            return False
+        return True
+
+    def frame_changed(self, frame):
+        """对稀疏采样的像素做精确比较，内容未变化（如暂停的回放、重复帧）时返回False"""
+        height, width = frame.shape[:2]
+        step = max(1, min(height, width) // self.sample_size)
+        sample = np.ascontiguousarray(frame[::step, ::step])
+        if self._last_sample is not None and np.array_equal(sample, self._last_sample):
+            self.stats["skipped_unchanged"] += 1
+            return False
+        self._last_sample = sample
+        return True
+
+    def begin_render(self, now=None):
+        """确定预览这一帧，直到 finish_render 之前不再接受新帧"""
+        now = time.perf_counter() if now is None else now
+        self.pending = True
+        self._next_due = now + self.interval
+
+    def finish_render(self, render_ms):
+        """界面线程渲染完成后调用，更新渲染耗时和预览间隔"""
+        if self.render_ms is None:
+            self.render_ms = render_ms
+        else:
+            self.render_ms += self.smoothing * (render_ms - self.render_ms)
+        self._update_interval()
+
+        self.stats["rendered"] += 1
+        self._window_rendered += 1
+        now = time.perf_counter()
+        if now - self._window_start >= 1.0:
+            self.measured_fps = self._window_rendered / (now - self._window_start)
+            self._window_start = now
+            self._window_rendered = 0
+        self.pending = False
+
+    def _update_interval(self):
+        interval = 1.0 / self.max_fps
+        if self.render_ms is not None:
+            interval = max(interval, self.render_ms / 1000.0 / self.ui_budget)
+        self.interval = min(interval, 1.0 / self.min_fps)
+
+    @property
+    def target_fps(self):
+        return 1.0 / self.interval
+
+    def reset(self):
+        self.pending = False
+        self._next_due = 0.0
+        self._last_sample = None
+
+    def summary(self):
+        summary = dict(self.stats)
+        summary.update({
+            "max_fps": self.max_fps,
+            "target_fps": round(self.target_fps, 2),
+            "measured_fps": round(self.measured_fps, 2) if self.measured_fps is not None else None,
+            "avg_render_ms": round(self.render_ms, 3) if self.render_ms is not None else None,
+        })
+        return summary
+
+
+def fit_size(frame_shape, box_width, box_height):
+    """保持宽高比缩放到不超过显示区域的尺寸 (宽, 高)"""
+    height, width = frame_shape[:2]
+    scale = min(box_width / width, box_height / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def resize_for_preview(frame, size):
+    """缩小使用区域插值，放大使用线性插值"""
+    if (frame.shape[1], frame.shape[0]) == size:
+        return frame
+    interpolation = cv2.INTER_AREA if size[0] < frame.shape[1] else cv2.INTER_LINEAR
+    return cv2.resize(frame, size, interpolation=interpolation)
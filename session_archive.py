@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话归档模块 - 把已结束的旧会话压缩为每个会话一份带索引的归档
+归档位于会话目录内，由三部分组成: depth.blob（zlib压缩的深度数组）、images.pack（图像、录制流等
+其余文件原样打包）和 archive_index.json（元数据表及每个文件的偏移、大小和SHA-256）；
+session_info.json 保留为独立文件。写入后重新读取校验，全部一致才删除原文件；
+归档任务在低优先级进程中运行并限制I/O速率，session_reader 和会话回放可直接读取归档
+"""
+
+import io
+import os
+import json
+import glob
+import time
+import zlib
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+
+from image_codec import decode_image
+from session_journal import atomic_write_json, SESSION_INFO_FILE
+from session_sync import file_sha256
+
+
+ARCHIVE_INDEX_FILE = "archive_index.json"
+DEPTH_BLOB_FILE = "depth.blob"
+IMAGE_PACK_FILE = "images.pack"
+PARTIAL_SUFFIX = ".partial"
+ARCHIVE_VERSION = 1
+COPY_CHUNK = 1 << 20
+
+# 不打包的文件: 会话信息保持独立，同步清单由同步任务重新生成
+LOOSE_FILES = {SESSION_INFO_FILE, "sync_manifest.json", ARCHIVE_INDEX_FILE, DEPTH_BLOB_FILE, IMAGE_PACK_FILE}
+
+
+def is_archived(session_path):
+    return os.path.exists(os.path.join(session_path, ARCHIVE_INDEX_FILE))
+
+
+class IOThrottle:
+    """令牌桶限速: 每读写 n 字节调用一次 consume(n)，超出速率时休眠"""
+
+    def __init__(self, bytes_per_second=None):
+        self.rate = bytes_per_second
+        self.allowance = 0.0
+        self.last = time.monotonic()
+        self.slept = 0.0
+
+    def consume(self, size):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        # 最多积累1秒的额度，空闲之后不会突发大量I/O
+        self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate) - size
+        self.last = now
+        if self.allowance < 0:
+            delay = -self.allowance / self.rate
+            time.sleep(delay)
+            self.slept += delay
+
+
+class SessionArchive:
+    """只读打开一个已归档的会话，可在多个线程中使用"""
+
+    def __init__(self, session_path, index_file=ARCHIVE_INDEX_FILE, suffix=""):
+        self.session_path = session_path
+        with open(os.path.join(session_path, index_file), 'r', encoding='utf-8') as f:
+            self.index = json.load(f)
+        self.files = self.index["files"]
+        self.captures = self.index["captures"]
+        self._paths = {"depth": os.path.join(session_path, DEPTH_BLOB_FILE + suffix),
+                       "images": os.path.join(session_path, IMAGE_PACK_FILE + suffix)}
+        self._handles = {}
+        self._lock = threading.Lock()
+
+    def has(self, relative):
+        return relative.replace(os.sep, "/") in self.files
+
+    def entry(self, relative):
+        return self.files[relative.replace(os.sep, "/")]
+
+    def read_bytes(self, relative):
+        """读取归档中一个文件的原始内容"""
+        entry = self.entry(relative)
+        with self._lock:
+            handle = self._handles.get(entry["pack"])
+            if handle is None:
+                handle = self._handles[entry["pack"]] = open(self._paths[entry["pack"]], 'rb')
+            handle.seek(entry["offset"])
+            data = handle.read(entry["length"])
+        return zlib.decompress(data) if entry["codec"] == "zlib" else data
+
+    def read_json(self, relative):
+        return json.loads(self.read_bytes(relative).decode('utf-8'))
+
+    def load_array(self, relative):
+        return np.load(io.BytesIO(self.read_bytes(relative)))
+
+    def read_image(self, relative, flags=cv2.IMREAD_UNCHANGED):
+        return decode_image(self.read_bytes(relative), relative, flags)
+
+    def memmap(self, relative, dtype, shape):
+        """未压缩存储的文件（如录制流）直接按偏移内存映射"""
+        entry = self.entry(relative)
+        if entry["codec"] != "raw":
+            raise ValueError(f"压缩存储的文件不能内存映射: {relative}")
+        return np.memmap(self._paths[entry["pack"]], dtype=dtype, mode='r', offset=entry["offset"], shape=shape)
+
+    def close(self):
+        with self._lock:
+            for handle in self._handles.values():
+                handle.close()
+            self._handles = {}
+
+
+_open_archives = {}
+_open_archives_lock = threading.Lock()
+
+
+def open_archive(session_path):
+    """按会话路径复用已打开的归档（每个进程一份）"""
+    key = os.path.abspath(session_path)
+    with _open_archives_lock:
+        archive = _open_archives.get(key)
+        if archive is None:
+            archive = _open_archives[key] = SessionArchive(session_path)
+        return archive
+
+
+def list_loose_files(session_path):
+    """会话中需要打包的文件（相对路径，统一使用 / 分隔）"""
+    files = []
+    for root, _, names in os.walk(session_path):
+        for name in names:
+            relative = os.path.relpath(os.path.join(root, name), session_path).replace(os.sep, "/")
+            if relative in LOOSE_FILES or name.endswith((".tmp", PARTIAL_SUFFIX)):
+                continue
+            files.append(relative)
+    return sorted(files)
+
+
+def read_session_info(session_path):
+    try:
+        with open(os.path.join(session_path, SESSION_INFO_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def session_age_days(session_info):
+    try:
+        end_time = datetime.strptime(session_info["end_time"], "%Y-%m-%d %H:%M:%S")
+    except (KeyError, TypeError, ValueError):
+        return None
+    return (datetime.now() - end_time) / timedelta(days=1)
+
+
+class SessionCompactor:
+    """归档任务
+
+    min_age_days: 只归档结束时间早于该天数的已完成会话；
+    throttle_mb: 读写总速率上限（MB/s），None 表示不限速；
+    dry_run: 只列出将要归档的会话。
+    """
+
+    def __init__(self, sessions_path, min_age_days=30, throttle_mb=20.0, depth_level=6,
+                 dry_run=False, log=print):
+        self.sessions_path = sessions_path
+        self.min_age_days = min_age_days
+        self.throttle = IOThrottle(throttle_mb * 1e6 if throttle_mb else None)
+        self.depth_level = depth_level
+        self.dry_run = dry_run
+        self.log = log
+        self.stats = {"sessions_scanned": 0, "sessions_archived": 0, "sessions_resumed": 0,
+                      "sessions_failed": 0, "files_archived": 0,
+                      "original_bytes": 0, "archive_bytes": 0}
+
+    def candidates(self):
+        """符合条件的会话，以及中断在删除阶段、仍有散落文件的已归档会话"""
+        sessions = []
+        if not os.path.isdir(self.sessions_path):
+            return sessions
+        for entry in sorted(os.scandir(self.sessions_path), key=lambda e: e.name):
+            if not entry.is_dir() or not entry.name.startswith("session_"):
+                continue
+            self.stats["sessions_scanned"] += 1
+            if is_archived(entry.path):
+                archive = SessionArchive(entry.path)
+                archived_files = set(archive.files) | {metadata["archive_metadata_file"] for metadata in archive.captures}
+                if archived_files.intersection(list_loose_files(entry.path)):
+                    sessions.append(entry.path)
+                continue
+            session_info = read_session_info(entry.path)
+            if not session_info or not session_info.get("session_completed"):
+                continue
+            age = session_age_days(session_info)
+            if age is not None and age >= self.min_age_days:
+                sessions.append(entry.path)
+        return sessions
+
+    def run(self):
+        start = time.perf_counter()
+        for session_path in self.candidates():
+            name = os.path.basename(session_path)
+            if self.dry_run:
+                self.log(f"将归档: {name}")
+                continue
+            try:
+                if is_archived(session_path):
+                    self.log(f"继续清理已归档会话: {name}")
+                    self.remove_archived_files(session_path, SessionArchive(session_path))
+                    self.stats["sessions_resumed"] += 1
+                else:
+                    self.compact_session(session_path)
+            except (OSError, ValueError, zlib.error) as e:
+                self.stats["sessions_failed"] += 1
+                self.log(f"归档失败 {name}: {e}")
+                self.discard_partial(session_path)
+
+        self.stats["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+        self.stats["throttle_sleep_seconds"] = round(self.throttle.slept, 3)
+        self.stats["compression_ratio"] = (round(self.stats["archive_bytes"] / self.stats["original_bytes"], 4)
+                                           if self.stats["original_bytes"] else None)
+        return self.stats
+
+    def compact_session(self, session_path):
+        name = os.path.basename(session_path)
+        files = list_loose_files(session_path)
+        metadata_files = [relative for relative in files if relative.startswith("metadata/")
+                          and relative.endswith(".json")]
+        packed_files = [relative for relative in files if relative not in metadata_files]
+
+        captures = []
+        for relative in metadata_files:
+            data = self.read_file(os.path.join(session_path, relative))
+            metadata = json.loads(data.decode('utf-8'))
+            metadata["archive_metadata_file"] = relative
+            captures.append(metadata)
+        captures.sort(key=lambda metadata: (metadata.get("capture_index") or 0, metadata.get("capture_id", "")))
+
+        entries = {}
+        original_bytes = sum(os.path.getsize(os.path.join(session_path, relative)) for relative in files)
+        with open(os.path.join(session_path, DEPTH_BLOB_FILE + PARTIAL_SUFFIX), 'wb') as depth_blob, \
+                open(os.path.join(session_path, IMAGE_PACK_FILE + PARTIAL_SUFFIX), 'wb') as image_pack:
+            for relative in packed_files:
+                path = os.path.join(session_path, relative)
+                if relative.startswith("depth/") and relative.endswith(".npy"):
+                    data = self.read_file(path)
+                    compressed = zlib.compress(data, self.depth_level)
+                    entries[relative] = {"pack": "depth", "offset": depth_blob.tell(), "length": len(compressed),
+                                         "size": len(data), "codec": "zlib",
+                                         "sha256": hashlib.sha256(data).hexdigest()}
+                    depth_blob.write(compressed)
+                    self.throttle.consume(len(compressed))
+                else:
+                    # 图像已是压缩格式，录制流需要按偏移内存映射，都原样存储
+                    entries[relative] = self.copy_into_pack(path, image_pack)
+            for handle in (depth_blob, image_pack):
+                handle.flush()
+                os.fsync(handle.fileno())
+
+        session_info = read_session_info(session_path) or {}
+        index = {
+            "version": ARCHIVE_VERSION,
+            "session_name": name,
+            "archived_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "session_info": session_info,
+            "captures": captures,
+            "files": entries,
+        }
+        atomic_write_json(os.path.join(session_path, ARCHIVE_INDEX_FILE + PARTIAL_SUFFIX), index)
+
+        # 从磁盘重新读取归档校验，全部一致才提交
+        self.verify(session_path, files)
+        for filename in (DEPTH_BLOB_FILE, IMAGE_PACK_FILE, ARCHIVE_INDEX_FILE):
+            os.replace(os.path.join(session_path, filename + PARTIAL_SUFFIX), os.path.join(session_path, filename))
+
+        archive = SessionArchive(session_path)
+        self.remove_archived_files(session_path, archive)
+        archive.close()
+
+        archive_bytes = sum(os.path.getsize(os.path.join(session_path, filename))
+                            for filename in (DEPTH_BLOB_FILE, IMAGE_PACK_FILE, ARCHIVE_INDEX_FILE))
+        session_info["archive"] = {
+            "archived_at": index["archived_at"],
+            "files": len(files),
+            "original_bytes": original_bytes,
+            "archive_bytes": archive_bytes,
+        }
+        atomic_write_json(os.path.join(session_path, SESSION_INFO_FILE), session_info)
+
+        self.stats["sessions_archived"] += 1
+        self.stats["files_archived"] += len(files)
+        self.stats["original_bytes"] += original_bytes
+        self.stats["archive_bytes"] += archive_bytes
+        self.log(f"已归档 {name}: {len(files)} 个文件，{original_bytes / 1e6:.1f} MB → {archive_bytes / 1e6:.1f} MB")
+
+    def read_file(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.throttle.consume(len(data))
+        return data
+
+    def copy_into_pack(self, path, pack):
+        digest = hashlib.sha256()
+        offset = pack.tell()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(COPY_CHUNK)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                pack.write(chunk)
+                # 读和写各计一次
+                self.throttle.consume(2 * len(chunk))
+        size = pack.tell() - offset
+        return {"pack": "images", "offset": offset, "length": size, "size": size, "codec": "raw",
+                "sha256": digest.hexdigest()}
+
+    def verify(self, session_path, files):
+        """打开未提交的归档，逐个文件比对解码后的SHA-256，元数据表与原JSON逐条比对"""
+        archive = SessionArchive(session_path, ARCHIVE_INDEX_FILE + PARTIAL_SUFFIX, PARTIAL_SUFFIX)
+        try:
+            for relative, entry in archive.files.items():
+                data = archive.read_bytes(relative)
+                self.throttle.consume(entry["length"])
+                if len(data) != entry["size"] or hashlib.sha256(data).hexdigest() != entry["sha256"]:
+                    raise ValueError(f"归档校验失败: {relative}")
+
+            archived_metadata = {metadata["archive_metadata_file"]: metadata for metadata in archive.captures}
+            for relative in files:
+                if relative.startswith("metadata/") and relative.endswith(".json"):
+                    with open(os.path.join(session_path, relative), 'r', encoding='utf-8') as f:
+                        original = json.load(f)
+                    restored = dict(archived_metadata.get(relative) or {})
+                    restored.pop("archive_metadata_file", None)
+                    if restored != original:
+                        raise ValueError(f"元数据表校验失败: {relative}")
+                elif relative not in archive.files:
+                    raise ValueError(f"归档缺少文件: {relative}")
+        finally:
+            archive.close()
+
+    def remove_archived_files(self, session_path, archive):
+        """删除已归档的原文件；删除前确认内容与归档记录一致，不一致的文件保留"""
+        archived_metadata = {metadata["archive_metadata_file"] for metadata in archive.captures}
+        for relative in list_loose_files(session_path):
+            path = os.path.join(session_path, relative)
+            if relative in archive.files:
+                self.throttle.consume(os.path.getsize(path))
+                if file_sha256(path) != archive.files[relative]["sha256"]:
+                    self.log(f"文件与归档不一致，已保留: {relative}")
+                    continue
+            elif relative not in archived_metadata:
+                continue
+            os.remove(path)
+
+        # 清理空的子文件夹
+        for root, dirs, _ in os.walk(session_path, topdown=False):
+            for name in dirs:
+                try:
+                    os.rmdir(os.path.join(root, name))
+                except OSError:
+                    pass
+
+    def discard_partial(self, session_path):
+        for path in glob.glob(os.path.join(session_path, "*" + PARTIAL_SUFFIX)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def lower_process_priority():
+    """降低当前进程的CPU优先级（POSIX下 nice 19），返回是否成功"""
+    if not hasattr(os, "nice"):
+        return False
+    try:
+        os.nice(19)
+        return True
+    except OSError:
+        return False
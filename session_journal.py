@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话日志模块 - 崩溃安全的追加式会话日志
+每次拍摄追加一行JSON，批量fsync；汇总文件通过临时文件+原子重命名写入；
+启动时快速扫描并修复未正常结束的会话，无需读取任何图像；
+正在写入的会话目录中有锁文件记录写入进程，修复时跳过写入进程仍存活的会话
+"""
+
+import os
+import json
+import time
+import socket
+from datetime import datetime
+
+
+JOURNAL_FILE = "journal.jsonl"
+SESSION_INFO_FILE = "session_info.json"
+LOCK_FILE = "session.lock"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 无法确认写入进程时（没有锁文件的旧会话、其它主机写入的会话），日志在该秒数内有更新即视为仍在写入
+ACTIVE_GRACE_SECONDS = 120
+
+
+def pid_alive(pid):
+    """本机进程是否存在"""
+    if pid <= 0:
+        return False
+    if os.name == 'nt':
+        # Windows 的 os.kill 会结束进程，改为查询进程退出码
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))) and exit_code.value == 259
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def atomic_write_json(path, data):
+    """先写临时文件并fsync，再原子重命名覆盖目标文件"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+    # POSIX下同步目录项，保证重命名本身落盘
+    if hasattr(os, 'O_DIRECTORY'):
+        try:
+            dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except OSError:
+            pass
+
+
+class SessionJournal:
+    """追加式会话日志
+
+    每条记录为一行JSON。写入后立即flush到操作系统，
+    每 fsync_every 条或每 fsync_interval 秒fsync一次，在持久性和拍摄开销之间折中。
+    """
+
+    def __init__(self, session_path, fsync_every=8, fsync_interval=2.0):
+        self.path = os.path.join(session_path, JOURNAL_FILE)
+        self.lock_path = os.path.join(session_path, LOCK_FILE)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        # 锁文件记录写入进程，会话结束时删除；其它进程修复会话时据此跳过正在写入的会话
+        atomic_write_json(self.lock_path, {"pid": os.getpid(), "host": socket.gethostname(),
+                                           "time": datetime.now().strftime(TIME_FORMAT)})
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, record_type, **fields):
+        """追加一条记录"""
+        record = {"type": record_type, "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]}
+        record.update(fields)
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+
+        if (self._unsynced >= self.fsync_every or
+                time.monotonic() - self._last_sync >= self.fsync_interval):
+            self.sync()
+
+    def sync(self):
+        if self._file and self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._file:
+            self.sync()
+            self._file.close()
+            self._file = None
+            try:
+                os.remove(self.lock_path)
+            except OSError:
+                pass
+
+
+def session_owner_active(session_path, grace_seconds=ACTIVE_GRACE_SECONDS):
+    """会话是否仍有进程在写入
+
+    锁文件属于本机时按进程是否存活判断；属于其它主机或没有锁文件时，
+    看日志（或会话信息）是否在 grace_seconds 内有更新。
+    """
+    try:
+        with open(os.path.join(session_path, LOCK_FILE), 'r', encoding='utf-8') as f:
+            lock = json.load(f)
+    except (OSError, ValueError):
+        lock = None
+    if lock and lock.get("host") == socket.gethostname():
+        return pid_alive(int(lock.get("pid") or 0))
+
+    latest = 0.0
+    for name in (JOURNAL_FILE, SESSION_INFO_FILE, LOCK_FILE):
+        try:
+            latest = max(latest, os.path.getmtime(os.path.join(session_path, name)))
+        except OSError:
+            pass
+    return time.time() - latest < grace_seconds
+
+
+def read_journal(session_path):
+    """读取会话日志，忽略崩溃时写了一半的末行"""
+    path = os.path.join(session_path, JOURNAL_FILE)
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+    return records
+
+
+def recover_session(session_path):
+    """修复一个未正常结束的会话，返回更新后的会话信息；会话已完成或仍在写入时返回None"""
+    info_path = os.path.join(session_path, SESSION_INFO_FILE)
+    try:
+        with open(info_path, 'r', encoding='utf-8') as f:
+            session_info = json.load(f)
+    except (OSError, ValueError):
+        session_info = {"session_name": os.path.basename(session_path)}
+
+    if session_info.get("session_completed"):
+        return None
+    if session_owner_active(session_path):
+        # 另一个界面实例或命令行采集仍在写入该会话
+        return None
+
+    records = read_journal(session_path)
+    captures = [record for record in records if record.get("type") == "capture"]
+
+    if records:
+        source = "journal"
+        total_captures = len(captures)
+        end_time = records[-1]["time"][:19]
+    else:
+        # 没有日志的旧会话: 只统计metadata目录项，不读取图像
+        source = "metadata_scan"
+        metadata_dir = os.path.join(session_path, "metadata")
+        latest_mtime = os.path.getmtime(info_path) if os.path.exists(info_path) else os.path.getmtime(session_path)
+        total_captures = 0
+        if os.path.exists(metadata_dir):
+            for entry in os.scandir(metadata_dir):
+                if entry.name.endswith(".json"):
+                    total_captures += 1
+                    latest_mtime = max(latest_mtime, entry.stat().st_mtime)
+        end_time = datetime.fromtimestamp(latest_mtime).strftime(TIME_FORMAT)
+
+    session_info.update({
+        "end_time": end_time,
+        "total_captures": total_captures,
+        "session_completed": True,
+        "recovered": True,
+        "recovery_source": source,
+    })
+    try:
+        start = datetime.strptime(session_info["start_time"], TIME_FORMAT)
+        session_info["duration_seconds"] = max(0, int((datetime.strptime(end_time, TIME_FORMAT) - start).total_seconds()))
+    except (KeyError, ValueError):
+        pass
+
+    atomic_write_json(info_path, session_info)
+    try:
+        os.remove(os.path.join(session_path, LOCK_FILE))
+    except OSError:
+        pass
+    return session_info
+
+
+def recover_sessions(sessions_path, exclude=None):
+    """扫描所有会话，修复未正常结束的会话，返回修复结果列表"""
+    recovered = []
+    if not os.path.exists(sessions_path):
+        return recovered
+    for entry in os.scandir(sessions_path):
+        if not entry.is_dir() or (exclude and os.path.abspath(entry.path) == os.path.abspath(exclude)):
+            continue
+        try:
+            session_info = recover_session(entry.path)
+        except OSError as e:
+            print(f"修复会话失败 {entry.name}: {e}")
+            continue
+        if session_info is not None:
+            recovered.append(session_info)
+    return recovered
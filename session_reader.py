@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话数据读取模块 - 按拍摄对齐读取 (rgb, depth, metadata) 样本
+以metadata为准定位同一次拍摄的RGB和深度文件，不再按文件名匹配capture_id；
+支持线程/进程池预取解码、深度数组内存映射、按元数据筛选和确定性分片。
+不依赖界面（tkinter/pygame）和相机，可直接用于训练或离线处理:
+
+    from session_reader import SessionReader, quality_filter
+    with SessionReader("deepdata/sessions", where=quality_filter(min_valid_ratio=0.8)) as reader:
+        for rgb, depth, metadata in reader:
+            ...
+"""
+
+import os
+import json
+import glob
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+from image_codec import read_image
+from depth_vis import DEFAULT_COLORMAP, DepthVisCache, render_depth_vis
+from depth_process import DEFAULT_LAYER, processed_depth_path
+from session_archive import is_archived, open_archive
+
+
+def list_sessions(path):
+    """path 为单个会话、sessions文件夹或deepdata文件夹，返回按名称排序的会话路径"""
+    if os.path.exists(os.path.join(path, "metadata")) or os.path.exists(os.path.join(path, "rgb")) or \
+            is_archived(path):
+        return [path]
+    sessions_path = os.path.join(path, "sessions") if os.path.isdir(os.path.join(path, "sessions")) else path
+    return sorted(entry.path for entry in os.scandir(sessions_path)
+                  if entry.is_dir() and entry.name.startswith("session_"))
+
+
+def load_session_records(session_path):
+    """读取会话中每次拍摄的元数据，按拍摄序号排序，并附加文件的绝对路径
+
+    已归档的会话从归档的元数据表读取，metadata["archive"] 为会话路径，路径相对于会话目录照常给出。
+    """
+    archived = is_archived(session_path)
+    if archived:
+        all_metadata = [dict(metadata) for metadata in open_archive(session_path).captures]
+    else:
+        all_metadata = []
+        for metadata_path in glob.glob(os.path.join(session_path, "metadata", "metadata_*.json")):
+            try:
+                with open(metadata_path, 'r', encoding='utf-8') as f:
+                    all_metadata.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+    records = []
+    for metadata in all_metadata:
+        relative_paths = metadata.get("relative_paths") or {}
+        rgb = relative_paths.get("rgb") or (os.path.join("rgb", metadata["rgb_file"])
+                                            if metadata.get("rgb_file") else None)
+        depth = relative_paths.get("depth") or (os.path.join("depth", metadata["depth_file"])
+                                                if metadata.get("depth_file") else None)
+        metadata.setdefault("session_name", os.path.basename(session_path))
+        if archived:
+            metadata["archive"] = session_path
+        metadata["paths"] = {
+            "rgb": os.path.join(session_path, rgb) if rgb else None,
+            "depth": os.path.join(session_path, depth) if depth else None,
+        }
+        # 附加图层（如多帧融合的 depth_std）
+        for name, relative in relative_paths.items():
+            if name not in metadata["paths"] and relative:
+                metadata["paths"][name] = os.path.join(session_path, relative)
+        records.append(metadata)
+
+    records.sort(key=lambda metadata: (metadata.get("capture_index") or 0, metadata.get("capture_id", "")))
+    return records
+
+
+def load_sample(metadata, load_rgb=True, load_depth=True, mmap_depth=False):
+    """读取一次拍摄的 (rgb, depth, metadata)，缺失的文件返回None
+
+    定义在模块级以便进程池序列化调用。已归档会话的深度需要解压，mmap_depth 不起作用。
+    """
+    paths = metadata["paths"]
+    if metadata.get("archive"):
+        archive = open_archive(metadata["archive"])
+        rgb_relative = os.path.relpath(paths["rgb"], metadata["archive"]) if paths["rgb"] else None
+        depth_relative = os.path.relpath(paths["depth"], metadata["archive"]) if paths["depth"] else None
+        rgb = archive.read_image(rgb_relative) if load_rgb and rgb_relative and archive.has(rgb_relative) else None
+        depth = (archive.load_array(depth_relative)
+                 if load_depth and depth_relative and archive.has(depth_relative) else None)
+        return rgb, depth, metadata
+
+    rgb = None
+    if load_rgb and paths["rgb"] and os.path.exists(paths["rgb"]):
+        rgb = read_image(paths["rgb"])
+    depth = None
+    if load_depth and paths["depth"] and os.path.exists(paths["depth"]):
+        depth = np.load(paths["depth"], mmap_mode='r' if mmap_depth else None)
+    return rgb, depth, metadata
+
+
+def quality_filter(min_valid_ratio=0.0, max_center_hole=1.0, max_saturated=1.0):
+    """按元数据中的深度质量统计筛选（与 depth_stats.filter_captures 的条件相同）"""
+    def accept(metadata):
+        stats = metadata.get("depth_stats")
+        if not stats:
+            return False
+        return (stats["valid_ratio"] >= min_valid_ratio and
+                stats["center_hole_fraction"] <= max_center_hole and
+                stats["saturated_fraction"] <= max_saturated)
+    return accept
+
+
+class SessionReader:
+    """会话数据读取器
+
+    path: 单个会话、sessions文件夹或deepdata文件夹（也可以是路径列表）；
+    where: 以metadata为参数的筛选函数；
+    shard_index/num_shards: 确定性分片，多个读取进程各取互不重叠的一份；
+    shuffle_seed: 指定时以固定种子打乱顺序（在分片之前，所有分片看到同一个排列）；
+    prefetch: 预取的样本数，workers: 解码线程/进程数，use_processes: 使用进程池解码
+    （解码为CPU密集时可绕开GIL；此时内存映射的深度会被复制回传，mmap_depth 不再节省内存）。
+    """
+
+    def __init__(self, path, where=None, load_rgb=True, load_depth=True, mmap_depth=False,
+                 shard_index=0, num_shards=1, shuffle_seed=None,
+                 prefetch=8, workers=2, use_processes=False):
+        if not 0 <= shard_index < num_shards:
+            raise ValueError(f"分片编号超出范围: {shard_index}/{num_shards}")
+
+        paths = [path] if isinstance(path, (str, os.PathLike)) else list(path)
+        records = []
+        for item in paths:
+            for session_path in list_sessions(item):
+                records.extend(load_session_records(session_path))
+
+        if where is not None:
+            records = [metadata for metadata in records if where(metadata)]
+        if shuffle_seed is not None:
+            order = np.random.default_rng(shuffle_seed).permutation(len(records))
+            records = [records[i] for i in order]
+
+        self.records = records[shard_index::num_shards]
+        self.load_rgb = load_rgb
+        self.load_depth = load_depth
+        self.mmap_depth = mmap_depth
+        self.prefetch = max(1, prefetch)
+        self.workers = max(1, workers)
+        self.use_processes = use_processes
+        self._executor = None
+        self._depth_vis_caches = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return load_sample(self.records[index], self.load_rgb, self.load_depth, self.mmap_depth)
+
+    def depth_vis(self, index, colormap=DEFAULT_COLORMAP, value_range=None):
+        """第 index 个样本的深度可视化（BGR），会话中没有时按需生成并缓存"""
+        metadata = self.records[index]
+        if metadata.get("archive"):
+            # 归档会话只读，直接着色不缓存
+            depth = load_sample(metadata, load_rgb=False)[1]
+            return render_depth_vis(depth, colormap, value_range) if depth is not None else None
+        session_path = os.path.dirname(os.path.dirname(metadata["paths"]["rgb"] or metadata["paths"]["depth"]))
+        key = (session_path, colormap, tuple(value_range) if value_range is not None else None)
+        cache = self._depth_vis_caches.get(key)
+        if cache is None:
+            cache = self._depth_vis_caches[key] = DepthVisCache(session_path, colormap, value_range)
+        return cache.load(metadata.get("capture_id"), metadata["paths"]["depth"])
+
+    def processed_depth(self, index, layer=DEFAULT_LAYER, mmap=False):
+        """第 index 个样本在深度后处理派生层（depth-process 子命令生成）中的深度，未处理时返回None"""
+        metadata = self.records[index]
+        if metadata.get("archive") or not metadata["paths"]["depth"]:
+            return None
+        session_path = os.path.dirname(os.path.dirname(metadata["paths"]["depth"]))
+        path = processed_depth_path(session_path, metadata.get("capture_id"), layer)
+        return np.load(path, mmap_mode='r' if mmap else None) if os.path.exists(path) else None
+
+    @property
+    def capture_ids(self):
+        return [metadata.get("capture_id") for metadata in self.records]
+
+    def _get_executor(self):
+        if self._executor is None:
+            executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._executor = executor_class(max_workers=self.workers)
+        return self._executor
+
+    def __iter__(self):
+        """按顺序产出样本，后台保持 prefetch 个样本正在解码"""
+        executor = self._get_executor()
+        pending = deque()
+        next_index = 0
+        try:
+            while pending or next_index < len(self.records):
+                while next_index < len(self.records) and len(pending) < self.prefetch:
+                    pending.append(executor.submit(load_sample, self.records[next_index],
+                                                   self.load_rgb, self.load_depth, self.mmap_depth))
+                    next_index += 1
+                yield pending.popleft().result()
+        finally:
+            # 提前结束迭代时取消尚未开始的预取
+            for future in pending:
+                future.cancel()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话存储模块 - 会话目录、会话信息和拍摄保存
+不依赖界面（tkinter/pygame），图形界面和命令行入口共用同一套会话布局
+"""
+
+import os
+import json
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from image_codec import EncodingConfig, EncodingStats, write_image
+from storage_governor import StorageGovernor, StorageDecision
+from session_journal import SessionJournal, atomic_write_json
+from depth_stats import compute_depth_stats
+
+
+SESSION_SUBFOLDERS = ['rgb', 'depth', 'depth_vis', 'metadata']
+
+
+class StorageFullError(Exception):
+    """剩余空间不足，存储调节器要求停止保存"""
+
+
+def default_deepdata_path():
+    """deepdata文件夹位于程序所在目录"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "deepdata")
+
+
+def ensure_deepdata_folders(deepdata_path):
+    """创建deepdata主文件夹及 sessions/exports/temp 子文件夹，返回新建的路径"""
+    created = []
+    for folder in [deepdata_path] + [os.path.join(deepdata_path, name) for name in ('sessions', 'exports', 'temp')]:
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+            created.append(folder)
+    return created
+
+
+def colorize_depth(depth):
+    """深度图着色: 8位模拟深度直接着色，16位深度按0.03缩放后着色"""
+    if depth.dtype == np.uint8:
+        return cv2.applyColorMap(depth, cv2.COLORMAP_JET)
+    return cv2.applyColorMap(cv2.convertScaleAbs(depth, alpha=0.03), cv2.COLORMAP_JET)
+
+
+class CaptureResult:
+    """一次拍摄保存的结果"""
+
+    def __init__(self, capture_id, metadata, decision, save_ms, total_bytes):
+        self.capture_id = capture_id
+        self.metadata = metadata
+        self.decision = decision
+        self.save_ms = save_ms
+        self.total_bytes = total_bytes
+
+
+class CaptureSession:
+    """一个采集会话: 创建目录和会话信息，保存拍摄，结束时写入汇总
+
+    lazy_depth_vis 为True时拍摄不生成深度可视化，由 depth_vis 模块在查看时按需生成或批量生成。
+    """
+
+    def __init__(self, deepdata_path, camera_type, camera_index=0, resolution=None, fps=None,
+                 rgb_format="png:6", depth_vis_format="png:1", extra_info=None, lazy_depth_vis=False):
+        self.deepdata_path = deepdata_path
+        self.camera_type = camera_type
+        self.camera_index = camera_index
+        self.resolution = resolution
+        self.fps = fps
+        self.rgb_format = rgb_format
+        self.depth_vis_format = depth_vis_format
+        self.lazy_depth_vis = lazy_depth_vis
+        self.extra_info = extra_info or {}
+
+        self.start_time = None
+        self.name = None
+        self.path = None
+        self.capture_count = 0
+        self.encoding_stats = EncodingStats()
+        self.storage_governor = StorageGovernor(deepdata_path)
+        self.journal = None
+
+    def create(self):
+        """创建会话文件夹、会话信息文件和会话日志"""
+        self.start_time = datetime.now()
+        base_name = f"session_{self.start_time.strftime('%Y%m%d_%H%M%S')}"
+        os.makedirs(os.path.join(self.deepdata_path, "sessions"), exist_ok=True)
+
+        # 会话文件夹以不覆盖的方式创建: 同一秒内已有同名会话（另一个进程或连续重启）时加序号后缀
+        suffix = 1
+        while True:
+            self.name = base_name if suffix == 1 else f"{base_name}_{suffix}"
+            self.path = os.path.join(self.deepdata_path, "sessions", self.name)
+            try:
+                os.mkdir(self.path)
+                break
+            except FileExistsError:
+                suffix += 1
+
+        # 创建子文件夹
+        for folder in SESSION_SUBFOLDERS:
+            os.makedirs(os.path.join(self.path, folder), exist_ok=True)
+
+        # 创建会话信息文件
+        session_info = {
+            "session_name": self.name,
+            "start_time": self.start_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "camera_type": self.camera_type,
+            "camera_index": self.camera_index,
+            "resolution": self.resolution,
+            "fps": self.fps,
+            "rgb_format": self.rgb_format,
+            "depth_vis_format": self.depth_vis_format,
+            "depth_vis_mode": "lazy" if self.lazy_depth_vis else "capture",
+        }
+        session_info.update(self.extra_info)
+        atomic_write_json(os.path.join(self.path, "session_info.json"), session_info)
+
+        # 追加式会话日志，异常退出后据此恢复拍摄计数和结束时间
+        self.journal = SessionJournal(self.path)
+        self.journal.append("start", session_name=self.name)
+        return self.path
+
+    def advise_storage(self, rgb_format=None, depth_vis_format=None):
+        """由存储调节器根据实测延迟和剩余空间决定本次的编码设置"""
+        return self.storage_governor.advise(EncodingConfig.parse(rgb_format or self.rgb_format),
+                                            EncodingConfig.parse(depth_vis_format or self.depth_vis_format))
+
+    def save_capture(self, rgb_frame, depth_frame, decision=None, extra_metadata=None, extra_layers=None):
+        """保存一次拍摄的RGB、深度、深度可视化和元数据，返回 CaptureResult
+
+        extra_layers: 附加的逐像素数组（如多帧融合的标准差 {"depth_std": array}），
+        保存为 depth/{名称}_{capture_id}.npy 并记入 relative_paths；
+        剩余空间不足时抛出 StorageFullError。
+        """
+        save_start = time.perf_counter()
+        if decision is None:
+            decision = self.advise_storage()
+        if decision.action == StorageDecision.STOP:
+            raise StorageFullError(decision.reason)
+
+        capture_index = self.capture_count + 1
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]  # 包含毫秒
+        capture_id = f"{capture_index:04d}_{timestamp}"
+
+        # 保存RGB图像到rgb文件夹（OpenCV直接写入BGR，无需颜色转换）
+        rgb_result = write_image(rgb_frame, os.path.join(self.path, "rgb", f"rgb_{capture_id}"),
+                                 decision.rgb_encoding)
+        rgb_filename = rgb_result.filename
+        self.encoding_stats.add("rgb", rgb_result)
+        encoding_info = {"rgb": rgb_result.to_dict()}
+
+        # 保存深度数据到depth文件夹（深度估计器为"无"时没有深度）
+        depth_filename = None
+        depth_write_ms = 0.0
+        depth_bytes = 0
+        if depth_frame is not None:
+            depth_filename = f"depth_{capture_id}.npy"
+            depth_path = os.path.join(self.path, "depth", depth_filename)
+            depth_write_start = time.perf_counter()
+            np.save(depth_path, depth_frame)
+            depth_write_ms = (time.perf_counter() - depth_write_start) * 1000
+            depth_bytes = os.path.getsize(depth_path)
+
+        layer_paths = {}
+        for layer_name, layer in (extra_layers or {}).items():
+            layer_filename = f"{layer_name}_{capture_id}.npy"
+            np.save(os.path.join(self.path, "depth", layer_filename), layer)
+            layer_paths[layer_name] = os.path.join("depth", layer_filename)
+            depth_bytes += os.path.getsize(os.path.join(self.path, layer_paths[layer_name]))
+
+        # 深度质量统计，随元数据保存以便按质量筛选
+        depth_stats = compute_depth_stats(depth_frame) if depth_frame is not None else None
+
+        # 保存深度可视化图像到depth_vis文件夹（按需生成模式或存储调节器要求时跳过）
+        depth_vis_filename = None
+        if depth_frame is not None and not self.lazy_depth_vis and not decision.skip_depth_vis:
+            depth_vis_result = write_image(colorize_depth(depth_frame),
+                                           os.path.join(self.path, "depth_vis", f"depth_vis_{capture_id}"),
+                                           decision.depth_vis_encoding)
+            depth_vis_filename = depth_vis_result.filename
+            self.encoding_stats.add("depth_vis", depth_vis_result)
+            encoding_info["depth_vis"] = depth_vis_result.to_dict()
+
+        # 保存元数据到metadata文件夹
+        metadata = {
+            "capture_id": capture_id,
+            "capture_index": capture_index,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+            "session_name": self.name,
+            "camera_type": self.camera_type,
+            "camera_index": self.camera_index,
+            "resolution": self.resolution,
+            "fps": self.fps,
+            "rgb_file": rgb_filename,
+            "depth_file": depth_filename,
+            "depth_visualization": depth_vis_filename,
+            "image_size": rgb_frame.shape[:2],
+            "encoding": encoding_info,
+            "depth_stats": depth_stats,
+        }
+        metadata.update(extra_metadata or {})
+        metadata["relative_paths"] = {
+            "rgb": os.path.join("rgb", rgb_filename),
+            "depth": os.path.join("depth", depth_filename) if depth_filename else None,
+            "depth_vis": os.path.join("depth_vis", depth_vis_filename) if depth_vis_filename else None
+        }
+        metadata["relative_paths"].update(layer_paths)
+
+        metadata_filename = f"metadata_{capture_id}.json"
+        with open(os.path.join(self.path, "metadata", metadata_filename), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False)
+
+        self.journal.append("capture",
+                            capture_id=capture_id,
+                            capture_index=capture_index,
+                            metadata=os.path.join("metadata", metadata_filename),
+                            depth_stats=depth_stats)
+
+        total_bytes = sum(info["bytes"] for info in encoding_info.values()) + depth_bytes
+        self.storage_governor.record_capture(
+            total_bytes,
+            sum(info["encode_ms"] for info in encoding_info.values()),
+            sum(info["write_ms"] for info in encoding_info.values()) + depth_write_ms)
+
+        self.capture_count = capture_index
+        return CaptureResult(capture_id, metadata, decision,
+                             (time.perf_counter() - save_start) * 1000, total_bytes)
+
+    def finalize(self, extra_info=None):
+        """结束会话，更新会话信息，返回更新后的会话信息"""
+        session_info_path = os.path.join(self.path, "session_info.json")
+        with open(session_info_path, 'r', encoding='utf-8') as f:
+            session_info = json.load(f)
+
+        # 更新结束时间和统计信息
+        end_time = datetime.now()
+        session_info.update({
+            "end_time": end_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "duration_seconds": int((end_time - self.start_time).total_seconds()),
+            "total_captures": self.capture_count,
+            "encoding_stats": self.encoding_stats.summary(),
+            "storage_governor": self.storage_governor.summary(),
+        })
+        session_info.update(extra_info or {})
+        session_info["session_completed"] = True
+
+        if self.journal:
+            self.journal.append("end", total_captures=self.capture_count)
+            self.journal.close()
+            self.journal = None
+
+        atomic_write_json(session_info_path, session_info)
+        return session_info
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话同步模块 - 按内容哈希把 deepdata/sessions 增量同步到备份目录（如挂载的NAS）
+每个会话保存一份内容哈希清单，文件大小和修改时间未变时复用旧哈希；
+哈希在多个进程中并行计算，复制并发数受限，复制后重新读取目标文件校验；
+目标文件保留源文件的修改时间（按修改时间判断的缓存，如按需生成的 depth_vis，在备份中仍然有效）；
+目标端清单随复制进度更新，中断后再次运行会跳过已校验的文件。
+源会话被归档后，归档文件复制并校验完成时删除目标中已打包进归档的散文件，备份与源会话保持一致
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from session_journal import atomic_write_json, SESSION_INFO_FILE
+
+
+MANIFEST_FILE = "sync_manifest.json"
+PARTIAL_SUFFIX = ".partial"
+HASH_CHUNK = 1 << 20
+
+
+def file_sha256(path):
+    """分块计算文件的SHA-256（定义在模块级以便进程池调用）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(directory, files):
+    atomic_write_json(os.path.join(directory, MANIFEST_FILE), {
+        "updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "files": files,
+    })
+
+
+def list_session_files(session_path):
+    """会话内需要同步的文件（相对路径，统一使用 / 分隔），跳过清单和临时文件"""
+    files = {}
+    for root, _, names in os.walk(session_path):
+        for name in names:
+            if name == MANIFEST_FILE or name.endswith((".tmp", PARTIAL_SUFFIX)):
+                continue
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, session_path).replace(os.sep, "/")
+            stat = os.stat(path)
+            files[relative] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return files
+
+
+def session_completed(session_path):
+    try:
+        with open(os.path.join(session_path, SESSION_INFO_FILE), 'r', encoding='utf-8') as f:
+            return bool(json.load(f).get("session_completed"))
+    except (OSError, ValueError):
+        return False
+
+
+class SessionSync:
+    """增量同步器
+
+    hash_workers: 计算哈希的进程数；copy_workers: 同时复制的文件数（限制并发I/O）；
+    include_active: 是否同步尚未结束的会话（默认跳过，避免复制写到一半的数据）。
+    """
+
+    def __init__(self, sessions_path, target_path, hash_workers=None, copy_workers=2,
+                 include_active=False, log=print, manifest_every=64):
+        self.sessions_path = sessions_path
+        self.target_path = target_path
+        self.hash_workers = hash_workers or max(1, min(4, (os.cpu_count() or 1)))
+        self.copy_workers = max(1, copy_workers)
+        self.include_active = include_active
+        self.log = log
+        self.manifest_every = manifest_every
+        self.stats = {
+            "sessions": 0, "sessions_skipped_active": 0,
+            "files": 0, "files_hashed": 0, "files_copied": 0, "files_unchanged": 0,
+            "files_resumed": 0, "files_superseded_removed": 0, "bytes_copied": 0, "verify_failures": 0,
+            "errors": 0,
+            "hash_seconds": 0.0, "copy_seconds": 0.0,
+        }
+        self._stats_lock = threading.Lock()
+
+    def count(self, key, amount=1):
+        """复制线程中更新统计"""
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def run(self):
+        """同步所有会话，返回统计信息"""
+        start = time.perf_counter()
+        os.makedirs(self.target_path, exist_ok=True)
+        sessions = sorted(entry.path for entry in os.scandir(self.sessions_path)
+                          if entry.is_dir() and entry.name.startswith("session_"))
+
+        with ProcessPoolExecutor(max_workers=self.hash_workers) as hash_pool, \
+                ThreadPoolExecutor(max_workers=self.copy_workers, thread_name_prefix="sync") as copy_pool:
+            for session_path in sessions:
+                if not self.include_active and not session_completed(session_path):
+                    self.stats["sessions_skipped_active"] += 1
+                    self.log(f"跳过未结束的会话: {os.path.basename(session_path)}")
+                    continue
+                self.sync_session(session_path, hash_pool, copy_pool)
+                self.stats["sessions"] += 1
+
+        elapsed = time.perf_counter() - start
+        self.stats["elapsed_seconds"] = round(elapsed, 3)
+        self.stats["hash_seconds"] = round(self.stats["hash_seconds"], 3)
+        self.stats["copy_seconds"] = round(self.stats["copy_seconds"], 3)
+        self.stats["copy_mb_per_second"] = (round(self.stats["bytes_copied"] / 1e6 / self.stats["copy_seconds"], 2)
+                                            if self.stats["copy_seconds"] > 0 else None)
+        return self.stats
+
+    def update_source_manifest(self, session_path, hash_pool):
+        """更新会话的源端清单: 大小和修改时间未变的文件复用已有哈希，其余并行计算"""
+        previous = load_manifest(session_path)
+        files = list_session_files(session_path)
+        to_hash = [relative for relative, info in files.items()
+                   if previous.get(relative, {}).get("size") != info["size"] or
+                   previous.get(relative, {}).get("mtime_ns") != info["mtime_ns"] or
+                   "sha256" not in previous.get(relative, {})]
+        for relative, info in files.items():
+            if relative not in to_hash:
+                info["sha256"] = previous[relative]["sha256"]
+
+        if to_hash:
+            hash_start = time.perf_counter()
+            paths = [os.path.join(session_path, relative) for relative in to_hash]
+            for relative, digest in zip(to_hash, hash_pool.map(file_sha256, paths, chunksize=8)):
+                files[relative]["sha256"] = digest
+            self.stats["hash_seconds"] += time.perf_counter() - hash_start
+            self.stats["files_hashed"] += len(to_hash)
+
+        if to_hash or set(files) != set(previous):
+            save_manifest(session_path, files)
+        return files
+
+    def sync_session(self, session_path, hash_pool, copy_pool):
+        name = os.path.basename(session_path)
+        files = self.update_source_manifest(session_path, hash_pool)
+        target_session = os.path.join(self.target_path, name)
+        os.makedirs(target_session, exist_ok=True)
+        target_files = load_manifest(target_session)
+        self.stats["files"] += len(files)
+
+        pending = []
+        for relative, info in files.items():
+            if target_files.get(relative, {}).get("sha256") == info["sha256"] and \
+                    os.path.exists(os.path.join(target_session, relative)):
+                self.stats["files_unchanged"] += 1
+            else:
+                pending.append(relative)
+
+        if pending:
+            self.log(f"同步会话 {name}: {len(pending)}/{len(files)} 个文件需要复制")
+            lock = threading.Lock()
+            completed = [0]
+
+            def copy(relative):
+                result = self.copy_file(session_path, target_session, relative, files[relative])
+                with lock:
+                    if result is not None:
+                        target_files[relative] = result
+                    completed[0] += 1
+                    # 定期保存目标端清单，中断后可以从这里继续
+                    if completed[0] % self.manifest_every == 0:
+                        save_manifest(target_session, dict(target_files))
+
+            copy_start = time.perf_counter()
+            list(copy_pool.map(copy, pending))
+            self.stats["copy_seconds"] += time.perf_counter() - copy_start
+
+        self.remove_superseded(session_path, target_session, files, target_files)
+
+        # 源端已删除的文件不再记录在目标清单中（目标文件本身保留，已打包进归档的除外）
+        kept = {relative: info for relative, info in target_files.items() if relative in files}
+        if pending or kept != target_files:
+            save_manifest(target_session, kept)
+
+    def remove_superseded(self, session_path, target_session, files, target_files):
+        """源会话已归档时，删除目标中已打包进归档的散文件
+
+        只在会话的全部文件（包括归档）都已复制并校验后进行，复制失败或中断时目标中的散文件保持不变。
+        """
+        # session_archive 依赖本模块，在此处导入
+        from session_archive import ARCHIVE_INDEX_FILE
+        if ARCHIVE_INDEX_FILE not in files:
+            return
+        if any(target_files.get(relative, {}).get("sha256") != info["sha256"] for relative, info in files.items()):
+            return
+        try:
+            with open(os.path.join(session_path, ARCHIVE_INDEX_FILE), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            # 打包的文件和并入元数据表的 metadata/*.json
+            packed = set(index["files"]) | {metadata.get("archive_metadata_file") for metadata in index["captures"]
+                                            if metadata.get("archive_metadata_file")}
+        except (OSError, ValueError, KeyError) as e:
+            self.log(f"读取归档索引失败，保留目标中的散文件: {e}")
+            return
+
+        folders = set()
+        for relative in sorted(packed):
+            path = os.path.join(target_session, relative)
+            if relative in files or not os.path.isfile(path):
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                self.count("errors")
+                self.log(f"删除已归档的散文件失败 {relative}: {e}")
+                continue
+            self.count("files_superseded_removed")
+            folders.add(os.path.dirname(path))
+        # 删除因此变空的子文件夹
+        for folder in sorted(folders, key=len, reverse=True):
+            while folder != target_session and os.path.isdir(folder) and not os.listdir(folder):
+                os.rmdir(folder)
+                folder = os.path.dirname(folder)
+
+    def copy_file(self, session_path, target_session, relative, info):
+        """复制一个文件并校验，返回目标清单条目，失败返回None"""
+        source = os.path.join(session_path, relative)
+        destination = os.path.join(target_session, relative)
+        entry = {"size": info["size"], "sha256": info["sha256"]}
+        try:
+            # 上次中断时已复制完成但未记入清单的文件: 校验通过即可
+            if os.path.exists(destination) and os.path.getsize(destination) == info["size"]:
+                if file_sha256(destination) == info["sha256"]:
+                    os.utime(destination, ns=(info["mtime_ns"], info["mtime_ns"]))
+                    self.count("files_resumed")
+                    return entry
+
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            partial = destination + PARTIAL_SUFFIX
+            for attempt in range(2):
+                with open(source, 'rb') as src, open(partial, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, HASH_CHUNK)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                # 重新读取目标文件校验，确认落盘内容与源文件哈希一致
+                if file_sha256(partial) == info["sha256"]:
+                    os.utime(partial, ns=(info["mtime_ns"], info["mtime_ns"]))
+                    os.replace(partial, destination)
+                    self.count("files_copied")
+                    self.count("bytes_copied", info["size"])
+                    return entry
+                self.count("verify_failures")
+                self.log(f"校验失败，重新复制: {relative}")
+
+            os.remove(partial)
+            self.count("errors")
+            self.log(f"复制失败（两次校验不一致）: {relative}")
+        except OSError as e:
+            self.count("errors")
+            self.log(f"复制失败 {relative}: {e}")
+        return None
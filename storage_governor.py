@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储调节模块 - 根据实测写入带宽和剩余空间自适应调整编码设置
+保存延迟超出预算时调整压缩等级或跳过depth_vis，空间不足时告警或停止拍摄
+"""
+
+import shutil
+import time
+from datetime import datetime
+
+
+class StorageDecision:
+    """一次调节结果: 实际使用的编码配置和动作"""
+
+    OK = "ok"
+    WARN = "warn"
+    STOP = "stop"
+
+    def __init__(self, rgb_encoding, depth_vis_encoding, skip_depth_vis, action, reason):
+        self.rgb_encoding = rgb_encoding
+        self.depth_vis_encoding = depth_vis_encoding
+        self.skip_depth_vis = skip_depth_vis
+        self.action = action
+        self.reason = reason
+
+    def signature(self):
+        return (str(self.rgb_encoding), str(self.depth_vis_encoding), self.skip_depth_vis, self.action)
+
+
+class StorageGovernor:
+    """存储调节器
+
+    latency_budget_ms 为单次拍摄保存（编码+写入）的延迟预算；
+    warn_free_mb / stop_free_mb 为剩余空间告警和停止阈值。
+    写入耗时占主导时提高PNG压缩等级以减少字节数，编码耗时占主导时降低压缩等级，
+    两者都到极限后跳过depth_vis；延迟恢复到预算一半以下时逐步回到用户设置。
+    等级偏移按RGB格式分别记录（PNG每步1级，JPEG每步5个质量），会话中途切换格式时互不影响。
+    调整和恢复都只在有新的保存实测后进行、每次一步，与空间告警/停止无关
+    （停止保存期间没有新的实测，等级保持不变）。
+    """
+
+    def __init__(self, path, latency_budget_ms=150.0, warn_free_mb=2048, stop_free_mb=500,
+                 allow_skip_depth_vis=True, smoothing=0.3):
+        self.path = path
+        self.latency_budget_ms = latency_budget_ms
+        self.warn_free_bytes = warn_free_mb * 1024 * 1024
+        self.stop_free_bytes = stop_free_mb * 1024 * 1024
+        self.allow_skip_depth_vis = allow_skip_depth_vis
+        self.smoothing = smoothing
+
+        self.level_offsets = {}  # RGB格式 -> 压缩等级/质量偏移
+        self.skip_depth_vis = False
+
+        self.avg_latency_ms = None
+        self.avg_encode_ms = None
+        self.avg_write_ms = None
+        self.avg_bytes = None
+        self.write_bandwidth = None  # 字节/秒
+
+        self.free_bytes = None
+        self.last_free_check = 0.0
+
+        self.decisions = []
+        self._last_signature = None
+        self._new_measurement = False
+
+    def _smooth(self, previous, value):
+        if previous is None:
+            return value
+        return previous + self.smoothing * (value - previous)
+
+    def record_capture(self, num_bytes, encode_ms, write_ms):
+        """记录一次拍摄保存的实测开销"""
+        self.avg_encode_ms = self._smooth(self.avg_encode_ms, encode_ms)
+        self.avg_write_ms = self._smooth(self.avg_write_ms, write_ms)
+        self.avg_latency_ms = self._smooth(self.avg_latency_ms, encode_ms + write_ms)
+        self.avg_bytes = self._smooth(self.avg_bytes, num_bytes)
+        if write_ms > 0:
+            self.write_bandwidth = self._smooth(self.write_bandwidth, num_bytes / (write_ms / 1000))
+        self._new_measurement = True
+
+    def check_free_space(self, max_age=1.0):
+        """查询数据卷剩余空间，max_age秒内复用上次结果"""
+        now = time.monotonic()
+        if self.free_bytes is None or now - self.last_free_check >= max_age:
+            self.free_bytes = shutil.disk_usage(self.path).free
+            self.last_free_check = now
+        return self.free_bytes
+
+    def remaining_captures(self):
+        """按平均每次拍摄字节数估算剩余可拍摄张数"""
+        if not self.avg_bytes or self.free_bytes is None:
+            return None
+        return int(max(self.free_bytes - self.stop_free_bytes, 0) / self.avg_bytes)
+
+    def adapt(self, rgb_encoding):
+        """根据平均延迟调整压缩等级偏移和depth_vis跳过状态，每次保存实测后最多调整一步"""
+        if self.avg_latency_ms is None or not self._new_measurement:
+            return
+        self._new_measurement = False
+        fmt = rgb_encoding.format
+        offset = self.level_offsets.get(fmt, 0)
+
+        if self.avg_latency_ms > self.latency_budget_ms:
+            write_bound = (self.avg_write_ms or 0) >= (self.avg_encode_ms or 0)
+            if fmt == "png":
+                step = 1 if write_bound else -1
+                if 0 <= rgb_encoding.level + offset + step <= 9:
+                    self.level_offsets[fmt] = offset + step
+                    return
+            elif fmt == "jpeg" and write_bound:
+                if rgb_encoding.level + offset - 5 >= 70:
+                    self.level_offsets[fmt] = offset - 5
+                    return
+            if self.allow_skip_depth_vis:
+                self.skip_depth_vis = True
+        elif self.avg_latency_ms < self.latency_budget_ms / 2:
+            # 延迟充裕，先恢复depth_vis，再逐步回到用户设置的等级
+            if self.skip_depth_vis:
+                self.skip_depth_vis = False
+            elif offset:
+                step = 1 if fmt == "png" else 5
+                self.level_offsets[fmt] = offset - step if offset > 0 else offset + step
+
+    def advise(self, rgb_encoding, depth_vis_encoding):
+        """返回本次拍摄应使用的编码设置和动作"""
+        self.adapt(rgb_encoding)
+        free_bytes = self.check_free_space()
+
+        offset = self.level_offsets.get(rgb_encoding.format, 0)
+        rgb = rgb_encoding.with_level(rgb_encoding.level + offset) if offset else rgb_encoding
+        depth_vis = depth_vis_encoding
+        if offset and depth_vis_encoding.format == rgb_encoding.format:
+            depth_vis = depth_vis_encoding.with_level(depth_vis_encoding.level + offset)
+
+        if free_bytes < self.stop_free_bytes:
+            action, reason = StorageDecision.STOP, f"剩余空间不足 {free_bytes / 1024 / 1024:.0f}MB"
+        elif free_bytes < self.warn_free_bytes:
+            action, reason = StorageDecision.WARN, f"剩余空间偏低 {free_bytes / 1024 / 1024:.0f}MB"
+        elif offset or self.skip_depth_vis:
+            action, reason = StorageDecision.OK, f"保存延迟 {self.avg_latency_ms:.0f}ms，预算 {self.latency_budget_ms:.0f}ms"
+        else:
+            action, reason = StorageDecision.OK, "正常"
+
+        decision = StorageDecision(rgb, depth_vis, self.skip_depth_vis, action, reason)
+        self.log_decision(decision)
+        return decision
+
+    def log_decision(self, decision):
+        """仅在决策变化时记录，供写入会话信息"""
+        signature = decision.signature()
+        if signature == self._last_signature:
+            return False
+        self._last_signature = signature
+        self.decisions.append({
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+            "action": decision.action,
+            "reason": decision.reason,
+            "rgb_format": str(decision.rgb_encoding),
+            "depth_vis_format": str(decision.depth_vis_encoding),
+            "skip_depth_vis": decision.skip_depth_vis,
+            "avg_latency_ms": round(self.avg_latency_ms, 2) if self.avg_latency_ms is not None else None,
+            "write_bandwidth_mbps": round(self.write_bandwidth / 1024 / 1024, 2) if self.write_bandwidth else None,
+            "free_mb": round(self.free_bytes / 1024 / 1024) if self.free_bytes is not None else None,
+        })
+        return True
+
+    def summary(self):
+        """会话信息中的调节器摘要"""
+        return {
+            "latency_budget_ms": self.latency_budget_ms,
+            "warn_free_mb": self.warn_free_bytes // (1024 * 1024),
+            "stop_free_mb": self.stop_free_bytes // (1024 * 1024),
+            "avg_latency_ms": round(self.avg_latency_ms, 2) if self.avg_latency_ms is not None else None,
+            "write_bandwidth_mbps": round(self.write_bandwidth / 1024 / 1024, 2) if self.write_bandwidth else None,
+            "free_mb": round(self.free_bytes / 1024 / 1024) if self.free_bytes is not None else None,
+            "decisions": self.decisions,
+        }
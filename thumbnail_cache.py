@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缩略图缓存模块 - 为会话画廊提供后台生成的缩略图
+磁盘缓存和内存中最近使用的缩略图(LRU)都以文件路径、修改时间和大小为键，原图被原地重写后自动失效。
+不是独立文件的原图（如已归档会话中的图像）以 source=(版本文件, 读取函数) 提供，按版本文件的修改时间和大小失效
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from image_codec import read_image
+
+
+class ThumbnailCache:
+    """两级缩略图缓存: 内存LRU + 持久化磁盘缓存，由后台线程池生成"""
+
+    def __init__(self, cache_dir, thumb_size=(160, 120), memory_items=1024, workers=4):
+        self.cache_dir = cache_dir
+        self.thumb_size = thumb_size
+        self.memory_items = memory_items
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._wanted = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "generated": 0, "skipped": 0, "errors": 0}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def memory_key(path, source=None):
+        """内存缓存键: (路径, 修改时间, 大小)，文件不存在时返回None；有 source 时取其版本文件的状态"""
+        try:
+            stat = os.stat(source[0] if source is not None else path)
+        except OSError:
+            return None
+        return path, stat.st_mtime_ns, stat.st_size
+
+    def cache_key(self, path, source=None):
+        """以绝对路径、修改时间、大小和缩略图尺寸生成缓存键，原图变化后自动失效"""
+        key = self.memory_key(path, source)
+        if key is None:
+            return None
+        _, mtime, size = key
+        raw = f"{os.path.abspath(path)}|{mtime}|{size}|{self.thumb_size[0]}x{self.thumb_size[1]}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.jpg")
+
+    def get(self, path, source=None):
+        """仅查询内存缓存（只读取文件状态，不解码），可在UI线程中调用"""
+        key = self.memory_key(path, source)
+        if key is None:
+            return None
+        with self._lock:
+            thumb = self._memory.get(key)
+            if thumb is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+            return thumb
+
+    def set_wanted(self, paths):
+        """设置当前需要的缩略图集合，滚动离开可视区域的请求在执行前被跳过"""
+        with self._lock:
+            self._wanted = set(paths) if paths is not None else None
+
+    def request(self, path, callback, prepare=None, source=None):
+        """异步获取缩略图，完成后在工作线程中调用 callback(path, thumb)
+
+        prepare: 原图不存在时先在工作线程中调用以生成原图（如按需生成的深度可视化）；
+        source: (版本文件, 读取函数)，原图不是独立文件时由读取函数返回解码后的图像。
+        """
+        thumb = self.get(path, source)
+        if thumb is not None:
+            callback(path, thumb)
+            return
+
+        with self._lock:
+            callbacks = self._pending.get(path)
+            if callbacks is not None:
+                callbacks.append(callback)
+                return
+            self._pending[path] = [callback]
+
+        self._executor.submit(self._load, path, prepare, source)
+
+    def _load(self, path, prepare=None, source=None):
+        with self._lock:
+            skip = self._wanted is not None and path not in self._wanted
+        if skip:
+            with self._lock:
+                self._pending.pop(path, None)
+                self.stats["skipped"] += 1
+            return
+
+        thumb = None
+        key = None
+        try:
+            if prepare is not None and source is None and not os.path.exists(path):
+                prepare()
+            key = self.memory_key(path, source)
+            thumb = self.load_or_generate(path, source)
+        except Exception as e:
+            print(f"缩略图生成失败 {os.path.basename(path)}: {e}")
+            with self._lock:
+                self.stats["errors"] += 1
+
+        with self._lock:
+            if thumb is not None and key is not None:
+                self._memory[key] = thumb
+                self._memory.move_to_end(key)
+                while len(self._memory) > self.memory_items:
+                    self._memory.popitem(last=False)
+            callbacks = self._pending.pop(path, [])
+
+        for callback in callbacks:
+            callback(path, thumb)
+
+    def load_or_generate(self, path, source=None):
+        """先查磁盘缓存，未命中时解码原图并写入缓存"""
+        key = self.cache_key(path, source)
+        if key is None:
+            return None
+
+        cached_path = self.disk_path(key)
+        if os.path.exists(cached_path):
+            thumb = cv2.imread(cached_path, cv2.IMREAD_COLOR)
+            if thumb is not None:
+                with self._lock:
+                    self.stats["disk_hits"] += 1
+                return thumb
+
+        image = source[1]() if source is not None else read_image(path, cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+
+        thumb = self.make_thumbnail(image)
+
+        # 先写临时文件再重命名，避免并发读取到不完整的缓存
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        ok, encoded = cv2.imencode('.jpg', thumb, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        if ok:
+            temp_path = f"{cached_path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(encoded.tobytes())
+            os.replace(temp_path, cached_path)
+
+        with self._lock:
+            self.stats["generated"] += 1
+        return thumb
+
+    def make_thumbnail(self, image):
+        """保持宽高比缩放到缩略图尺寸内"""
+        height, width = image.shape[:2]
+        scale = min(self.thumb_size[0] / width, self.thumb_size[1] / height, 1.0)
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+热启动模块 - 保存上次使用的相机设置，启动时在后台提前打开相机
+设置保存在 deepdata/temp/settings.json；界面创建期间 PreopenTask 已在后台打开相机，
+界面建好后启动流程直接接管已打开的设备。StartupTimer 记录从进程启动到首帧显示的各阶段耗时
+"""
+
+import os
+import json
+import time
+import threading
+
+from session_journal import atomic_write_json
+
+
+SETTINGS_FILE = "settings.json"
+
+DEFAULT_SETTINGS = {
+    "camera_type": "自动检测",
+    "camera_device": None,   # 上次使用的USB相机: {"index", "name", "width", "height", "fps"}
+    "resolution": "640x480",
+    "fps": 30,
+    "shot_mode": None,       # 20 / 10 张模式，None 为未选择
+    "preopen": True,
+}
+
+
+class AppSettings:
+    """界面设置，读取失败时使用默认值"""
+
+    def __init__(self, path):
+        self.path = path
+        self.values = dict(DEFAULT_SETTINGS)
+        self.loaded = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict):
+            self.values.update({key: value for key, value in data.items() if key in DEFAULT_SETTINGS})
+            self.loaded = True
+
+    def get(self, key):
+        return self.values.get(key, DEFAULT_SETTINGS.get(key))
+
+    def update(self, **values):
+        """更新并保存，内容未变化时不写文件"""
+        changed = {key: value for key, value in values.items() if self.values.get(key) != value}
+        if not changed:
+            return
+        self.values.update(changed)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        atomic_write_json(self.path, self.values)
+
+
+class PreopenTask:
+    """在后台线程中提前打开相机
+
+    key 描述打开时使用的设置（相机类型、设备、分辨率、帧率）；启动相机时设置一致才接管，
+    否则调用 release 关闭已打开的设备。open_func(log) 失败时返回None或抛出异常；
+    此时界面主循环还未运行，日志先保存在 messages 中，由接管方输出。
+    """
+
+    def __init__(self, key, open_func, release=None):
+        self.key = key
+        self.result = None
+        self.error = None
+        self.elapsed_ms = None
+        self.messages = []
+        self._open_func = open_func
+        self._release = release
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="camera-preopen")
+        self._thread.start()
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            self.result = self._open_func(self.messages.append)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.elapsed_ms = (time.perf_counter() - start) * 1000
+            self._done.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def take_messages(self):
+        messages, self.messages = self.messages, []
+        return messages
+
+    def wait(self, timeout=None):
+        """等待打开完成，返回打开结果；打开失败时抛出原异常"""
+        self._done.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def discard(self):
+        """不再使用预打开的设备: 打开完成后在后台释放"""
+        def release():
+            self._done.wait()
+            if self.result and self._release is not None:
+                try:
+                    self._release(self.result)
+                except Exception:
+                    pass
+
+        threading.Thread(target=release, daemon=True).start()
+
+
+class StartupTimer:
+    """启动耗时: 各阶段相对进程启动时刻（launch_time，time.perf_counter()）的毫秒数"""
+
+    def __init__(self, launch_time=None):
+        self.launch_time = launch_time if launch_time is not None else time.perf_counter()
+        self.marks = {}
+
+    def mark(self, name):
+        """记录阶段完成时刻，同名阶段只记录第一次；返回毫秒数"""
+        if name not in self.marks:
+            self.marks[name] = round((time.perf_counter() - self.launch_time) * 1000, 1)
+        return self.marks[name]
+
+    def summary(self):
+        return dict(self.marks)
+
+    def text(self):
+        return "，".join(f"{name} {ms:.0f} ms" for name, ms in self.marks.items())